@@ -1,9 +1,12 @@
 import os
 import argparse
-import subprocess
 import glob
 import json
 
+from googledataprocess import GoogleDataProcessor
+from job_runner import Job, JobState, DAGRunner
+from streetview_downloader import DownloadManifest
+
 def get_available_place_ids():
     """
     Scan the googledata directory to find all place folders.
@@ -33,21 +36,22 @@ def should_process_url(place_id):
     
     return os.path.exists(url_path) and not os.path.exists(pano_path)
 
-def should_download_images(place_id):
+def should_download_images(place_id, processor):
     """
-    Check if a place folder has pano.json but no images at all.
-    Returns True if downloading is needed (no images found), False otherwise.
+    Check the download manifest of a place against the images of its pano.json.
+    Returns True if any image is not recorded as done (never attempted, failed, or
+    downloaded before the manifest existed), False otherwise. The downloader only
+    fetches the missing images and adopts the complete ones already on disk.
     """
     pano_path = f'googledata/place{place_id}/pano.json'
     
     if not os.path.exists(pano_path):
         return False
     
-    # Check if there are any JPG images in the folder
-    image_count = len(glob.glob(f'googledata/place{place_id}/id_*.jpg'))
-    
-    # Only download if there are no images at all
-    return image_count == 0
+    entries = DownloadManifest.read_entries(f'googledata/place{place_id}/manifest.jsonl')
+    return any(
+        entries.get(filename, {}).get('status') != 'done' for filename, _ in processor.get_streetview_tasks()
+    )
 
 def get_places_with_images():
     """
@@ -66,25 +70,6 @@ def get_places_with_images():
     
     return result
 
-def get_highest_traj_id():
-    """
-    Find the highest existing trajectory ID.
-    Returns 0 if no trajectories exist.
-    """
-    traj_folders = glob.glob('textdata/traj*')
-    traj_ids = []
-    
-    for folder in traj_folders:
-        try:
-            # Extract traj ID from folder name
-            traj_id = int(folder.split('traj')[-1])
-            traj_ids.append(traj_id)
-        except ValueError:
-            # Skip if the folder name doesn't follow the expected format
-            continue
-    
-    return max(traj_ids, default=-1)  # Return -1 if no trajectories exist
-
 def should_create_trajectory(place_id, traj_id):
     """
     Check if a trajectory needs to be created.
@@ -108,103 +93,63 @@ def should_create_trajectory(place_id, traj_id):
         # If there's any error reading or parsing the file, assume we need to create
         return True
 
-def execute_command(command):
+def build_place_jobs(api_key, place_ids, state, process_url=False, download=False, create_trajectory=False,
+                     start_traj_id=0, stride=2, rendezvous_pano_id=None, download_threads=8, download_rate=20.0):
     """
-    Execute a shell command and print its output.
+    Build the DAG of per-place stages: process -> download -> write.
+    Stages run in-process with GoogleDataProcessor, and each stage only depends on the
+    previous requested stage of the same place, so different places are independent.
+    Trajectory ids are assigned atomically by the job state when a write stage starts.
     """
-    print(f"Executing: {command}")
-    process = subprocess.Popen(
-        command, 
-        shell=True, 
-        stdout=subprocess.PIPE, 
-        stderr=subprocess.PIPE,
-        universal_newlines=True
-    )
-    
-    stdout, stderr = process.communicate()
-    
-    if stdout:
-        print(f"Output:\n{stdout}")
-    if stderr:
-        print(f"Error:\n{stderr}")
-    
-    return process.returncode
-
-def process_url_files(api_key, place_ids=None):
-    """
-    Process all place folders that have url.txt but no pano.json.
-    """
-    if place_ids is None:
-        place_ids = get_available_place_ids()
-    
-    processed_count = 0
+    jobs = []
     for place_id in place_ids:
-        if should_process_url(place_id):
-            print(f"Processing URL for place{place_id}...")
-            command = f"python googledataprocess.py --api-key {api_key} --seed {place_id} --function process"
-            
-            if execute_command(command) == 0:
-                processed_count += 1
-                print(f"Successfully processed URL for place{place_id}")
-            else:
-                print(f"Failed to process URL for place{place_id}")
-    
-    return processed_count
+        processor = GoogleDataProcessor(seed=place_id, api_key=api_key)
+        prev_job_id = None
 
-def download_street_views(api_key, place_ids=None):
-    """
-    Download street view images for all place folders that have pano.json.
-    """
-    if place_ids is None:
-        place_ids = get_available_place_ids()
-    
-    downloaded_count = 0
-    for place_id in place_ids:
-        if should_download_images(place_id):
-            print(f"Downloading street view images for place{place_id}...")
-            command = f"python googledataprocess.py --api-key {api_key} --seed {place_id} --function download"
-            
-            if execute_command(command) == 0:
-                downloaded_count += 1
-                print(f"Successfully downloaded street view images for place{place_id}")
-            else:
-                print(f"Failed to download street view images for place{place_id}")
-    
-    return downloaded_count
+        if process_url:
+            job_id = f'place{place_id}/process'
+            jobs.append(Job(
+                job_id, 'process', processor.process_urls_to_json,
+                should_run=lambda place_id=place_id: should_process_url(place_id)
+            ))
+            prev_job_id = job_id
 
-def create_trajectories(api_key, start_traj_id, stride, place_ids=None, rendezvous_pano_id=None):
-    """
-    Create trajectories for all place folders that have pano.json and images.
-    Start from the given traj_id and increment for each place.
-    """
-    if place_ids is None:
-        place_ids = get_places_with_images()
-    
-    if not place_ids:
-        print("No places with images found!")
-        return 0
-    
-    created_count = 0
-    current_traj_id = start_traj_id
-    
-    for place_id in place_ids:
-        print(f"Creating trajectory from place{place_id} to traj{current_traj_id}...")
-        
-        command = f"python googledataprocess.py --api-key {api_key} --seed {place_id} --function write --traj-id {current_traj_id} --stride {stride}"
-        
-        if rendezvous_pano_id:
-            command += f" --pano-id {rendezvous_pano_id}"
-        
-        if execute_command(command) == 0:
-            created_count += 1
-            print(f"Successfully created trajectory from place{place_id} to traj{current_traj_id}")
-        else:
-            print(f"Failed to create trajectory from place{place_id} to traj{current_traj_id}")
-        
-        # Increment traj_id for the next place
-        current_traj_id += 1
-    
-    return created_count
+        if download:
+            def download_fn(processor=processor):
+                results = processor.download_streetview_images(max_workers=download_threads, rate=download_rate)
+                n_failed = sum(status == 'failed' for status in results.values())
+                if n_failed > 0:
+                    # the downloader is resumable, a retry only fetches the failed images
+                    raise RuntimeError(f"{n_failed} images failed to download")
+
+            job_id = f'place{place_id}/download'
+            jobs.append(Job(
+                job_id, 'download', download_fn, deps=[prev_job_id] if prev_job_id else [],
+                should_run=lambda place_id=place_id, processor=processor: should_download_images(place_id, processor)
+            ))
+            prev_job_id = job_id
+
+        if create_trajectory:
+            def write_fn(processor=processor, place_id=place_id):
+                traj_id = state.allocate_traj_id(f'place{place_id}', start=start_traj_id)
+                if not should_create_trajectory(place_id, traj_id):
+                    print(f"traj{traj_id} already created from place{place_id}")
+                    return
+                print(f"Creating trajectory from place{place_id} to traj{traj_id}...")
+                processor.write_traj_metainfo(
+                    traj_id=traj_id, stride=stride, rendezvous_point_pano_id=rendezvous_pano_id
+                )
+
+            def has_images(place_id=place_id):
+                return (os.path.exists(f'googledata/place{place_id}/pano.json')
+                        and len(glob.glob(f'googledata/place{place_id}/id_*.jpg')) > 0)
+
+            jobs.append(Job(
+                f'place{place_id}/write', 'write', write_fn, deps=[prev_job_id] if prev_job_id else [],
+                should_run=has_images
+            ))
+
+    return jobs
 
 def main():
     parser = argparse.ArgumentParser(description="Autonomous processing for Google Street View data")
@@ -213,10 +158,18 @@ def main():
     parser.add_argument("--process-url", action="store_true", help="Process URL files to create pano.json")
     parser.add_argument("--download", action="store_true", help="Download street view images")
     parser.add_argument("--create-trajectory", action="store_true", help="Create trajectories")
-    parser.add_argument("--traj-id", type=int, default=None, help="Starting trajectory ID for creation (optional, defaults to highest existing + 1)")
+    parser.add_argument("--traj-id", type=int, default=None, help="Starting trajectory ID for creation (optional, defaults to the first free ID)")
     parser.add_argument("--stride", type=int, default=2, help="Stride for trajectory creation")
     parser.add_argument("--pano-id", type=str, help="Rendezvous panorama ID (optional)")
     parser.add_argument("--place-ids", type=str, help="Comma-separated list of place IDs to process (optional)")
+    parser.add_argument("--workers", type=int, default=4, help="Maximum number of stages running at once")
+    parser.add_argument("--download-workers", type=int, default=2, help="Maximum number of places downloading at once")
+    parser.add_argument("--download-threads", type=int, default=8, help="Concurrent image downloads per place")
+    parser.add_argument("--rate", type=float, default=20.0, help="Maximum street view requests per second, shared by all places")
+    parser.add_argument("--write-workers", type=int, default=2, help="Maximum number of trajectories created at once")
+    parser.add_argument("--retries", type=int, default=2, help="Number of retries of a failed stage")
+    parser.add_argument("--state-file", type=str, default="googledata/job_state.json", help="Job state file used to resume an interrupted run")
+    parser.add_argument("--reset-state", action="store_true", help="Ignore the job state of previous runs")
     
     args = parser.parse_args()
     
@@ -228,33 +181,41 @@ def main():
         except ValueError:
             print("Error: place-ids should be a comma-separated list of integers")
             return
-    
-    # Execute the requested operations
-    if args.process_url:
-        print("=== Processing URL files ===")
-        count = process_url_files(args.api_key, place_ids)
-        print(f"Processed {count} place folders")
-    
-    if args.download:
-        print("=== Downloading street view images ===")
-        count = download_street_views(args.api_key, place_ids)
-        print(f"Downloaded images for {count} place folders")
-    
-    if args.create_trajectory:
-        print("=== Creating trajectories ===")
-        # If traj_id is not specified, find the highest existing one and add 1
-        start_traj_id = args.traj_id
-        if start_traj_id is None:
-            start_traj_id = get_highest_traj_id() + 1
-            print(f"No trajectory ID specified, starting from {start_traj_id} (highest existing + 1)")
-        
-        # If place_ids is not specified, use all places with images
-        if place_ids is None:
-            place_ids = get_places_with_images()
-            print(f"Using {len(place_ids)} places with images: {place_ids}")
-        
-        count = create_trajectories(args.api_key, start_traj_id, args.stride, place_ids, args.pano_id)
-        print(f"Created {count} trajectories")
+    if place_ids is None:
+        place_ids = get_available_place_ids()
+        print(f"Using {len(place_ids)} places: {place_ids}")
+
+    if args.reset_state and os.path.exists(args.state_file):
+        os.remove(args.state_file)
+    state = JobState(args.state_file)
+
+    jobs = build_place_jobs(
+        args.api_key, place_ids, state,
+        process_url=args.process_url,
+        download=args.download,
+        create_trajectory=args.create_trajectory,
+        start_traj_id=args.traj_id if args.traj_id is not None else 0,
+        stride=args.stride,
+        rendezvous_pano_id=args.pano_id,
+        download_threads=args.download_threads,
+        # the places downloading at once share the request rate
+        download_rate=args.rate / max(1, args.download_workers)
+    )
+    runner = DAGRunner(
+        jobs, state,
+        max_workers=args.workers,
+        stage_limits={'process': args.workers, 'download': args.download_workers, 'write': args.write_workers},
+        max_retries=args.retries
+    )
+    statuses = runner.run()
+
+    for stage in ['process', 'download', 'write']:
+        stage_statuses = [status for job_id, status in statuses.items() if job_id.endswith(f'/{stage}')]
+        if stage_statuses:
+            counts = {status: stage_statuses.count(status) for status in sorted(set(stage_statuses))}
+            print(f"=== {stage}: {counts} ===")
+    if state.traj_ids:
+        print(f"Trajectory ids: {state.traj_ids}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,395 @@
+import os
+import json
+import time
+import uuid
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+import requests
+
+TERMINAL_BATCH_STATUS = ['completed', 'failed', 'expired', 'cancelled']
+# OpenAI's limits for one batch input file are 200 MB and 50,000 requests
+DEFAULT_MAX_SHARD_BYTES = 190 * 1024 * 1024
+DEFAULT_MAX_SHARD_REQUESTS = 50000
+# returned by the build thread once the chunk iterator is exhausted
+_END_OF_CHUNKS = object()
+
+
+class ShardedJSONLWriter:
+    """
+    Streaming Batch API JSONL writer. Requests are serialized one at a time and the writer
+    rolls over to a new shard before the byte or request limit would be exceeded.
+    Every shard lives in its own folder with a sidecar id_mapping.json.
+    """
+    def __init__(self,
+                 output_dir: str,
+                 max_bytes: int = DEFAULT_MAX_SHARD_BYTES,
+                 max_requests: int = DEFAULT_MAX_SHARD_REQUESTS):
+        """
+        Args:
+            output_dir: Folder under which the shard folders are created
+            max_bytes: Maximum size of one shard in bytes
+            max_requests: Maximum number of requests in one shard
+        """
+        self.output_dir = output_dir
+        self.max_bytes = max_bytes
+        self.max_requests = max_requests
+        self.file = None
+        self.shard_path = None
+        self.id_mapping = {}
+        self.n_bytes = 0
+        self.n_shards = 0
+
+    def _open_shard(self) -> None:
+        shard_dir = os.path.join(self.output_dir, str(uuid.uuid4()))
+        os.makedirs(shard_dir, exist_ok=True)
+        self.shard_path = os.path.join(shard_dir, "batch_requests.jsonl")
+        self.file = open(self.shard_path, 'wb')
+        self.id_mapping = {}
+        self.n_bytes = 0
+        self.n_shards += 1
+
+    def write(self, request: Dict, mapping_entry: Dict) -> Optional[Tuple[str, Dict]]:
+        """
+        Append one request
+
+        Args:
+            request: Batch API request with a custom_id
+            mapping_entry: Information stored for the custom_id in the sidecar id mapping
+        Returns:
+            (jsonl_path, id_mapping) of the shard closed by this write, or None
+        """
+        line = (json.dumps(request) + '\n').encode('utf-8')
+        closed_shard = None
+        if self.file is not None and self.id_mapping and (
+                self.n_bytes + len(line) > self.max_bytes or len(self.id_mapping) >= self.max_requests):
+            closed_shard = self.close()
+        if self.file is None:
+            self._open_shard()
+        if len(line) > self.max_bytes:
+            print(f"Warning: request {request['custom_id']} alone is {len(line)} bytes, "
+                  f"larger than the shard limit {self.max_bytes}")
+
+        self.file.write(line)
+        self.n_bytes += len(line)
+        self.id_mapping[request['custom_id']] = mapping_entry
+        return closed_shard
+
+    def close(self) -> Optional[Tuple[str, Dict]]:
+        """
+        Close the current shard and write its sidecar id mapping
+
+        Returns:
+            (jsonl_path, id_mapping) of the closed shard, or None if no shard is open
+        """
+        if self.file is None:
+            return None
+        self.file.close()
+        self.file = None
+        id_mapping_path = os.path.join(os.path.dirname(self.shard_path), "id_mapping.json")
+        with open(id_mapping_path, 'w', encoding='utf-8') as f:
+            json.dump(self.id_mapping, f, indent=2, ensure_ascii=False)
+        return self.shard_path, self.id_mapping
+
+
+def iter_jsonl_shards(records: Iterable,
+                      writer: ShardedJSONLWriter,
+                      build_fn: Optional[Callable[..., Tuple[Dict, Dict]]] = None) -> Iterator[Tuple[str, Dict]]:
+    """
+    Lazily stream (request, mapping_entry) records into shards
+
+    Args:
+        records: Iterable of (request, mapping_entry) records, or of items if build_fn is given
+        writer: Writer the records are appended to
+        build_fn: Optional callable item -> (request, mapping_entry). An item whose build fails
+            is logged and skipped, and the remaining items are still written.
+    Yields:
+        (jsonl_path, id_mapping) for every finished shard
+    """
+    for record in records:
+        if build_fn is not None:
+            try:
+                record = build_fn(record)
+            except Exception as e:
+                print(f"Error building batch request, skipping it: {e}")
+                continue
+        request, mapping_entry = record
+        closed_shard = writer.write(request, mapping_entry)
+        if closed_shard is not None:
+            yield closed_shard
+    closed_shard = writer.close()
+    if closed_shard is not None:
+        yield closed_shard
+
+
+class OpenAIBatchClient:
+    """Thin client for OpenAI's Files and Batch APIs, sharing one HTTP session"""
+    def __init__(self, api_key: str, base_url: str = "https://api.openai.com/v1"):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {self.api_key}"})
+
+    def upload_file(self, file_path: str) -> str:
+        """Upload a JSONL file and return the file ID"""
+        with open(file_path, 'rb') as f:
+            response = self.session.post(
+                f"{self.base_url}/files",
+                files={'file': f},
+                data={"purpose": "batch"}
+            )
+        if response.status_code != 200:
+            raise Exception(f"Failed to upload batch file: {response.text}")
+        return response.json()['id']
+
+    def create_batch(self, file_id: str) -> str:
+        """Create a batch job with the uploaded file and return the batch ID"""
+        payload = {
+            "input_file_id": file_id,
+            "completion_window": "24h",
+            "endpoint": "/v1/chat/completions"
+        }
+        response = self.session.post(f"{self.base_url}/batches", json=payload)
+        if response.status_code != 200:
+            raise Exception(f"Failed to create batch: {response.text}")
+        return response.json()['id']
+
+    def retrieve_batch(self, batch_id: str) -> Dict:
+        """Return the status information of a batch job"""
+        response = self.session.get(f"{self.base_url}/batches/{batch_id}")
+        if response.status_code != 200:
+            raise Exception(f"Failed to check batch status: {response.text}")
+        return response.json()
+
+    def download_file(self, file_id: str) -> bytes:
+        """Return the content of a file"""
+        response = self.session.get(f"{self.base_url}/files/{file_id}/content")
+        if response.status_code != 200:
+            raise Exception(f"Failed to download file {file_id}: {response.text}")
+        return response.content
+
+
+def default_fake_responder(request_body: Dict) -> Dict:
+    """Answer every request with the same valid action pair"""
+    content = json.dumps({"Answer": {"Alice": "forward", "Bob": "forward"}})
+    return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+
+class FakeBatchClient:
+    """
+    In-memory stand-in for OpenAIBatchClient, for unit tests and offline benchmarks.
+    A batch completes `latency` seconds after it is created.
+    """
+    def __init__(self,
+                 latency: float = 1.0,
+                 responder: Callable[[Dict], Dict] = default_fake_responder,
+                 fail_batches: Iterable[int] = (),
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            latency: Seconds between creating a batch and its completion
+            responder: Callable mapping a request body to a chat completion response body
+            fail_batches: Indices (in creation order) of batches that end with status 'failed'
+            clock: Time source
+        """
+        self.latency = latency
+        self.responder = responder
+        self.fail_batches = set(fail_batches)
+        self.clock = clock
+        self.files = {}
+        self.batches = {}
+        self.n_retrieve_calls = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def upload_file(self, file_path: str) -> str:
+        file_id = f"file-{uuid.uuid4().hex}"
+        with open(file_path, 'rb') as f:
+            content = f.read()
+        with self.lock:
+            self.files[file_id] = content
+        return file_id
+
+    def create_batch(self, file_id: str) -> str:
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        with self.lock:
+            requests_list = [json.loads(line) for line in self.files[file_id].decode('utf-8').splitlines() if line]
+            self.batches[batch_id] = {
+                'index': len(self.batches),
+                'input_file_id': file_id,
+                'requests': requests_list,
+                'ready_time': self.clock() + self.latency,
+                'done': False,
+            }
+            n_in_flight = sum(not batch['done'] for batch in self.batches.values())
+            self.max_in_flight = max(self.max_in_flight, n_in_flight)
+        return batch_id
+
+    def retrieve_batch(self, batch_id: str) -> Dict:
+        with self.lock:
+            self.n_retrieve_calls += 1
+            batch = self.batches[batch_id]
+            n_total = len(batch['requests'])
+            if self.clock() < batch['ready_time']:
+                return {'id': batch_id, 'status': 'in_progress',
+                        'request_counts': {'total': n_total, 'completed': 0, 'failed': 0}}
+
+            batch['done'] = True
+            if batch['index'] in self.fail_batches:
+                return {'id': batch_id, 'status': 'failed', 'output_file_id': None,
+                        'request_counts': {'total': n_total, 'completed': 0, 'failed': n_total}}
+
+            output_file_id = f"file-{batch_id}-output"
+            if output_file_id not in self.files:
+                lines = []
+                for request in batch['requests']:
+                    lines.append(json.dumps({
+                        'custom_id': request['custom_id'],
+                        'response': {'status_code': 200, 'body': self.responder(request['body'])}
+                    }))
+                self.files[output_file_id] = ('\n'.join(lines) + '\n').encode('utf-8')
+            return {'id': batch_id, 'status': 'completed', 'output_file_id': output_file_id,
+                    'error_file_id': None,
+                    'request_counts': {'total': n_total, 'completed': n_total, 'failed': 0}}
+
+    def download_file(self, file_id: str) -> bytes:
+        with self.lock:
+            return self.files[file_id]
+
+
+class BatchPipeline:
+    """
+    Pipelined Batch API scheduler:
+    - JSONL files are built in a background thread, ahead of submission;
+    - up to `max_in_flight` batches are outstanding at once;
+    - a single poller checks all outstanding batches with exponential backoff;
+    - `on_complete` is called as soon as each batch reaches a terminal status.
+    """
+    def __init__(self,
+                 client,
+                 build_fn: Callable,
+                 on_complete: Callable,
+                 max_in_flight: int = 4,
+                 prefetch: int = 2,
+                 poll_initial: float = 5.0,
+                 poll_max: float = 120.0,
+                 poll_factor: float = 2.0,
+                 sleep_fn: Callable[[float], None] = time.sleep):
+        """
+        Args:
+            client: Batch API client (OpenAIBatchClient or FakeBatchClient)
+            build_fn: Callable chunk -> (jsonl_path, custom_id_mapping)
+            on_complete: Callable (custom_id_mapping, batch_status) called for every finished batch
+            max_in_flight: Maximum number of batches submitted but not finished
+            prefetch: Number of JSONL files built ahead of the submission slots
+            poll_initial: Initial polling interval in seconds
+            poll_max: Maximum polling interval in seconds
+            poll_factor: Polling interval growth factor while nothing finishes
+            sleep_fn: Sleep function, replaceable in tests
+        """
+        self.client = client
+        self.build_fn = build_fn
+        self.on_complete = on_complete
+        self.max_in_flight = max(1, max_in_flight)
+        self.prefetch = max(0, prefetch)
+        self.poll_initial = poll_initial
+        self.poll_max = poll_max
+        self.poll_factor = poll_factor
+        self.sleep_fn = sleep_fn
+
+    def _submit(self, built) -> Optional[str]:
+        jsonl_path, custom_id_mapping = built
+        file_id = self.client.upload_file(jsonl_path)
+        print(f"Uploaded batch file with ID: {file_id}")
+        batch_id = self.client.create_batch(file_id)
+        print(f"Created batch job with ID: {batch_id} ({len(custom_id_mapping)} requests)")
+        return batch_id
+
+    def run(self, chunks: Iterable) -> Dict[str, int]:
+        """
+        Run all chunks through the pipeline
+
+        Args:
+            chunks: Iterable of chunks, consumed lazily in the build thread (e.g. a generator of
+                already written shards from iter_jsonl_shards with an identity build_fn)
+        Returns:
+            Dictionary with counts of submitted, completed (any terminal status) and errored batches
+        """
+        stats = {'submitted': 0, 'finished': 0, 'errors': 0}
+        chunk_iter = iter(chunks)
+        pending_builds = deque()
+        in_flight = {}
+        exhausted = [False]
+
+        def build_next():
+            # the chunk iterator is consumed in the build thread, so lazy
+            # generators (e.g. iter_jsonl_shards) also run ahead of submission
+            chunk = next(chunk_iter, _END_OF_CHUNKS)
+            return _END_OF_CHUNKS if chunk is _END_OF_CHUNKS else self.build_fn(chunk)
+
+        with ThreadPoolExecutor(max_workers=1) as build_executor:
+            def fill_builds():
+                while not exhausted[0] and len(pending_builds) < self.max_in_flight + self.prefetch:
+                    pending_builds.append(build_executor.submit(build_next))
+
+            delay = self.poll_initial
+            fill_builds()
+            while pending_builds or in_flight:
+                # submit as many prepared batches as the in-flight limit allows
+                while pending_builds and len(in_flight) < self.max_in_flight:
+                    future = pending_builds.popleft()
+                    fill_builds()
+                    try:
+                        built = future.result()
+                    except Exception as e:
+                        # a failed build only loses its own chunk, the next builds go on
+                        print(f"Error building batch: {e}")
+                        stats['errors'] += 1
+                        continue
+                    if built is _END_OF_CHUNKS:
+                        exhausted[0] = True
+                        pending_builds.clear()
+                        break
+                    try:
+                        batch_id = self._submit(built)
+                    except Exception as e:
+                        print(f"Error submitting batch: {e}")
+                        stats['errors'] += 1
+                        continue
+                    in_flight[batch_id] = built[1]
+                    stats['submitted'] += 1
+                    delay = self.poll_initial
+
+                if not in_flight:
+                    continue
+
+                self.sleep_fn(delay)
+                any_finished = False
+                for batch_id in list(in_flight.keys()):
+                    try:
+                        batch_status = self.client.retrieve_batch(batch_id)
+                    except Exception as e:
+                        print(f"Error checking batch {batch_id}: {e}")
+                        continue
+
+                    status = batch_status.get('status', '')
+                    counts = batch_status.get('request_counts', {})
+                    print(f"Batch {batch_id} status: {status} - Completed: {counts.get('completed', 0)}"
+                          f"/{counts.get('total', 0)}, Failed: {counts.get('failed', 0)}")
+                    if status not in TERMINAL_BATCH_STATUS:
+                        continue
+
+                    custom_id_mapping = in_flight.pop(batch_id)
+                    any_finished = True
+                    stats['finished'] += 1
+                    try:
+                        self.on_complete(custom_id_mapping, batch_status)
+                    except Exception as e:
+                        print(f"Error processing batch {batch_id}: {e}")
+                        stats['errors'] += 1
+
+                delay = self.poll_initial if any_finished else min(delay * self.poll_factor, self.poll_max)
+
+        return stats
@@ -1,14 +1,11 @@
-import math
 import os
 import json
 import time
 from typing import List, Dict, Tuple
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.service import Service
 from typing import Tuple
 
+from virl.utils import geodesy
+
 def calculate_bearing(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """
     Calculate the bearing from point A (lat1, lon1) to point B (lat2, lon2)
@@ -22,25 +19,7 @@ def calculate_bearing(lat1: float, lon1: float, lat2: float, lon2: float) -> flo
     Returns:
         Bearing in degrees from north, measured clockwise (0-360)
     """
-    # Convert decimal degrees to radians
-    lat1 = math.radians(lat1)
-    lon1 = math.radians(lon1)
-    lat2 = math.radians(lat2)
-    lon2 = math.radians(lon2)
-    
-    # Calculate longitude difference
-    dLon = lon2 - lon1
-    
-    # Calculate bearing components
-    y = math.sin(dLon) * math.cos(lat2)
-    x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dLon)
-    bearing = math.atan2(y, x)
-    
-    # Convert radians to degrees and normalize to 0-360
-    bearing = math.degrees(bearing)
-    bearing = (bearing + 360) % 360
-    
-    return bearing
+    return float(geodesy.initial_bearing(lat1, lon1, lat2, lon2))
 
 def get_panoids_from_json(json_path: str) -> List[str]:
     """Get all available panoids from the pano.json"""
@@ -91,6 +70,12 @@ def html_to_screenshot(
         output_file: Output image file path (default: 'screenshot.png').
         window_size: Browser window size (width, height) for screenshot (default: 800x600).
     """
+    # importing here so only tries to import if used, route images are rendered without a browser
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+    from webdriver_manager.chrome import ChromeDriverManager
+
     # Verify the input file exists
     if not os.path.exists(html_file_path):
         raise FileNotFoundError(f"HTML file not found: {html_file_path}")
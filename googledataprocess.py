@@ -7,15 +7,18 @@ import polyline
 import time
 import tempfile
 import webbrowser
-from typing import List, Tuple, Dict
-from data_utils import calculate_bearing, parse_pano_json_to_list, html_to_screenshot
+from typing import List, Tuple, Dict, Optional
+from data_utils import calculate_bearing, parse_pano_json_to_list
+from streetview_downloader import StreetViewDownloader
+from route_renderer import StaticRouteRenderer, LocalTileSource
 
 class GoogleDataProcessor:
-    def __init__(self, seed: int, api_key: str):
+    def __init__(self, seed: int, api_key: str, tile_dir: Optional[str] = None):
         """
         Args:
             seed (int): id for place in google data
             api_key (str): Google Map API key
+            tile_dir (str): Optional local slippy map tile directory ({zoom}/{x}/{y}.png) used as route image background
         """
         self.seed = seed
         self.api_key = api_key
@@ -31,6 +34,9 @@ class GoogleDataProcessor:
         self.json_path = os.path.join(self.data_dir, 'pano.json')
         self.url_path = os.path.join(self.data_dir, 'url.txt')
         self.points_html_path = os.path.join(self.data_dir, 'points.html')
+        self.route_renderer = StaticRouteRenderer(
+            tile_source=LocalTileSource(tile_dir) if tile_dir else None
+        )
 
     def extract_graph_data(self, 
             strings_list: List[str]
@@ -119,21 +125,21 @@ class GoogleDataProcessor:
         
         return points_dict
 
-    def download_streetview_images(self) -> None:
-        """Download Google Street View images"""
+    def get_streetview_tasks(self) -> List[Tuple[str, Dict]]:
+        """
+        Returns:
+            List of (filename, params) of the Street View images of the place
+        """
         points_list = parse_pano_json_to_list(self.json_path)
         points_dict = self.add_fore_heading_to_points(points_list)
 
+        tasks = []
         for key, value in points_dict.items():
             latitude, longitude, fore_heading = value
             heading_list = [(fore_heading + i * (360 / self.cam_num)) % 360 for i in range(self.cam_num)]
                 
             for heading, label in zip(heading_list, self.view_label_list):
                 filename = f"id_{key}_{label}.jpg"
-                if os.path.exists(os.path.join(self.data_dir, filename)):
-                    print(f"File {filename} already exists, skipping download.")
-                    continue
-
                 params = {
                     'size': '640x640',
                     'location': f'{latitude},{longitude}',
@@ -143,15 +149,33 @@ class GoogleDataProcessor:
                     'pitch': 30,
                     'key': self.api_key
                 }
+                tasks.append((filename, params))
+        return tasks
+
+    def download_streetview_images(self, 
+            max_workers: int = 8,
+            rate: float = 20.0,
+            fetcher=None
+        ) -> Dict[str, str]:
+        """
+        Download Google Street View images concurrently.
+        Progress is tracked in googledata/place{N}/manifest.jsonl, so an interrupted
+        download can be resumed and truncated images are downloaded again.
 
-                response = requests.get(self.street_view_url, params=params)
-                if response.status_code == 200:   
-                    filepath = os.path.join(self.data_dir, filename)
-                    with open(filepath, "wb") as f:
-                        f.write(response.content)
-                    print(f"Saved to {filepath}")
-                else:
-                    print(f"Error state: {response.status_code}. Error msg: {response.text}")
+        Args:
+            max_workers: Number of concurrent downloads
+            rate: Maximum requests per second
+            fetcher: Optional callable (url, params) -> FetchResult, e.g. for a local stub
+        Returns:
+            Dictionary with filename as key and download status as value
+        """
+        tasks = self.get_streetview_tasks()
+
+        downloader = StreetViewDownloader(
+            self.data_dir, base_url=self.street_view_url, fetcher=fetcher,
+            max_workers=max_workers, rate=rate
+        )
+        return downloader.download(tasks)
     
     def plot_points(self, nodes: Dict[str, Dict[str, float]]) -> None:
         """
@@ -360,8 +384,8 @@ class GoogleDataProcessor:
         )
 
         for time_index in range(1):
-            # plot the route with time index
-            html_path = self.plot_route(
+            # render the route with time index directly to an image, without a browser
+            self.render_route_image(
                 rendezvous_point=rendezvous_point,
                 alice_points_list=alice_points_list,
                 bob_points_list=bob_points_list,
@@ -370,11 +394,28 @@ class GoogleDataProcessor:
             )
             print(f"Plotted route with time index {time_index} for trajectory {traj_id}")
 
-            # convert the html to screenshot
-            output_file = f'./textdata/traj{traj_id}/route_{time_index}.png'
-            html_to_screenshot(html_path, output_file)
-            # delete the html file
-            os.remove(html_path)
+    def render_route_image(self,
+            rendezvous_point: Tuple[str, Tuple[float, float]],
+            alice_points_list: List[Tuple[str, Tuple[float, float]]],
+            bob_points_list: List[Tuple[str, Tuple[float, float]]],
+            traj_id: int,
+            time_index: int
+        ) -> str:
+        """
+        Render the route with time index to ./textdata/traj{traj_id}/route_{time_index}.png.
+        Same map as plot_route with time_index (zoom 17, centered on the rendezvous point),
+        rasterized with StaticRouteRenderer instead of a browser screenshot.
+
+        Returns:
+            Path of the saved image
+        """
+        output_file = f'./textdata/traj{traj_id}/route_{time_index}.png'
+        self.route_renderer.render(
+            rendezvous_point, alice_points_list, bob_points_list, output_file,
+            zoom=17, time_index=time_index
+        )
+        print(f"Route image saved to {output_file}")
+        return output_file
 
     def set_api_key(self, api_key: str) -> None:
         """Set Google Maps API key"""
@@ -615,9 +656,12 @@ if __name__ == "__main__":
     parser.add_argument("--traj-id", type=int, default=-1, help="Trajectory ID for write mode")
     parser.add_argument("--stride", type=int, default=1, help="Stride for sampling points in write mode")
     parser.add_argument("--pano-id", type=str, default=None, help="Pano ID for write mode, if not provided, will sample points automatically")
+    parser.add_argument("--workers", type=int, default=8, help="Number of concurrent downloads for download mode")
+    parser.add_argument("--rate", type=float, default=20.0, help="Maximum requests per second for download mode")
+    parser.add_argument("--tile-dir", type=str, default=None, help="Local map tile directory ({zoom}/{x}/{y}.png) for route images in write mode")
     args = parser.parse_args()
 
-    processor = GoogleDataProcessor(seed=args.seed, api_key=args.api_key)
+    processor = GoogleDataProcessor(seed=args.seed, api_key=args.api_key, tile_dir=args.tile_dir)
     
     if args.mode == "auto":
         if not args.start or not args.end:
@@ -631,7 +675,7 @@ if __name__ == "__main__":
     if args.function == "process":
         processor.process_urls_to_json()
     elif args.function == "download":
-        processor.download_streetview_images()
+        processor.download_streetview_images(max_workers=args.workers, rate=args.rate)
     elif args.function == "write":
         processor.write_traj_metainfo(
             traj_id=args.traj_id,
@@ -0,0 +1,181 @@
+import io
+import os
+import json
+import time
+import base64
+import hashlib
+import tempfile
+import warnings
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+from PIL import Image
+
+
+def encode_image_bytes(image_path: str,
+                       image_resize: Optional[Tuple[int, int]] = None,
+                       image_quality: Optional[int] = 85) -> bytes:
+    """
+    Encode an image into the JPEG bytes sent to the VLM API.
+    An image PIL cannot process is sent as its raw file bytes.
+
+    Args:
+        image_path: Path to the image file
+        image_resize: Optional tuple (width, height) to resize the image
+        image_quality: JPEG quality for re-encoding, None to send the raw file bytes
+    Returns:
+        Encoded image bytes
+    """
+    if image_quality is None and image_resize is None:
+        with open(image_path, "rb") as f:
+            return f.read()
+
+    try:
+        with Image.open(image_path) as img:
+            if image_resize:
+                img = img.resize(image_resize, Image.LANCZOS)
+            buffer = io.BytesIO()
+            img.save(buffer, format="JPEG", quality=image_quality or 85, optimize=True)
+            return buffer.getvalue()
+    except (OSError, ValueError) as e:
+        warnings.warn(f"Cannot re-encode image {image_path}, sending the raw file: {e}")
+        with open(image_path, "rb") as f:
+            return f.read()
+
+
+def encode_image_payload(image_path: str,
+                         image_resize: Optional[Tuple[int, int]] = None,
+                         image_quality: Optional[int] = 85) -> str:
+    """Base64 payload of encode_image_bytes"""
+    return base64.b64encode(encode_image_bytes(image_path, image_resize, image_quality)).decode('utf-8')
+
+
+def _timed_encode(args: Tuple) -> Tuple[str, str, float]:
+    """Worker function for the process pool"""
+    image_path, image_resize, image_quality = args
+    start = time.perf_counter()
+    payload = encode_image_payload(image_path, image_resize, image_quality)
+    return image_path, payload, time.perf_counter() - start
+
+
+class ImagePayloadCache:
+    """
+    On-disk cache of encoded image payloads, keyed by
+    (path, mtime, size, resize policy, JPEG quality).
+    Entries are sharded files written atomically, so the cache can be shared across runs.
+    """
+    def __init__(self,
+                 cache_dir: str,
+                 image_resize: Optional[Tuple[int, int]] = None,
+                 image_quality: Optional[int] = 85):
+        """
+        Args:
+            cache_dir: Directory to store the payloads
+            image_resize: Optional tuple (width, height) to resize images
+            image_quality: JPEG quality for re-encoding, None to send the raw file bytes
+        """
+        self.cache_dir = cache_dir
+        self.image_resize = tuple(image_resize) if image_resize else None
+        self.image_quality = image_quality
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.lock = threading.Lock()
+        # keys encoded by warm() in this run, their first use is not a saving
+        self.warmed_keys = set()
+        self.hits = 0
+        self.misses = 0
+        self.encode_time_spent = 0.0
+        self.encode_time_saved = 0.0
+
+    def _key(self, image_path: str) -> str:
+        stat = os.stat(image_path)
+        raw_key = json.dumps([
+            os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size,
+            self.image_resize, self.image_quality
+        ])
+        return hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _load(self, key: str) -> Optional[Dict]:
+        entry_path = self._entry_path(key)
+        if not os.path.exists(entry_path):
+            return None
+        try:
+            with open(entry_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return None
+
+    def _store(self, key: str, payload: str, encode_time: float) -> None:
+        entry_path = self._entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(entry_path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'encode_time': encode_time, 'payload': payload}, f)
+        os.replace(tmp_path, entry_path)
+
+    def get_base64(self, image_path: str) -> str:
+        """Return the base64 payload of an image, encoding and caching it on a miss"""
+        key = self._key(image_path)
+        entry = self._load(key)
+        if entry is not None:
+            with self.lock:
+                if key in self.warmed_keys:
+                    self.warmed_keys.discard(key)
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                    self.encode_time_saved += entry['encode_time']
+            return entry['payload']
+
+        _, payload, encode_time = _timed_encode((image_path, self.image_resize, self.image_quality))
+        self._store(key, payload, encode_time)
+        with self.lock:
+            self.misses += 1
+            self.encode_time_spent += encode_time
+        return payload
+
+    def warm(self, image_paths: Iterable[str], max_workers: Optional[int] = None) -> int:
+        """
+        Encode all uncached images in parallel with a process pool
+
+        Returns:
+            Number of newly encoded images
+        """
+        missing = {}
+        for image_path in set(image_paths):
+            if os.path.exists(image_path):
+                key = self._key(image_path)
+                if not os.path.exists(self._entry_path(key)):
+                    missing[image_path] = key
+        if not missing:
+            return 0
+
+        tasks = [(image_path, self.image_resize, self.image_quality) for image_path in missing]
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for image_path, payload, encode_time in executor.map(_timed_encode, tasks, chunksize=8):
+                self._store(missing[image_path], payload, encode_time)
+                self.warmed_keys.add(missing[image_path])
+                self.encode_time_spent += encode_time
+
+        print(f"Warmed image payload cache with {len(missing)} images")
+        return len(missing)
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total > 0 else 0.0,
+            'encode_time_spent': self.encode_time_spent,
+            'encode_time_saved': self.encode_time_saved,
+        }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (f"Image payload cache: {stats['hits']} hits / {stats['misses']} misses "
+                f"(hit ratio {stats['hit_ratio']:.2%}), encode time spent {stats['encode_time_spent']:.2f}s, "
+                f"saved {stats['encode_time_saved']:.2f}s")
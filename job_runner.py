@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import random
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional
+
+# job statuses that satisfy the dependencies of downstream jobs
+FINISHED_STATUS = ('done', 'skipped')
+
+
+class Job:
+    """A single stage of the processing of one place"""
+    def __init__(self,
+                 job_id: str,
+                 stage: str,
+                 fn: Callable[[], Optional[str]],
+                 deps: Optional[List[str]] = None,
+                 should_run: Optional[Callable[[], bool]] = None):
+        """
+        Args:
+            job_id: Unique id of the job, e.g. 'place3/download'
+            stage: Stage name, used for the per-stage concurrency limits
+            fn: Callable doing the work, raises on failure
+            deps: Ids of the jobs that must be finished before this one
+            should_run: Optional callable checked right before running, the job is skipped if it returns False
+        """
+        self.job_id = job_id
+        self.stage = stage
+        self.fn = fn
+        self.deps = deps or []
+        self.should_run = should_run
+
+
+class JobState:
+    """
+    Persisted status of every job plus the trajectory ids assigned to places.
+    Every update rewrites the JSON file atomically (temp file + os.replace),
+    so an interrupted run can be resumed from it.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.RLock()
+        self.jobs = {}
+        self.traj_ids = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.jobs = data.get('jobs', {})
+                self.traj_ids = data.get('traj_ids', {})
+            except (json.JSONDecodeError, OSError):
+                print(f"Job state {path} is corrupted, start from an empty state.")
+
+    def status(self, job_id: str) -> Optional[str]:
+        with self.lock:
+            return self.jobs.get(job_id, {}).get('status')
+
+    def update(self, job_id: str, **entry) -> None:
+        with self.lock:
+            self.jobs.setdefault(job_id, {}).update(entry)
+            self._write()
+
+    def allocate_traj_id(self, key: str, textdata_dir: str = 'textdata', start: int = 0) -> int:
+        """
+        Atomically assign a trajectory id to `key` (e.g. a place).
+        The id is claimed by creating textdata/traj{id} with os.mkdir, which fails if the folder exists,
+        so concurrent allocators (threads or processes) never share an id. The assignment is persisted,
+        so a resumed run reuses the same id.
+        """
+        with self.lock:
+            if key in self.traj_ids:
+                return self.traj_ids[key]
+
+            traj_id = max([start] + [traj_id + 1 for traj_id in self.traj_ids.values()])
+            os.makedirs(textdata_dir, exist_ok=True)
+            while True:
+                try:
+                    os.mkdir(os.path.join(textdata_dir, f'traj{traj_id}'))
+                    break
+                except FileExistsError:
+                    traj_id += 1
+
+            self.traj_ids[key] = traj_id
+            self._write()
+            return traj_id
+
+    def _write(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'jobs': self.jobs, 'traj_ids': self.traj_ids}, f, indent=4, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+class DAGRunner:
+    """
+    Runs a DAG of jobs on a thread pool. Independent jobs run concurrently, limited per stage,
+    failed jobs are retried with jittered exponential backoff, and jobs already finished
+    according to the persisted JobState are not run again.
+    """
+    def __init__(self,
+                 jobs: List[Job],
+                 state: JobState,
+                 max_workers: int = 4,
+                 stage_limits: Optional[Dict[str, int]] = None,
+                 max_retries: int = 2,
+                 backoff_base: float = 1.0,
+                 backoff_max: float = 30.0):
+        """
+        Args:
+            jobs: Jobs of the DAG, dependencies must refer to jobs in the list
+            state: Persisted job state
+            max_workers: Total number of jobs running at once
+            stage_limits: {stage: maximum number of concurrent jobs of the stage}
+            max_retries: Number of retries after the first failed attempt of a job
+            backoff_base: Base delay in seconds of the retry backoff
+            backoff_max: Maximum delay in seconds of a single backoff
+        """
+        self.jobs = {job.job_id: job for job in jobs}
+        for job in jobs:
+            for dep in job.deps:
+                assert dep in self.jobs, f'Job {job.job_id} depends on unknown job {dep}'
+        self.state = state
+        self.max_workers = max_workers
+        self.stage_limits = stage_limits or {}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def _execute(self, job: Job) -> str:
+        if job.should_run is not None and not job.should_run():
+            return 'skipped'
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                job.fn()
+                return 'done'
+            except Exception as e:
+                print(f"Job {job.job_id} failed (attempt {attempt + 1}/{self.max_retries + 1}): {e}")
+                self.state.update(job.job_id, status='running', attempts=attempt + 1, error=str(e))
+                if attempt < self.max_retries:
+                    time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt))))
+        return 'failed'
+
+    def run(self) -> Dict[str, str]:
+        """
+        Returns:
+            Dictionary with job id as key and final status as value
+            (done, skipped, failed, or blocked if a dependency failed)
+        """
+        statuses = {}
+        for job_id in self.jobs:
+            if self.state.status(job_id) in FINISHED_STATUS:
+                statuses[job_id] = self.state.status(job_id)
+        pending = [job_id for job_id in self.jobs if job_id not in statuses]
+        running = {}
+        stage_running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                progressed = False
+                for job_id in list(pending):
+                    job = self.jobs[job_id]
+                    dep_statuses = [statuses.get(dep) for dep in job.deps]
+                    if any(status in ('failed', 'blocked') for status in dep_statuses):
+                        pending.remove(job_id)
+                        statuses[job_id] = 'blocked'
+                        self.state.update(job_id, status='blocked')
+                        progressed = True
+                        continue
+                    if not all(status in FINISHED_STATUS for status in dep_statuses):
+                        continue
+                    limit = self.stage_limits.get(job.stage)
+                    if len(running) >= self.max_workers or (
+                            limit is not None and stage_running.get(job.stage, 0) >= limit):
+                        continue
+
+                    pending.remove(job_id)
+                    stage_running[job.stage] = stage_running.get(job.stage, 0) + 1
+                    self.state.update(job_id, status='running')
+                    running[executor.submit(self._execute, job)] = job_id
+                    progressed = True
+
+                if not running:
+                    if not progressed and pending:
+                        raise ValueError(f'Jobs {pending} can never run, the dependencies contain a cycle')
+                    continue
+
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    job_id = running.pop(future)
+                    job = self.jobs[job_id]
+                    stage_running[job.stage] -= 1
+                    try:
+                        status = future.result()
+                    except Exception as e:
+                        print(f"Job {job_id} crashed: {e}")
+                        status = 'failed'
+                    statuses[job_id] = status
+                    self.state.update(job_id, status=status)
+                    print(f"Job {job_id}: {status}")
+
+        return statuses
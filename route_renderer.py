@@ -0,0 +1,167 @@
+import os
+import math
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+TILE_SIZE = 256
+# Web-Mercator is undefined at the poles, latitudes are clipped like in the slippy map tiles
+MAX_LATITUDE = 85.05112878
+
+# colors of the folium route map
+ROUTE_COLORS = {'Alice': (255, 165, 0), 'Bob': (255, 0, 0)}
+TIME_INDEX_COLORS = {'Alice': (56, 170, 221), 'Bob': (210, 82, 185)}
+RENDEZVOUS_COLOR = (114, 176, 38)
+BACKGROUND_COLOR = (242, 239, 233)
+
+
+def latlng_to_world_pixel(lat: float, lng: float, zoom: int) -> Tuple[float, float]:
+    """
+    Project (lat, lng) to Web-Mercator world pixel coordinates at a zoom level
+
+    Returns:
+        Tuple of (x, y), the origin is the top-left corner of tile (0, 0)
+    """
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    scale = TILE_SIZE * (2 ** zoom)
+    x = (lng + 180.0) / 360.0 * scale
+    sin_lat = math.sin(math.radians(lat))
+    y = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * scale
+    return x, y
+
+
+class LocalTileSource:
+    """
+    Optional offline map imagery from a local slippy map tile directory laid out as
+    {tile_dir}/{zoom}/{x}/{y}.png (e.g. tiles pre-downloaded with any tile downloader)
+    """
+    def __init__(self, tile_dir: str, ext: str = 'png'):
+        self.tile_dir = tile_dir
+        self.ext = ext
+
+    def get_tile(self, zoom: int, x: int, y: int) -> Optional[Image.Image]:
+        tile_path = os.path.join(self.tile_dir, str(zoom), str(x), f"{y}.{self.ext}")
+        if not os.path.exists(tile_path):
+            return None
+        with Image.open(tile_path) as tile:
+            return tile.convert('RGB')
+
+
+class StaticRouteRenderer:
+    """
+    Browser-free renderer of the Alice/Bob route maps. Draws the polylines, the markers and
+    the rendezvous point in a Web-Mercator projection with PIL, over plain background or
+    local tiles. The output only depends on the inputs, so renders are reproducible.
+    """
+    def __init__(self,
+                 size: Tuple[int, int] = (512, 512),
+                 tile_source: Optional[LocalTileSource] = None,
+                 line_width: int = 5,
+                 marker_radius: int = 5,
+                 line_opacity: float = 0.8):
+        """
+        Args:
+            size: Output image size (width, height)
+            tile_source: Optional source of background tiles, e.g. LocalTileSource
+            line_width: Width of the route polylines in pixels
+            marker_radius: Radius of the point markers in pixels
+            line_opacity: Opacity of the route polylines
+        """
+        self.size = size
+        self.tile_source = tile_source
+        self.line_width = line_width
+        self.marker_radius = marker_radius
+        self.line_opacity = line_opacity
+
+    def _background(self, center_px: Tuple[float, float], zoom: int) -> Image.Image:
+        width, height = self.size
+        image = Image.new('RGB', self.size, BACKGROUND_COLOR)
+        if self.tile_source is None:
+            return image
+
+        left, top = center_px[0] - width / 2, center_px[1] - height / 2
+        n_tiles = 2 ** zoom
+        for tile_x in range(int(left // TILE_SIZE), int((left + width) // TILE_SIZE) + 1):
+            for tile_y in range(int(top // TILE_SIZE), int((top + height) // TILE_SIZE) + 1):
+                if not 0 <= tile_y < n_tiles:
+                    continue
+                tile = self.tile_source.get_tile(zoom, tile_x % n_tiles, tile_y)
+                if tile is not None:
+                    image.paste(tile, (int(round(tile_x * TILE_SIZE - left)), int(round(tile_y * TILE_SIZE - top))))
+        return image
+
+    def _draw_star(self, draw: ImageDraw.ImageDraw, center: Tuple[float, float], radius: float, color) -> None:
+        """Star marker standing in for the folium star icon"""
+        cx, cy = center
+        points = []
+        for i in range(10):
+            r = radius if i % 2 == 0 else radius * 0.45
+            angle = math.pi / 5 * i - math.pi / 2
+            points.append((cx + r * math.cos(angle), cy + r * math.sin(angle)))
+        draw.ellipse([cx - radius - 3, cy - radius - 3, cx + radius + 3, cy + radius + 3],
+                     fill=color, outline=(255, 255, 255), width=2)
+        draw.polygon(points, fill=(255, 255, 255))
+
+    def render(self,
+               rendezvous_point: Tuple[str, Tuple[float, float]],
+               alice_points_list: List[Tuple[str, Tuple[float, float]]],
+               bob_points_list: List[Tuple[str, Tuple[float, float]]],
+               output_file: str,
+               zoom: int = 17,
+               time_index: Optional[int] = None) -> str:
+        """
+        Render the route map centered on the rendezvous point and save it as PNG
+
+        Args:
+            rendezvous_point: Tuple with pano_id and (lat, lng) of the rendezvous point
+            alice_points_list: List of tuples with (pano_id, (lat, lng))
+            bob_points_list: List of tuples with (pano_id, (lat, lng))
+            output_file: Output PNG path
+            zoom: Web-Mercator zoom level
+            time_index: Index of points to highlight with special markers (optional)
+
+        Returns:
+            Path of the saved image
+        """
+        _, rendezvous_location = rendezvous_point
+        center_px = latlng_to_world_pixel(*rendezvous_location, zoom)
+        width, height = self.size
+
+        def to_image(location):
+            x, y = latlng_to_world_pixel(location[0], location[1], zoom)
+            return x - center_px[0] + width / 2, y - center_px[1] + height / 2
+
+        image = self._background(center_px, zoom).convert('RGBA')
+
+        # polylines are drawn on an overlay to apply their opacity
+        overlay = Image.new('RGBA', self.size, (0, 0, 0, 0))
+        overlay_draw = ImageDraw.Draw(overlay)
+        alpha = int(round(255 * self.line_opacity))
+        routes = [('Alice', alice_points_list), ('Bob', bob_points_list)]
+        for agent, points_list in routes:
+            coords = [to_image(coord) for _, coord in points_list] + [to_image(rendezvous_location)]
+            if len(coords) > 1:
+                overlay_draw.line(coords, fill=ROUTE_COLORS[agent] + (alpha,), width=self.line_width, joint='curve')
+        image = Image.alpha_composite(image, overlay)
+
+        draw = ImageDraw.Draw(image)
+        r = self.marker_radius
+        highlighted = []
+        for agent, points_list in routes:
+            for i, (_, coord) in enumerate(points_list):
+                x, y = to_image(coord)
+                if time_index is not None and i == time_index:
+                    highlighted.append((agent, (x, y)))
+                    continue
+                draw.ellipse([x - r, y - r, x + r, y + r], fill=ROUTE_COLORS[agent], outline=ROUTE_COLORS[agent])
+
+        # markers are drawn last so they stay on top of the plain points
+        self._draw_star(draw, to_image(rendezvous_location), r + 4, RENDEZVOUS_COLOR)
+        for agent, center in highlighted:
+            self._draw_star(draw, center, r + 4, TIME_INDEX_COLORS[agent])
+
+        output_dir = os.path.dirname(output_file)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        image.convert('RGB').save(output_file, format='PNG')
+        return output_file
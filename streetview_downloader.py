@@ -0,0 +1,267 @@
+import os
+import json
+import time
+import random
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from virl.utils.common_utils import TokenBucket
+
+# status codes that are worth retrying
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class FetchResult:
+    """Minimal response returned by a fetcher"""
+    def __init__(self, status_code: int, content: bytes = b'', text: str = ''):
+        self.status_code = status_code
+        self.content = content
+        self.text = text
+
+
+class SessionFetcher:
+    """Default fetch layer: a shared requests.Session with a connection pool"""
+    def __init__(self, pool_size: int = 16, timeout: float = 30.0):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def __call__(self, url: str, params: Dict) -> FetchResult:
+        response = self.session.get(url, params=params, timeout=self.timeout)
+        return FetchResult(response.status_code, response.content, response.text)
+
+
+class DownloadManifest:
+    """
+    Append-only JSONL manifest tracking status, byte size and sha256 of every downloaded file.
+    Every update appends one line, the last line of a file wins. On load the log is compacted
+    to one line per file (temp file + os.replace), and a partially written last line left by
+    a crash is dropped. A manifest.json of the previous format next to it is migrated.
+    The append handle is opened on the first update and released by close().
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries, needs_compaction = self._read(path)
+        if needs_compaction:
+            self._compact()
+        self.file = None
+
+    @staticmethod
+    def read_entries(path: str) -> Dict[str, Dict]:
+        """Entries of a manifest without opening it for writing, e.g. to check if a download is complete"""
+        return DownloadManifest._read(path)[0]
+
+    @staticmethod
+    def _read(path: str) -> Tuple[Dict[str, Dict], bool]:
+        entries = {}
+        legacy_path = os.path.splitext(path)[0] + '.json'
+        if legacy_path != path and os.path.exists(legacy_path) and not os.path.exists(path):
+            try:
+                with open(legacy_path, 'r', encoding='utf-8') as f:
+                    entries = json.load(f).get('files', {})
+            except (json.JSONDecodeError, OSError):
+                print(f"Manifest {legacy_path} is corrupted, start from an empty manifest.")
+
+        n_lines, is_corrupted = 0, False
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        print(f"Drop a corrupted line of manifest {path}.")
+                        is_corrupted = True
+                        continue
+                    n_lines += 1
+                    entries[record.pop('file')] = record
+
+        # rewriting also drops a torn last line, the next append must not continue it
+        return entries, is_corrupted or n_lines != len(entries) or not os.path.exists(path)
+
+    def is_complete(self, filename: str, data_dir: str, verify_checksum: bool = False) -> bool:
+        """A file is complete only if the manifest says so and the file on disk matches it"""
+        entry = self.entries.get(filename)
+        if entry is None or entry.get('status') != 'done':
+            return False
+        filepath = os.path.join(data_dir, filename)
+        if not os.path.exists(filepath) or os.path.getsize(filepath) != entry['bytes']:
+            return False
+        if verify_checksum:
+            with open(filepath, 'rb') as f:
+                return hashlib.sha256(f.read()).hexdigest() == entry['sha256']
+        return True
+
+    def update(self, filename: str, **entry) -> None:
+        line = json.dumps({'file': filename, **entry}, ensure_ascii=False) + '\n'
+        with self.lock:
+            self.entries[filename] = entry
+            if self.file is None:
+                self.file = open(self.path, 'a', encoding='utf-8')
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self) -> None:
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def _compact(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                for filename, entry in self.entries.items():
+                    f.write(json.dumps({'file': filename, **entry}, ensure_ascii=False) + '\n')
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+class StreetViewDownloader:
+    """
+    Bounded-concurrency Street View downloader with rate limiting, retry with
+    jittered exponential backoff and a resumable manifest.
+    """
+    def __init__(self,
+                 data_dir: str,
+                 base_url: str = "https://maps.googleapis.com/maps/api/streetview",
+                 fetcher: Optional[Callable[[str, Dict], FetchResult]] = None,
+                 max_workers: int = 8,
+                 rate: float = 20.0,
+                 max_retries: int = 4,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 30.0,
+                 manifest_name: str = 'manifest.jsonl'):
+        """
+        Args:
+            data_dir: Directory to save the images and the manifest
+            base_url: Street View static API endpoint (can point to a local stub)
+            fetcher: Callable (url, params) -> FetchResult, default is a pooled requests.Session
+            max_workers: Number of concurrent downloads
+            rate: Maximum requests per second shared by all workers (<= 0 to disable)
+            max_retries: Number of retries after the first failed attempt
+            backoff_base: Base delay in seconds of the exponential backoff
+            backoff_max: Maximum delay in seconds of a single backoff
+            manifest_name: File name of the manifest under data_dir
+        """
+        self.data_dir = data_dir
+        self.base_url = base_url
+        self.fetcher = fetcher if fetcher is not None else SessionFetcher(pool_size=max_workers)
+        self.max_workers = max_workers
+        self.rate_limiter = TokenBucket(rate)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.manifest = DownloadManifest(os.path.join(data_dir, manifest_name))
+
+    def _backoff(self, attempt: int) -> float:
+        # "full jitter" backoff
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def download_one(self, filename: str, params: Dict) -> Tuple[str, str]:
+        """
+        Download a single image with retries and record it in the manifest
+
+        Returns:
+            Tuple of (filename, status), status in ['done', 'skipped', 'failed']
+        """
+        if self.manifest.is_complete(filename, self.data_dir) or self._adopt_existing(filename):
+            return filename, 'skipped'
+
+        error_msg = None
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                response = self.fetcher(self.base_url, params)
+            except requests.RequestException as e:
+                error_msg = str(e)
+            else:
+                if response.status_code == 200 and len(response.content) > 0:
+                    self._save(filename, response.content)
+                    return filename, 'done'
+                error_msg = f"Error state: {response.status_code}. Error msg: {response.text}"
+                if response.status_code not in RETRY_STATUS_CODES:
+                    break
+
+            if attempt < self.max_retries:
+                time.sleep(self._backoff(attempt))
+
+        print(f"Failed to download {filename}. {error_msg}")
+        self.manifest.update(filename, status='failed', error=error_msg)
+        return filename, 'failed'
+
+    def _adopt_existing(self, filename: str) -> bool:
+        """Record images downloaded before the manifest existed, if they are complete JPEGs"""
+        filepath = os.path.join(self.data_dir, filename)
+        if filename in self.manifest.entries or not os.path.exists(filepath):
+            return False
+        with open(filepath, 'rb') as f:
+            content = f.read()
+        # a complete JPEG starts with the SOI marker and ends with the EOI marker
+        if not (content[:2] == b'\xff\xd8' and content.rstrip(b'\x00')[-2:] == b'\xff\xd9'):
+            return False
+        self.manifest.update(
+            filename, status='done', bytes=len(content),
+            sha256=hashlib.sha256(content).hexdigest()
+        )
+        return True
+
+    def _save(self, filename: str, content: bytes) -> None:
+        # write to a temp file first so a crash never leaves a truncated image under the final name
+        filepath = os.path.join(self.data_dir, filename)
+        tmp_path = filepath + '.part'
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, filepath)
+        self.manifest.update(
+            filename, status='done', bytes=len(content),
+            sha256=hashlib.sha256(content).hexdigest()
+        )
+
+    def download(self, tasks: List[Tuple[str, Dict]]) -> Dict[str, str]:
+        """
+        Download all tasks concurrently
+
+        Args:
+            tasks: List of (filename, params) tuples
+
+        Returns:
+            Dictionary with filename as key and status as value
+        """
+        results = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {executor.submit(self.download_one, filename, params): filename for filename, params in tasks}
+                for future in as_completed(futures):
+                    try:
+                        filename, status = future.result()
+                    except Exception as e:
+                        # e.g. a custom fetcher raising something else than a requests exception
+                        filename, status = futures[future], 'failed'
+                        print(f"Failed to download {filename}. {e!r}")
+                        self.manifest.update(filename, status='failed', error=repr(e))
+                    results[filename] = status
+                    if status == 'done':
+                        print(f"Saved to {os.path.join(self.data_dir, filename)}")
+                    elif status == 'skipped':
+                        print(f"File {filename} already exists, skipping download.")
+        finally:
+            # release the manifest handle, a later update reopens it
+            self.manifest.close()
+
+        n_done = sum(status == 'done' for status in results.values())
+        n_failed = sum(status == 'failed' for status in results.values())
+        print(f"Downloaded {n_done}, skipped {len(results) - n_done - n_failed}, failed {n_failed} images.")
+        return results
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the top-level scripts (batch_api, streetview_downloader, ...) are not part of the virl package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
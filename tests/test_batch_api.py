@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+pytest.importorskip('requests')
+
+from batch_api import BatchPipeline, FakeBatchClient
+
+
+class FakeClock:
+    """Time source advanced only by the pipeline's sleep_fn"""
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def write_chunk(tmp_path, chunk):
+    path = tmp_path / f"chunk_{chunk[0]}.jsonl"
+    custom_id_mapping = {}
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in chunk:
+            custom_id = f"0_{i}"
+            custom_id_mapping[custom_id] = {"traj": "0", "pair_id": str(i)}
+            f.write(json.dumps({"custom_id": custom_id, "body": {}}) + '\n')
+    return str(path), custom_id_mapping
+
+
+def run_pipeline(tmp_path, client, clock, chunks, **kwargs):
+    merged = []
+
+    def on_complete(custom_id_mapping, batch_status):
+        merged.append(sorted(custom_id_mapping.values(), key=lambda entry: int(entry['pair_id'])))
+
+    pipeline = BatchPipeline(
+        client, lambda chunk: write_chunk(tmp_path, chunk), on_complete, sleep_fn=clock.sleep, **kwargs
+    )
+    stats = pipeline.run(chunks)
+    return stats, merged
+
+
+def test_in_flight_limit(tmp_path):
+    clock = FakeClock()
+    client = FakeBatchClient(latency=3.0, clock=clock)
+    chunks = [[i * 2, i * 2 + 1] for i in range(6)]
+    stats, merged = run_pipeline(tmp_path, client, clock, chunks, max_in_flight=2, poll_initial=1.0)
+
+    assert stats == {'submitted': 6, 'finished': 6, 'errors': 0}
+    assert client.max_in_flight == 2
+    assert sum(len(entries) for entries in merged) == 12
+
+
+def test_poll_backoff(tmp_path):
+    clock = FakeClock()
+    client = FakeBatchClient(latency=10.0, clock=clock)
+    run_pipeline(tmp_path, client, clock, [[0]], poll_initial=1.0, poll_max=4.0, poll_factor=2.0)
+
+    # the interval doubles while nothing finishes and is capped at poll_max
+    assert clock.sleeps == [1.0, 2.0, 4.0, 4.0]
+
+
+def test_merge_order_and_failed_batch(tmp_path):
+    clock = FakeClock()
+    client = FakeBatchClient(latency=2.0, clock=clock, fail_batches=[1])
+    chunks = [[0, 1], [2, 3], [4, 5]]
+    stats, merged = run_pipeline(tmp_path, client, clock, chunks, max_in_flight=3, poll_initial=1.0)
+
+    # a failed batch still reaches on_complete, and batches are merged in completion order
+    assert stats == {'submitted': 3, 'finished': 3, 'errors': 0}
+    assert [[entry['pair_id'] for entry in entries] for entries in merged] == [['0', '1'], ['2', '3'], ['4', '5']]
@@ -0,0 +1,86 @@
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+geopy_distance = pytest.importorskip('geopy.distance')
+
+from virl.utils import geocode_utils, geodesy
+
+geodesic = geopy_distance.geodesic
+
+
+def unit_vector(point):
+    lat, lng = math.radians(point[0]), math.radians(point[1])
+    return np.array([math.cos(lat) * math.cos(lng), math.cos(lat) * math.sin(lng), math.sin(lat)])
+
+
+def reference_bearing(point_a, point_b):
+    # an independent construction: project the chord towards point_b onto the local east and north axes
+    lat, lng = math.radians(point_a[0]), math.radians(point_a[1])
+    east = np.array([-math.sin(lng), math.cos(lng), 0.0])
+    north = np.array([-math.sin(lat) * math.cos(lng), -math.sin(lat) * math.sin(lng), math.cos(lat)])
+    chord = unit_vector(point_b) - unit_vector(point_a)
+    return math.degrees(math.atan2(chord @ east, chord @ north)) % 360
+
+
+@pytest.fixture
+def pairs():
+    """Pairs within a city (the common case) and pairs across the globe"""
+    rng = np.random.default_rng(1)
+    n = 500
+    points_a = np.stack([rng.uniform(-80, 80, n), rng.uniform(-180, 180, n)], axis=1)
+    points_b = points_a + rng.normal(0, 0.01, (n, 2))
+    points_b[:n // 4] = np.stack([rng.uniform(-80, 80, n // 4), rng.uniform(-180, 180, n // 4)], axis=1)
+    return points_a, points_b
+
+
+def test_vincenty_distance_matches_geopy(pairs):
+    points_a, points_b = pairs
+    reference = np.array([geodesic(a, b).meters for a, b in zip(points_a, points_b)])
+    np.testing.assert_allclose(geodesy.distance(points_a, points_b), reference, rtol=0, atol=1e-3)
+
+
+def test_haversine_distance_relative_error(pairs):
+    points_a, points_b = pairs
+    reference = np.array([geodesic(a, b).meters for a, b in zip(points_a, points_b)])
+    error = np.abs(geodesy.distance(points_a, points_b, method='haversine') - reference) / np.maximum(reference, 1)
+    # the spherical model is off by at most the flattening of the ellipsoid
+    assert error.max() < 0.006
+
+
+def test_destination_matches_geopy(pairs):
+    points_a, _ = pairs
+    rng = np.random.default_rng(2)
+    bearings, distances = rng.uniform(0, 360, len(points_a)), rng.uniform(0, 5000, len(points_a))
+    dest_lat, dest_lng = geodesy.destination(points_a[:, 0], points_a[:, 1], bearings, distances)
+    for lat, lng, a, bearing, d in zip(dest_lat, dest_lng, points_a, bearings, distances):
+        reference = geodesic(meters=d).destination(tuple(a), bearing)
+        assert geodesic((lat, lng), (reference.latitude, reference.longitude)).meters < 1e-3
+
+
+def test_initial_bearing_matches_vector_construction(pairs):
+    points_a, points_b = pairs
+    bearings = geodesy.initial_bearing(points_a[:, 0], points_a[:, 1], points_b[:, 0], points_b[:, 1])
+    reference = [reference_bearing(a, b) for a, b in zip(points_a, points_b)]
+    np.testing.assert_allclose(bearings, reference, rtol=0, atol=1e-7)
+
+
+def test_heading_between_geocodes_uses_initial_bearing(pairs):
+    points_a, points_b = pairs
+    for a, b in zip(points_a[:50], points_b[:50]):
+        heading = geocode_utils.calculate_heading_between_geocodes(tuple(a), tuple(b))
+        assert isinstance(heading, float)
+        assert heading == pytest.approx(reference_bearing(a, b), abs=1e-7)
+
+
+def test_cdist_matches_elementwise_distance(pairs):
+    points_a, points_b = pairs[0][:20], pairs[1][:30]
+    dist_matrix = geodesy.cdist(points_a, points_b)
+    assert dist_matrix.shape == (20, 30)
+    np.testing.assert_allclose(dist_matrix[3, 7], geodesy.distance(points_a[3], points_b[7], method='haversine'))
+
+
+def test_unknown_method_raises():
+    with pytest.raises(ValueError):
+        geodesy.distance([0, 0], [1, 1], method='euclidean')
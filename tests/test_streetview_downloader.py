@@ -0,0 +1,79 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+pytest.importorskip('requests')
+pytest.importorskip('numpy')
+pytest.importorskip('termcolor')
+pytest.importorskip('PIL')
+
+from streetview_downloader import DownloadManifest, StreetViewDownloader
+
+JPEG = b'\xff\xd8' + b'\x00' * 64 + b'\xff\xd9'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Street View stub: pano 'flaky' fails once with 503, pano 'missing' always returns 404"""
+    failed_once = set()
+    n_requests = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        pano = parse_qs(urlparse(self.path).query)['pano'][0]
+        with self.lock:
+            StubHandler.n_requests += 1
+            first_try = pano not in self.failed_once
+            self.failed_once.add(pano)
+        if pano == 'missing' or (pano == 'flaky' and first_try):
+            self.send_response(404 if pano == 'missing' else 503)
+            self.end_headers()
+            self.wfile.write(b'error')
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.end_headers()
+        self.wfile.write(JPEG)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_url():
+    StubHandler.failed_once = set()
+    StubHandler.n_requests = 0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/streetview'
+    server.shutdown()
+    server.server_close()
+
+
+def make_tasks(panos):
+    return [(f'{pano}.jpg', {'pano': pano}) for pano in panos]
+
+
+def test_download_against_stub(tmp_path, stub_url):
+    downloader = StreetViewDownloader(str(tmp_path), base_url=stub_url, max_workers=4, rate=0, backoff_base=0.01)
+    results = downloader.download(make_tasks(['a', 'b', 'flaky', 'missing']))
+
+    assert results == {'a.jpg': 'done', 'b.jpg': 'done', 'flaky.jpg': 'done', 'missing.jpg': 'failed'}
+    assert (tmp_path / 'a.jpg').read_bytes() == JPEG
+    # download() releases the manifest handle
+    assert downloader.manifest.file is None
+
+    entries = DownloadManifest.read_entries(str(tmp_path / 'manifest.jsonl'))
+    assert entries['flaky.jpg']['status'] == 'done' and entries['flaky.jpg']['bytes'] == len(JPEG)
+    assert entries['missing.jpg']['status'] == 'failed'
+
+
+def test_resume_only_fetches_missing(tmp_path, stub_url):
+    StreetViewDownloader(str(tmp_path), base_url=stub_url, rate=0).download(make_tasks(['a', 'b']))
+    n_requests = StubHandler.n_requests
+
+    results = StreetViewDownloader(str(tmp_path), base_url=stub_url, rate=0).download(make_tasks(['a', 'b', 'c']))
+    assert results == {'a.jpg': 'skipped', 'b.jpg': 'skipped', 'c.jpg': 'done'}
+    assert StubHandler.n_requests == n_requests + 1
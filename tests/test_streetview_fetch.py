@@ -0,0 +1,99 @@
+import io
+import time
+import threading
+
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('cv2')
+pytest.importorskip('easydict')
+
+from easydict import EasyDict
+from flask import Flask, request, Response
+from PIL import Image
+from werkzeug.serving import make_server
+
+from virl.platform.google_map_apis import GoogleMapAPI
+
+FAIL_HEADING = 30.0
+
+
+class StubStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+
+def create_stub_app(stats, latency=0.05):
+    """Local stand-in of the street view static api, the heading is encoded in the red channel"""
+    app = Flask(__name__)
+
+    @app.route('/streetview')
+    def streetview():
+        with stats.lock:
+            stats.active += 1
+            stats.max_active = max(stats.max_active, stats.active)
+        try:
+            time.sleep(latency)
+            heading = float(request.args['heading'])
+            if heading == FAIL_HEADING:
+                return Response('injected failure', status=500)
+            width, height = [int(x) for x in request.args['size'].split('x')]
+            image = Image.new('RGB', (width, height), (int(heading) % 256, 0, 0))
+            buffer = io.BytesIO()
+            image.save(buffer, format='JPEG')
+            return Response(buffer.getvalue(), mimetype='image/jpeg')
+        finally:
+            with stats.lock:
+                stats.active -= 1
+
+    return app
+
+
+@pytest.fixture
+def stub():
+    stats = StubStats()
+    server = make_server('127.0.0.1', 0, create_stub_app(stats), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    api = GoogleMapAPI(offline_cfg=EasyDict(ENABLED=False))
+    api.base_urls['streetview'] = f'http://127.0.0.1:{server.server_port}/streetview'
+    yield api, stats
+    server.shutdown()
+
+
+def fetch(api, headings, **kwargs):
+    return api.get_streetviews_from_geocode((40.7580, -73.9855), (64, 64), headings, 0, 90, **kwargs)
+
+
+def red_value(image):
+    return image.image.getpixel((32, 32))[0]
+
+
+def test_concurrent_fetch_keeps_heading_order(stub):
+    api, stats = stub
+    headings = [0, 60, 90, 120, 180, 240]
+    sequential = fetch(api, headings, max_workers=1)
+    assert stats.max_active == 1
+
+    concurrent = fetch(api, headings, max_workers=4)
+    assert stats.max_active > 1
+    assert [image.heading for image in concurrent] == headings
+    assert [image.heading for image in sequential] == headings
+    # JPEG is lossy, allow a small color error
+    assert all(abs(red_value(image) - image.heading % 256) <= 3 for image in concurrent)
+    assert [red_value(image) for image in concurrent] == [red_value(image) for image in sequential]
+
+
+def test_failed_heading_raises_by_default(stub):
+    api, _ = stub
+    with pytest.raises(Exception):
+        fetch(api, [0, FAIL_HEADING, 90], max_workers=4)
+
+
+def test_skip_failed_heading(stub):
+    api, _ = stub
+    with pytest.warns(UserWarning):
+        images = fetch(api, [0, FAIL_HEADING, 90], max_workers=4, skip_failed=True)
+    assert [image.heading for image in images] == [0, 90]
@@ -0,0 +1,75 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+# the top-level scripts of the repository are not part of the virl package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from batch_api import BatchPipeline, FakeBatchClient
+
+
+def make_build_fn(output_dir: str, build_time: float):
+    """Emulate building a JSONL chunk: encoding images takes `build_time` seconds per chunk"""
+    def build_fn(chunk):
+        time.sleep(build_time)
+        path = os.path.join(output_dir, f"chunk_{chunk[0]}.jsonl")
+        custom_id_mapping = {}
+        with open(path, 'w', encoding='utf-8') as f:
+            for i in chunk:
+                custom_id = f"0_{i}"
+                custom_id_mapping[custom_id] = {"traj": "0", "pair_id": str(i)}
+                f.write(json.dumps({"custom_id": custom_id, "body": {}}) + '\n')
+        return path, custom_id_mapping
+    return build_fn
+
+
+def run(n_chunks: int, chunk_size: int, latency: float, build_time: float,
+        max_in_flight: int, prefetch: int, poll_interval: float) -> dict:
+    client = FakeBatchClient(latency=latency)
+    n_results = [0]
+
+    def on_complete(custom_id_mapping, batch_status):
+        n_results[0] += len(client.download_file(batch_status['output_file_id']).splitlines())
+
+    chunks = [list(range(i * chunk_size, (i + 1) * chunk_size)) for i in range(n_chunks)]
+    with tempfile.TemporaryDirectory() as output_dir:
+        pipeline = BatchPipeline(
+            client, make_build_fn(output_dir, build_time), on_complete,
+            max_in_flight=max_in_flight, prefetch=prefetch,
+            poll_initial=poll_interval, poll_max=poll_interval * 8
+        )
+        start = time.time()
+        pipeline.run(chunks)
+        wall_time = time.time() - start
+
+    assert n_results[0] == n_chunks * chunk_size
+    return {'wall_time': wall_time, 'polls': client.n_retrieve_calls, 'max_in_flight': client.max_in_flight}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Batch API pipeline against sequential submission')
+    parser.add_argument('--n_chunks', type=int, default=12)
+    parser.add_argument('--chunk_size', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=1.0, help='Fake batch completion time (seconds)')
+    parser.add_argument('--build_time', type=float, default=0.2, help='Time to build one JSONL chunk (seconds)')
+    parser.add_argument('--max_in_flight', type=int, default=4)
+    parser.add_argument('--poll_interval', type=float, default=0.05)
+    args = parser.parse_args()
+
+    common = dict(n_chunks=args.n_chunks, chunk_size=args.chunk_size, latency=args.latency,
+                  build_time=args.build_time, poll_interval=args.poll_interval)
+    # the original evaluate(): one chunk at a time, JSONL built only after the previous batch finished
+    sequential = run(max_in_flight=1, prefetch=0, **common)
+    pipelined = run(max_in_flight=args.max_in_flight, prefetch=2, **common)
+
+    print(f"Sequential: {sequential['wall_time']:.2f}s, {sequential['polls']} status polls")
+    print(f"Pipelined (K={args.max_in_flight}): {pipelined['wall_time']:.2f}s, {pipelined['polls']} status polls, "
+          f"max in flight {pipelined['max_in_flight']}")
+    print(f"Speedup: {sequential['wall_time'] / pipelined['wall_time']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import time
+import logging
+import argparse
+import threading
+
+from easydict import EasyDict
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+
+from virl.platform.platform import Platform
+from virl.utils import geocode_utils
+
+
+def create_stub_app(latency, cell_deg):
+    """Local stand-in of the street view metadata api: panoramas on a grid of cell_deg degrees"""
+    app = Flask(__name__)
+
+    @app.route('/metadata')
+    def metadata():
+        time.sleep(latency)
+        lat, lng = [float(x) for x in request.args['location'].split(',')]
+        row, col = int(round(lat / cell_deg)), int(round(lng / cell_deg))
+        return jsonify({
+            'status': 'OK', 'pano_id': f'pano_{row}_{col}',
+            'location': {'lat': row * cell_deg, 'lng': col * cell_deg}
+        })
+
+    return app
+
+
+def sequential_relocation(platform, point_list, polygon):
+    # the original geocode_utils.relocate_point_list_in_polygon
+    relocated_points = {}
+    for point in point_list:
+        relocated_position, pano_id = platform.relocate_geocode_by_source(point, source='outdoor')
+        if relocated_position is None or not geocode_utils.is_point_in_quadrangle(relocated_position, polygon):
+            continue
+        if relocated_position not in relocated_points:
+            relocated_points[relocated_position] = pano_id
+    return list(relocated_points.keys()), list(relocated_points.values())
+
+
+def build_platform(port, rate_limit, workers):
+    platform_cfg = EasyDict({
+        'RATE_LIMIT': rate_limit, 'RELOCATION_WORKERS': workers,
+        'STREET_VIEW': {}, 'MOVER': {}, 'OFFLINE': {'ENABLED': False}
+    })
+    platform = Platform(platform_cfg, output_dir=None)
+    platform.base_urls['streetview_meta'] = f'http://127.0.0.1:{port}/metadata'
+    return platform
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark sequential vs batched relocation of grid sampled points')
+    parser.add_argument('--spacing', type=float, default=15, help='grid spacing in meters')
+    parser.add_argument('--latency', type=float, default=0.05, help='injected latency per request (seconds)')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rate_limit', type=float, default=50, help='requests per second of the rate limit check')
+    parser.add_argument('--port', type=int, default=5058)
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    # panoramas every ~20 meters
+    server = make_server('127.0.0.1', args.port, create_stub_app(args.latency, 20 / 111000), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    polygon = [(40.7220, -74.0040), (40.7240, -74.0045), (40.7245, -74.0015), (40.7225, -74.0010)]
+    points = geocode_utils.grid_sample_quadrangle(polygon, args.spacing)
+    print(f'{len(points)} sampled points')
+
+    start = time.time()
+    sequential = sequential_relocation(build_platform(args.port, 0, 1), points, polygon)
+    sequential_time = time.time() - start
+
+    start = time.time()
+    batched = build_platform(args.port, 0, args.workers).relocate_geocodes(points, polygon=polygon, progress=False)
+    batched_time = time.time() - start
+
+    assert batched == sequential, 'batched relocation differs from the sequential one'
+    print(f'{len(batched[0])} unique panoramas, identical to the sequential relocation')
+    print(f'Sequential: {sequential_time:.2f}s, batched ({args.workers} workers): {batched_time:.2f}s, '
+          f'speedup {sequential_time / batched_time:.1f}x')
+
+    start = time.time()
+    build_platform(args.port, args.rate_limit, args.workers).relocate_geocodes(points, polygon=polygon, progress=False)
+    limited_time = time.time() - start
+    # the bucket starts full, so the first rate_limit requests are a burst
+    min_time = max(len(points) - args.rate_limit, 0) / args.rate_limit
+    print(f'With RATE_LIMIT {args.rate_limit:.0f}/s: {limited_time:.2f}s for {len(points)} requests '
+          f'(at least {min_time:.2f}s expected)')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+import torch
+from PIL import Image
+from easydict import EasyDict
+
+from virl.perception.recognizer.open_clip_local import OpenCLIPLocal
+
+
+def per_image_inference(model, img, text, temperature=100.0):
+    # the previous OpenCLIPLocal.inference: decode one image and encode the candidates on every call
+    temperature /= 100.0
+    image = model.preprocess(Image.open(img)).unsqueeze(0).to(model.device)
+    tok = model.tokenizer(text.split(',,')).to(model.device)
+    with torch.no_grad(), torch.cuda.amp.autocast():
+        image_features = model.model.encode_image(image)
+        text_features = model.model.encode_text(tok)
+        image_features /= image_features.norm(dim=-1, keepdim=True)
+        text_features /= text_features.norm(dim=-1, keepdim=True)
+        text_logits = temperature * image_features @ text_features.T
+        text_probs = torch.nn.functional.softmax(text_logits, dim=-1)
+    return {'logits': text_logits.cpu().numpy().tolist()[0], 'scores': text_probs.cpu().numpy().tolist()[0]}
+
+
+def write_images(n, size, image_dir, seed=0):
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(n):
+        pixels = rng.integers(0, 255, (size, size, 3), dtype=np.uint8)
+        path = os.path.join(image_dir, f'{i}.jpg')
+        Image.fromarray(pixels).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CPU throughput of OpenCLIPLocal: per image vs inference_batch')
+    parser.add_argument('--model', type=str, default='ViT-B-32')
+    parser.add_argument('--pretrained', type=str, default=None, help='random weights by default, no download')
+    parser.add_argument('--n_images', type=int, default=128)
+    parser.add_argument('--image_size', type=int, default=640)
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--candidates_path', type=str, default='data/benchmark/place_types.txt')
+    parser.add_argument('--threads', type=int, default=None, help='torch intra-op threads')
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+    with open(args.candidates_path, 'r') as f:
+        text = ',,'.join(line.strip().replace('_', ' ') for line in f)
+
+    model = OpenCLIPLocal(EasyDict({'NAME': args.model, 'PRETRAINED': args.pretrained}))
+    assert model.device == 'cpu', 'this benchmark measures the CPU throughput'
+
+    image_dir = tempfile.mkdtemp()
+    try:
+        paths = write_images(args.n_images, args.image_size, image_dir)
+        print(f'{args.model}, {len(text.split(",,"))} candidates, {args.n_images} images of '
+              f'{args.image_size}x{args.image_size}, {torch.get_num_threads()} threads')
+
+        # warm up
+        reference = [per_image_inference(model, path, text) for path in paths[:2]]
+        model.inference_batch(paths[:2], text)
+
+        start = time.time()
+        reference = [per_image_inference(model, path, text) for path in paths]
+        reference_time = time.time() - start
+        print(f'{"per image (before)":22s}: {args.n_images / reference_time:7.1f} images/s')
+
+        for batch_size in args.batch_sizes:
+            model.text_cache.clear()
+            start = time.time()
+            results = model.inference_batch(paths, text, batch_size=batch_size)
+            elapsed = time.time() - start
+            score_error = max(np.abs(np.array(a['scores']) - np.array(b['scores'])).max()
+                              for a, b in zip(results, reference))
+            logit_error = max(np.abs(np.array(a['logits']) - np.array(b['logits'])).max()
+                              for a, b in zip(results, reference))
+            same_top1 = all(np.argmax(a['scores']) == np.argmax(b['scores']) for a, b in zip(results, reference))
+            print(f'{f"inference_batch bs={batch_size}":22s}: {args.n_images / elapsed:7.1f} images/s, '
+                  f'speedup {reference_time / elapsed:.1f}x, max score difference {score_error:.1e}, '
+                  f'max logit difference {logit_error:.1e}, same top-1: {same_top1}')
+    finally:
+        shutil.rmtree(image_dir)
+
+
+if __name__ == '__main__':
+    main()
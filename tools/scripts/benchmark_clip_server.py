@@ -0,0 +1,124 @@
+import os
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+
+import numpy as np
+import requests
+from PIL import Image
+from easydict import EasyDict
+from flask import Flask, jsonify
+from werkzeug.serving import make_server
+
+from virl.perception.recognizer.clip_http_client import CLIPHTTPClient
+from virl.perception.recognizer.clip_http_server import StubCLIPModel, create_app
+from virl.utils import common_utils
+
+
+def serve(app, port):
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def temp_png_requests(server_url, images, text, tmp_dir):
+    # the previous transport: a temporary png per image and one request per image
+    results = []
+    for img in images:
+        img_path = common_utils.save_tmp_image_to_file(img, tmp_dir, 'PNG')
+        with open(img_path, 'rb') as f:
+            response = requests.post(f'{server_url}/predict', files=[('images', ('0.png', f.read(), 'image/png'))],
+                                     data={'text': text, 'temperature': 100.0})
+        os.remove(img_path)
+        answer = response.json()
+        results.append({'logits': answer['logits'][0], 'scores': answer['scores'][0]})
+    return results
+
+
+def check_retries(port):
+    """A server failing the first requests is retried, an unreachable one fails within the deadline"""
+    n_failures = [2]
+    app = Flask(__name__)
+
+    @app.route('/predict', methods=['POST'])
+    def predict():
+        if n_failures[0] > 0:
+            n_failures[0] -= 1
+            return jsonify({'error': 'busy'}), 503
+        return jsonify({'logits': [[0.0]], 'scores': [[1.0]]})
+
+    server = serve(app, port)
+    client = CLIPHTTPClient(EasyDict({'SERVER': f'http://127.0.0.1:{port}', 'MAX_RETRIES': 3, 'BACKOFF': 0.05}))
+    image = Image.new('RGB', (32, 32))
+    assert client.inference(image, 'a,,b')['scores'] == [1.0]
+    server.shutdown()
+
+    client = CLIPHTTPClient(EasyDict({'SERVER': f'http://127.0.0.1:{port}', 'MAX_RETRIES': 100,
+                                      'BACKOFF': 0.2, 'DEADLINE': 2}))
+    start = time.time()
+    try:
+        client.inference(image, 'a,,b')
+        raise AssertionError('the request to a stopped server succeeded')
+    except TimeoutError as e:
+        print(f'Retries: recovered from 2 server errors; stopped server gave up after {time.time() - start:.1f}s '
+              f'(deadline 2s): {e}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='round trip overhead of the CLIP http server with a stub model')
+    parser.add_argument('--n_images', type=int, default=256)
+    parser.add_argument('--image_size', type=int, default=640)
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--candidates_path', type=str, default='data/benchmark/place_types.txt')
+    parser.add_argument('--port', type=int, default=22412)
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    with open(args.candidates_path, 'r') as f:
+        text = ',,'.join(line.strip().replace('_', ' ') for line in f)
+
+    rng = np.random.default_rng(0)
+    # smooth images with some noise, the size of the street view crops
+    yy, xx = np.mgrid[0:args.image_size, 0:args.image_size] / args.image_size * 255
+    images = [Image.fromarray(np.clip(np.stack([xx, yy, (xx + yy) / 2], axis=-1) * rng.uniform(0.5, 1) +
+                                      rng.normal(0, 8, (args.image_size, args.image_size, 3)), 0, 255).astype(np.uint8))
+              for _ in range(args.n_images)]
+
+    model = StubCLIPModel()
+    server = serve(create_app(model), args.port)
+    server_url = f'http://127.0.0.1:{args.port}'
+    client = CLIPHTTPClient(EasyDict({'SERVER': server_url}))
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        client.inference_batch(images[:4], text, batch_size=4)
+
+        start = time.time()
+        reference = temp_png_requests(server_url, images, text, tmp_dir)
+        reference_time = time.time() - start
+        print(f'{args.n_images} images of {args.image_size}x{args.image_size}, {len(text.split(",,"))} candidates')
+        print(f'{"png file per request":22s}: {args.n_images / reference_time:7.1f} images/s')
+
+        for batch_size in args.batch_sizes:
+            start = time.time()
+            results = client.inference_batch(images, text, batch_size=batch_size)
+            elapsed = time.time() - start
+            # jpeg compression changes the thumbnails of the stub model slightly
+            error = max(np.abs(np.array(a['scores']) - np.array(b['scores'])).max()
+                        for a, b in zip(results, reference))
+            print(f'{f"jpeg batch of {batch_size}":22s}: {args.n_images / elapsed:7.1f} images/s, '
+                  f'speedup {reference_time / elapsed:.1f}x, max score difference {error:.1e}')
+
+        direct = model.inference_batch(images, text)
+        assert np.allclose([r['scores'] for r in reference], [r['scores'] for r in direct])
+    finally:
+        server.shutdown()
+        shutil.rmtree(tmp_dir)
+
+    check_retries(args.port + 1)
+
+
+if __name__ == '__main__':
+    main()
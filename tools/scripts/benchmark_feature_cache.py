@@ -0,0 +1,98 @@
+import io
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+import torch
+from PIL import Image, ImageFilter
+
+from virl.perception.feature_matching.feature_store import FeatureStore
+from virl.perception.feature_matching.lightglue_local import LightGlueModel
+from virl.platform.street_view import StreetViewImage
+
+
+def make_views(n_views, size, seed=0):
+    """Overlapping crops of one large synthetic facade, like views of the same street from nearby panoramas"""
+    rng = np.random.default_rng(seed)
+    canvas = Image.fromarray(rng.integers(0, 255, (size * 3, size * 3, 3), dtype=np.uint8)).filter(
+        ImageFilter.GaussianBlur(2))
+    views = []
+    for _ in range(n_views):
+        x, y = rng.integers(0, size * 2, 2)
+        views.append(canvas.crop((int(x), int(y), int(x) + size, int(y) + size)))
+    return views
+
+
+def reload_from_memory(view):
+    # a resumed memory decodes its views from the q90 jpeg files written by MemoryStore
+    buffer = io.BytesIO()
+    view.image.save(buffer, format='JPEG', quality=90)
+    buffer.seek(0)
+    return StreetViewImage(Image.open(buffer).convert('RGB'), view.heading, view.pitch, view.fov, view.geocode)
+
+
+def uncached_inference(model, image0, image1):
+    # the previous LightGlueModel.inference: both images are encoded on every comparison
+    with torch.no_grad():
+        feats0 = model.extractor.extract(model.load(image0).to(model.device))
+        feats1 = model.extractor.extract(model.load(image1).to(model.device))
+    feats0, feats1 = [{name: value.cpu().numpy() for name, value in feats.items()} for feats in (feats0, feats1)]
+    return model.match(feats0, feats1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LightGlue duplication checks with and without the feature cache')
+    parser.add_argument('--n_memory', type=int, default=20, help='views in the memory')
+    parser.add_argument('--n_queries', type=int, default=10, help='new views, each compared against all the memory')
+    parser.add_argument('--size', type=int, default=512)
+    parser.add_argument('--device', type=str, default=None, help='default: cuda if available, otherwise cpu')
+    args = parser.parse_args()
+
+    views = make_views(args.n_memory + args.n_queries, args.size)
+    memory_views = [StreetViewImage(image, 30.0 * i, 0, 90, (40.7 + 1e-4 * i, -74.0))
+                    for i, image in enumerate(views[:args.n_memory])]
+    memory_keys = [FeatureStore.view_key(obj_id, 0, view) for obj_id, view in enumerate(memory_views)]
+    query_views = views[args.n_memory:]
+    pairs = [(query, candidate, key) for query in query_views for candidate, key in zip(memory_views, memory_keys)]
+
+    feature_dir = tempfile.mkdtemp()
+    try:
+        model = LightGlueModel({'DEVICE': args.device}, feature_dir=feature_dir)
+        print(f'{len(pairs)} comparisons of {args.size}x{args.size} views on {model.device}')
+        uncached_inference(model, pairs[0][0], pairs[0][1].image)
+
+        start = time.time()
+        reference = [uncached_inference(model, query, candidate.image) for query, candidate, _ in pairs]
+        uncached_time = time.time() - start
+        print(f'without cache: {len(pairs) / uncached_time:7.2f} comparisons/s, {2 * len(pairs)} extractions')
+
+        start = time.time()
+        results = [model.inference(query, candidate.image, key1=key) for query, candidate, key in pairs]
+        cached_time = time.time() - start
+        assert results == reference, 'cached features give different matches'
+        print(f'with cache   : {len(pairs) / cached_time:7.2f} comparisons/s, '
+              f'{model.feature_store.n_extracted} extractions, speedup {uncached_time / cached_time:.1f}x')
+
+        # a resumed run reloads the memory views from jpeg and reads their features from disk,
+        # only the query views (kept in memory only) are extracted again
+        resumed_views = [reload_from_memory(view) for view in memory_views]
+        resumed = LightGlueModel({'DEVICE': args.device}, feature_dir=feature_dir)
+        start = time.time()
+        results = [resumed.inference(query, resumed_views[i % args.n_memory].image,
+                                     key1=FeatureStore.view_key(i % args.n_memory, 0, resumed_views[i % args.n_memory]))
+                   for i, (query, _, _) in enumerate(pairs)]
+        resumed_time = time.time() - start
+        assert results == reference
+        print(f'resumed      : {len(pairs) / resumed_time:7.2f} comparisons/s, '
+              f'{resumed.feature_store.n_extracted} extractions ({args.n_queries} query views)')
+        n_files = sum(len(files) for _, _, files in os.walk(feature_dir))
+        assert n_files == args.n_memory, f'{n_files} feature files for {args.n_memory} memory views'
+    finally:
+        shutil.rmtree(feature_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+import math
+import time
+import argparse
+
+import numpy as np
+from geopy.distance import geodesic
+
+from virl.utils import geodesy
+
+
+def reference_bearing(point_a, point_b):
+    # the scalar formula of geocode_utils.calculate_heading_between_geocodes
+    lat1, lat2 = math.radians(point_a[0]), math.radians(point_b[0])
+    diff_long = math.radians(point_b[1] - point_a[1])
+    x = math.sin(diff_long) * math.cos(lat2)
+    y = math.cos(lat1) * math.sin(lat2) - (math.sin(lat1) * math.cos(lat2) * math.cos(diff_long))
+    return (math.degrees(math.atan2(x, y)) + 360) % 360
+
+
+def sample_pairs(n, seed=0):
+    """Pairs within a city (the common case) and pairs across the globe"""
+    rng = np.random.default_rng(seed)
+    points_a = np.stack([rng.uniform(-80, 80, n), rng.uniform(-180, 180, n)], axis=1)
+    points_b = points_a + rng.normal(0, 0.01, (n, 2))
+    n_global = n // 4
+    points_b[:n_global] = np.stack([rng.uniform(-80, 80, n_global), rng.uniform(-180, 180, n_global)], axis=1)
+    return points_a, points_b
+
+
+def timeit(fn, n_repeats=3):
+    elapsed = []
+    for _ in range(n_repeats):
+        start = time.time()
+        result = fn()
+        elapsed.append(time.time() - start)
+    return result, min(elapsed)
+
+
+def check_accuracy(n):
+    points_a, points_b = sample_pairs(n, seed=1)
+    reference = np.array([geodesic(a, b).meters for a, b in zip(points_a, points_b)])
+
+    vincenty_error = np.max(np.abs(geodesy.distance(points_a, points_b) - reference))
+    haversine_error = np.max(np.abs(geodesy.distance(points_a, points_b, method='haversine') - reference) /
+                             np.maximum(reference, 1))
+
+    rng = np.random.default_rng(2)
+    bearings, distances = rng.uniform(0, 360, n), rng.uniform(0, 5000, n)
+    dest_lat, dest_lng = geodesy.destination(points_a[:, 0], points_a[:, 1], bearings, distances)
+    dest_reference = [geodesic(meters=d).destination(tuple(a), b) for a, b, d in zip(points_a, bearings, distances)]
+    destination_error = max(geodesic((lat, lng), (p.latitude, p.longitude)).meters
+                            for lat, lng, p in zip(dest_lat, dest_lng, dest_reference))
+
+    bearing_error = np.max(np.abs(
+        geodesy.initial_bearing(points_a[:, 0], points_a[:, 1], points_b[:, 0], points_b[:, 1]) -
+        np.array([reference_bearing(a, b) for a, b in zip(points_a, points_b)])
+    ))
+
+    print(f'vincenty distance: max error {vincenty_error * 1000:.4f} mm')
+    print(f'haversine distance: max relative error {haversine_error * 100:.3f}%')
+    print(f'destination: max error {destination_error * 1000:.4f} mm')
+    print(f'initial bearing: max error {bearing_error:.2e} degrees')
+    assert vincenty_error < 1e-3 and destination_error < 1e-3 and bearing_error < 1e-9
+    assert haversine_error < 0.006
+
+
+def benchmark(n):
+    points_a, points_b = sample_pairs(n)
+    rng = np.random.default_rng(3)
+    bearings, distances = rng.uniform(0, 360, n), rng.uniform(0, 5000, n)
+
+    rows = [
+        ('distance', lambda: [geodesic(a, b).meters for a, b in zip(points_a, points_b)],
+         lambda: geodesy.distance(points_a, points_b)),
+        ('distance (haversine)', None, lambda: geodesy.distance(points_a, points_b, method='haversine')),
+        ('destination', lambda: [geodesic(meters=d).destination(tuple(a), b)
+                                 for a, b, d in zip(points_a, bearings, distances)],
+         lambda: geodesy.destination(points_a[:, 0], points_a[:, 1], bearings, distances)),
+        ('initial bearing', lambda: [reference_bearing(a, b) for a, b in zip(points_a, points_b)],
+         lambda: geodesy.initial_bearing(points_a[:, 0], points_a[:, 1], points_b[:, 0], points_b[:, 1])),
+    ]
+    for name, loop_fn, vectorized_fn in rows:
+        _, vectorized_time = timeit(vectorized_fn)
+        if loop_fn is None:
+            print(f'{name:22s}: vectorized {n / vectorized_time / 1e6:7.2f} M/s')
+            continue
+        _, loop_time = timeit(loop_fn, n_repeats=1)
+        print(f'{name:22s}: per call {n / loop_time / 1e6:7.2f} M/s, vectorized {n / vectorized_time / 1e6:7.2f} M/s, '
+              f'speedup {loop_time / vectorized_time:.0f}x')
+
+    n_cdist = int(np.sqrt(n))
+    _, cdist_time = timeit(lambda: geodesy.cdist(points_a[:n_cdist], points_b[:n_cdist]))
+    print(f'{"cdist (haversine)":22s}: {n_cdist}x{n_cdist} in {cdist_time * 1000:.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='accuracy of virl.utils.geodesy against geopy and throughput')
+    parser.add_argument('--n_accuracy', type=int, default=5000, help='number of pairs checked against geopy')
+    parser.add_argument('--n_benchmark', type=int, default=100000, help='number of pairs of the benchmark')
+    args = parser.parse_args()
+
+    check_accuracy(args.n_accuracy)
+    benchmark(args.n_benchmark)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import glob
+import time
+import argparse
+
+import numpy as np
+from shapely.geometry import Point, Polygon
+
+from virl.utils import common_utils, geocode_utils
+
+
+def frange(start, stop, step):
+    i = start
+    while i < stop:
+        yield i
+        i += step
+
+
+def loop_grid_sample(quadrangle, spacing):
+    # the original geocode_utils.grid_sample_quadrangle: frange double loop and a shapely call per point
+    polygon = Polygon(quadrangle)
+    minx, miny, maxx, maxy = polygon.bounds
+    spacing_deg = spacing / 111000
+    points = []
+    for x in frange(minx, maxx, spacing_deg):
+        for y in frange(miny, maxy, spacing_deg):
+            if polygon.contains(Point(x, y)):
+                points.append((x, y))
+    return points
+
+
+def nearest_spacing(points):
+    """Median distance in meters from each point to its nearest neighbour"""
+    dist_matrix = geocode_utils.cal_distance_between_two_position_list(points, points)
+    np.fill_diagonal(dist_matrix, np.inf)
+    return float(np.median(dist_matrix.min(axis=1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark polygon grid sampling: per point shapely loop vs vectorized')
+    parser.add_argument('--polygon_glob', type=str, default='data/benchmark/benchmark_polygon_area/*/*.txt')
+    parser.add_argument('--spacing', type=float, default=5)
+    args = parser.parse_args()
+
+    total_loop, total_vectorized = 0.0, 0.0
+    for path in sorted(glob.glob(args.polygon_glob)):
+        polygon = common_utils.load_points_in_txt_to_list(path)
+
+        start = time.time()
+        loop_points = loop_grid_sample(polygon, args.spacing)
+        loop_time = time.time() - start
+        start = time.time()
+        points = geocode_utils.grid_sample_quadrangle(polygon, args.spacing)
+        vectorized_time = time.time() - start
+        total_loop += loop_time
+        total_vectorized += vectorized_time
+
+        # the pure numpy ray casting agrees with shapely
+        sample = np.asarray(points + loop_points)
+        mask = geocode_utils._ray_casting_contains([polygon], sample[:, 0], sample[:, 1])
+        assert mask.mean() > 0.999
+
+        print(f'{path.split("/")[-1]:45s} loop {len(loop_points):6d} points {loop_time:6.2f}s | '
+              f'vectorized {len(points):6d} points {vectorized_time:6.3f}s | '
+              f'spacing {nearest_spacing(loop_points[:3000]):.1f}m -> {nearest_spacing(points[:3000]):.1f}m')
+
+    print(f'Total: loop {total_loop:.2f}s, vectorized {total_vectorized:.3f}s, speedup {total_loop / total_vectorized:.0f}x')
+
+    # holes and hex / jittered lattices
+    polygon = common_utils.load_points_in_txt_to_list(sorted(glob.glob(args.polygon_glob))[0])
+    center = np.mean(polygon, axis=0)
+    hole = [tuple(center + offset) for offset in [(-5e-4, -5e-4), (-5e-4, 5e-4), (5e-4, 5e-4), (5e-4, -5e-4)]]
+    for name, kwargs in [('square', dict()), ('square with hole', dict(holes=[hole])),
+                         ('hex', dict(lattice='hex')), ('jittered', dict(jitter=0.3))]:
+        points = geocode_utils.grid_sample_quadrangle(polygon, args.spacing * 4, **kwargs)
+        in_hole = geocode_utils.points_in_polygon(points, hole)
+        print(f'{name:16s}: {len(points)} points, {int(in_hole.sum())} in the hole')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+import os
+import time
+import pickle
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+from easydict import EasyDict
+
+from virl.platform.memory.memory import Memory
+from virl.platform.street_view import StreetViewImage
+from virl.utils import vis_utils
+
+
+def make_views(n, size, seed=0):
+    """n detected views of street view like images: smooth gradients with some noise"""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:size, 0:size]
+    base = np.stack([xx, yy, (xx + yy) // 2], axis=-1).astype(np.float64) / size * 255
+    views = []
+    for i in range(n):
+        pixels = np.clip(base * rng.uniform(0.5, 1.0) + rng.normal(0, 8, base.shape), 0, 255).astype(np.uint8)
+        geocode = (40.7233 + rng.uniform(0, 0.01), -74.0030 + rng.uniform(0, 0.01))
+        view = StreetViewImage(Image.fromarray(pixels), float(rng.uniform(0, 360)), 0, 60, geocode, i=i % 8)
+        box = np.array([size * 0.2, size * 0.3, size * 0.6, size * 0.8])
+        view.set_detect_result({'boxes': box, 'labels': 'shop', 'scores': 0.9})
+        cur_results = {'boxes': np.array([box]), 'labels': ['shop'], 'scores': np.array([0.9]),
+                       'class_idx': np.array([1])}
+        views.append((view, cur_results))
+    return views
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def run_pickle(views, output_dir, checkpoint_every):
+    # the previous Memory: a png per view in the loop and the whole memory pickled at each checkpoint
+    root_dir = output_dir / 'visual_memory'
+    memory = {}
+    n_bytes = 0
+    for idx, (view, cur_results) in enumerate(views):
+        memory[idx] = [view]
+        os.makedirs(root_dir / str(idx), exist_ok=True)
+        path = f'{root_dir}/{idx}/{view.geocode[0]}_{view.geocode[1]}_{view.heading}_{view.fov}.png'
+        vis_utils.draw_with_results(view.image, cur_results).save(path)
+        n_bytes += os.path.getsize(path)
+        if (idx + 1) % checkpoint_every == 0 or idx == len(views) - 1:
+            with open(root_dir / 'memory.pkl', 'wb') as f:
+                pickle.dump({'memory': memory, 'idx': idx + 1}, f)
+            n_bytes += os.path.getsize(root_dir / 'memory.pkl')
+    return n_bytes
+
+
+def run_store(views, output_dir, checkpoint_every, memory_cfg):
+    memory = Memory(output_dir, memory_cfg)
+    add_time = 0.0
+    for idx, (view, cur_results) in enumerate(views):
+        start = time.time()
+        memory.add(view, cur_results)
+        add_time += time.time() - start
+        if (idx + 1) % checkpoint_every == 0 or idx == len(views) - 1:
+            memory.save_memory()
+    return memory.store.n_bytes, add_time
+
+
+def check_recovery(views, output_dir, memory_cfg):
+    """A crash in the middle of a record: the complete records are resumed and the partial one dropped"""
+    memory = Memory(output_dir, memory_cfg)
+    for view, cur_results in views[:-1]:
+        memory.add(view, cur_results)
+    log_path = memory.store.log_path
+    memory.store.close()
+    with open(log_path, 'rb') as f:
+        lines = f.readlines()
+    with open(log_path, 'wb') as f:
+        f.writelines(lines[:-1])
+        f.write(lines[-1][:len(lines[-1]) // 2])
+
+    resumed = Memory(output_dir, memory_cfg)
+    assert resumed.idx == len(lines) - 1 and len(resumed.memory) == len(lines) - 1
+    view, _ = views[0]
+    stored = resumed.memory[0][0]
+    assert stored.geocode == view.geocode and stored.heading == view.heading and stored.category == view.category
+    assert np.allclose(stored.box, view.box)
+    error = np.abs(np.asarray(stored.image, dtype=np.float64) - np.asarray(view.image, dtype=np.float64)).mean()
+    assert len(resumed.retrieve_by_geocode(view, radius=1)) >= 1
+
+    # appending continues after the recovered records
+    resumed.add(*views[-1])
+    resumed.save_memory()
+    assert len(Memory(output_dir, memory_cfg).memory) == len(lines)
+    print(f'Recovery: {len(lines) - 1} of {len(lines)} records resumed after a torn write, '
+          f'mean image error {error:.2f} / 255')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark saving the visual memory: png + pickle vs record log')
+    parser.add_argument('--n_views', type=int, default=10000)
+    parser.add_argument('--size', type=int, default=256, help='side of the square view images')
+    parser.add_argument('--checkpoint_every', type=int, default=1000, help='views between two save_memory calls')
+    parser.add_argument('--image_format', type=str, default='jpg')
+    parser.add_argument('--image_quality', type=int, default=90)
+    args = parser.parse_args()
+
+    views = make_views(args.n_views, args.size)
+    memory_cfg = EasyDict({'PATH': 'visual_memory', 'IMAGE_FORMAT': args.image_format,
+                           'IMAGE_QUALITY': args.image_quality})
+    work_dir = tempfile.mkdtemp()
+    try:
+        pickle_dir = Path(work_dir) / 'pickle'
+        start = time.time()
+        pickle_bytes = run_pickle(views, pickle_dir, args.checkpoint_every)
+        pickle_time = time.time() - start
+
+        store_dir = Path(work_dir) / 'store'
+        start = time.time()
+        store_bytes, add_time = run_store(views, store_dir, args.checkpoint_every, memory_cfg)
+        store_time = time.time() - start
+
+        print(f'{args.n_views} views of {args.size}x{args.size}, save_memory every {args.checkpoint_every} views')
+        print(f'png + pickle : {pickle_time:7.2f}s, {pickle_bytes / 1024 ** 2:9.1f} MB written, '
+              f'{directory_size(pickle_dir) / 1024 ** 2:7.1f} MB on disk')
+        print(f'record log   : {store_time:7.2f}s, {store_bytes / 1024 ** 2:9.1f} MB written, '
+              f'{directory_size(store_dir) / 1024 ** 2:7.1f} MB on disk ({args.image_format}, q{args.image_quality})')
+        print(f'Time blocked in Memory.add with the background writer: {add_time:.2f}s')
+        print(f'Speedup {pickle_time / store_time:.1f}x, {pickle_bytes / store_bytes:.1f}x fewer bytes written')
+
+        check_recovery(views[:50], Path(work_dir) / 'recovery', memory_cfg)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import time
+import argparse
+
+import numpy as np
+
+from virl.platform import street_view
+
+
+def per_heading(pano, fov, headings, pitch, size, north_rotation):
+    # same as the original Platform.get_all_streetview_from_geocode: one call per heading
+    return [
+        street_view.get_perspective_from_panorama(pano, fov, heading, pitch, size, size, north_rotation)
+        for heading in headings
+    ]
+
+
+def batched(pano, fov, headings, pitch, size, north_rotation):
+    return street_view.get_perspectives_from_panorama(pano, fov, headings, pitch, size, size, north_rotation)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark multi-heading rendering: per heading vs batched')
+    parser.add_argument('--n_headings', type=int, default=12)
+    parser.add_argument('--size', type=int, default=1024)
+    parser.add_argument('--fov', type=float, default=60)
+    parser.add_argument('--pitch', type=float, default=0)
+    parser.add_argument('--pano_width', type=int, default=4096)
+    parser.add_argument('--n_repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    pano = rng.integers(0, 256, size=(args.pano_width // 2, args.pano_width, 3), dtype=np.uint8)
+    headings = list(np.linspace(0, 360, args.n_headings, endpoint=False))
+    north_rotation = 37.5
+
+    results = {}
+    for name, fn in [('per heading', per_heading), ('batched', batched)]:
+        cold, warm = [], []
+        for _ in range(args.n_repeats):
+            # cold: the sampling grids are built from scratch, warm: they come from the grid cache
+            street_view.REMAP_GRID_CACHE.clear()
+            start = time.time()
+            images = fn(pano, args.fov, headings, args.pitch, args.size, north_rotation)
+            cold.append(time.time() - start)
+            start = time.time()
+            fn(pano, args.fov, headings, args.pitch, args.size, north_rotation)
+            warm.append(time.time() - start)
+        results[name] = [np.asarray(image) for image in images]
+        print(f'{name:12s}: cold {min(cold):.3f}s, warm {min(warm):.3f}s '
+              f'for {args.n_headings} views of {args.size}x{args.size}')
+
+    identical = all(np.array_equal(a, b) for a, b in zip(results['per heading'], results['batched']))
+    print(f'Outputs identical: {identical}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import hashlib
+import argparse
+import tempfile
+
+import numpy as np
+
+# the top-level scripts of the repository are not part of the virl package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from route_renderer import StaticRouteRenderer, LocalTileSource
+
+
+def make_route(n_points: int, seed: int = 0):
+    """Random walk around a rendezvous point, in the format used by GoogleDataProcessor"""
+    rng = np.random.RandomState(seed)
+    rendezvous_point = ('rendezvous', (40.7580, -73.9855))
+
+    def walk(prefix):
+        steps = rng.normal(scale=1e-4, size=(n_points, 2)).cumsum(axis=0)[::-1]
+        return [(f'{prefix}_{i}', (rendezvous_point[1][0] + dlat, rendezvous_point[1][1] + dlng))
+                for i, (dlat, dlng) in enumerate(steps)]
+
+    return rendezvous_point, walk('alice'), walk('bob')
+
+
+def time_static_renderer(route, output_dir: str, n_repeats: int, tile_dir: str = None):
+    renderer = StaticRouteRenderer(tile_source=LocalTileSource(tile_dir) if tile_dir else None)
+    digests = set()
+    start = time.time()
+    for i in range(n_repeats):
+        output_file = os.path.join(output_dir, f'route_{i}.png')
+        renderer.render(*route, output_file, zoom=17, time_index=0)
+        with open(output_file, 'rb') as f:
+            digests.add(hashlib.sha256(f.read()).hexdigest())
+    return (time.time() - start) / n_repeats, len(digests) == 1
+
+
+def time_selenium(route, output_dir: str, n_repeats: int):
+    """The previous pipeline: folium HTML + headless Chrome screenshot"""
+    from googledataprocess import GoogleDataProcessor
+    from data_utils import html_to_screenshot
+
+    processor = GoogleDataProcessor.__new__(GoogleDataProcessor)
+    cwd = os.getcwd()
+    # plot_route writes to ./textdata/traj{traj_id}, keep it out of the working directory
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.makedirs(os.path.join(work_dir, 'textdata', 'traj_benchmark'))
+        os.chdir(work_dir)
+        try:
+            start = time.time()
+            for i in range(n_repeats):
+                html_path = processor.plot_route(*route, traj_id='_benchmark', time_index=0)
+                html_to_screenshot(os.path.abspath(html_path), os.path.join(output_dir, f'selenium_route_{i}.png'))
+            elapsed = time.time() - start
+        finally:
+            os.chdir(cwd)
+    return elapsed / n_repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the static route renderer against Selenium screenshots')
+    parser.add_argument('--n_points', type=int, default=30, help='Number of points per agent')
+    parser.add_argument('--n_repeats', type=int, default=20)
+    parser.add_argument('--tile_dir', type=str, default=None, help='Optional local tile directory')
+    parser.add_argument('--compare_selenium', action='store_true', help='Also time the folium + Chrome pipeline')
+    args = parser.parse_args()
+
+    route = make_route(args.n_points)
+    with tempfile.TemporaryDirectory() as output_dir:
+        static_time, deterministic = time_static_renderer(route, output_dir, args.n_repeats, args.tile_dir)
+        print(f"Static renderer: {static_time * 1000:.1f} ms per image, deterministic: {deterministic}")
+        if args.compare_selenium:
+            selenium_time = time_selenium(route, output_dir, max(1, args.n_repeats // 10))
+            print(f"Selenium screenshot: {selenium_time * 1000:.1f} ms per image, "
+                  f"speedup {selenium_time / static_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
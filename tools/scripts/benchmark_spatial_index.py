@@ -0,0 +1,59 @@
+import time
+import argparse
+
+import numpy as np
+
+from virl.utils import geocode_utils
+from virl.utils.spatial_index import GeocodeGridIndex
+
+
+def linear_scan_nearest(gps_list, geocode, radius):
+    # same as the original GoogleMapAPI._relocate_geocode_by_source_offline
+    distance_matrix = geocode_utils.cal_distance_between_two_position_list([geocode], gps_list)[0]
+    if distance_matrix.min() < radius:
+        return gps_list[distance_matrix.argmin()]
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark offline relocation: grid index vs linear scan')
+    parser.add_argument('--n_points', type=int, default=1000000)
+    parser.add_argument('--n_queries', type=int, default=1000)
+    parser.add_argument('--n_linear_queries', type=int, default=20)
+    parser.add_argument('--radius', type=float, default=5)
+    parser.add_argument('--cell_deg', type=float, default=0.0005)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    # synthetic city of ~20km x 20km around Manhattan
+    center = np.array([40.7580, -73.9855])
+    points = center + rng.uniform(-0.09, 0.09, size=(args.n_points, 2))
+    gps_list = [tuple(x) for x in points.tolist()]
+    # queries are jittered mapping points (a few meters away), like relocating a walked geocode
+    queries = points[rng.integers(0, args.n_points, args.n_queries)] + \
+        rng.normal(scale=2e-5, size=(args.n_queries, 2))
+
+    start = time.time()
+    index = GeocodeGridIndex(points, cell_deg=args.cell_deg)
+    print(f'Build index for {args.n_points} points: {time.time() - start:.2f}s')
+
+    start = time.time()
+    index_results = []
+    for query in queries:
+        idx, distance = index.query_nearest(query, max_radius=args.radius)
+        index_results.append(index.geocode(idx) if idx is not None and distance < args.radius else None)
+    index_qps = args.n_queries / (time.time() - start)
+
+    start = time.time()
+    for query, index_result in zip(queries[:args.n_linear_queries], index_results):
+        assert linear_scan_nearest(gps_list, tuple(query), args.radius) == index_result
+    linear_qps = args.n_linear_queries / (time.time() - start)
+
+    print(f'Linear scan: {linear_qps:.2f} queries/s')
+    print(f'Grid index: {index_qps:.2f} queries/s ({index_qps / linear_qps:.1f}x)')
+    print(f'Found {sum(x is not None for x in index_results)}/{args.n_queries} within {args.radius}m')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import io
+import time
+import warnings
+import argparse
+import threading
+
+from easydict import EasyDict
+from flask import Flask, request, Response
+from PIL import Image
+from werkzeug.serving import make_server
+
+from virl.platform.google_map_apis import GoogleMapAPI
+
+
+def create_stub_app(latency, fail_headings):
+    """Local stand-in of the street view static api, serving JPEGs after `latency` seconds"""
+    app = Flask(__name__)
+
+    @app.route('/streetview')
+    def streetview():
+        time.sleep(latency)
+        heading = float(request.args['heading'])
+        if heading in fail_headings:
+            return Response('injected failure', status=500)
+
+        width, height = [int(x) for x in request.args['size'].split('x')]
+        # encode the heading in the color, so the order of the results can be checked
+        image = Image.new('RGB', (width, height), (int(heading) % 256, 0, 0))
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG')
+        return Response(buffer.getvalue(), mimetype='image/jpeg')
+
+    return app
+
+
+def sweep(api, headings, max_workers):
+    start = time.time()
+    images = api.get_streetviews_from_geocode(
+        (40.7580, -73.9855), (64, 64), headings, 0, 90, max_workers=max_workers, skip_failed=True
+    )
+    return images, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark online multi-heading street view fetching against a local stub')
+    parser.add_argument('--n_headings', type=int, default=12)
+    parser.add_argument('--latency', type=float, default=0.2, help='injected latency per request (seconds)')
+    parser.add_argument('--max_workers', type=int, default=8)
+    parser.add_argument('--port', type=int, default=5057)
+    args = parser.parse_args()
+
+    headings = [i * 360 // args.n_headings for i in range(args.n_headings)]
+    fail_headings = {float(headings[1])}
+
+    server = make_server('127.0.0.1', args.port, create_stub_app(args.latency, fail_headings), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    api = GoogleMapAPI(offline_cfg=EasyDict(ENABLED=False))
+    api.base_urls['streetview'] = f'http://127.0.0.1:{args.port}/streetview'
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        sequential, sequential_time = sweep(api, headings, max_workers=1)
+        concurrent, concurrent_time = sweep(api, headings, max_workers=args.max_workers)
+    server.shutdown()
+
+    expected = [h for h in headings if float(h) not in fail_headings]
+    for name, images in [('sequential', sequential), ('concurrent', concurrent)]:
+        assert [image.heading for image in images] == expected, f'{name}: wrong heading order'
+        # JPEG is lossy, allow a small color error
+        assert all(abs(image.image.getpixel((32, 32))[0] - image.heading % 256) <= 3 for image in images)
+    print(f'{len(caught)} failed headings reported as warnings, the rest of the sweep succeeded')
+    print(f'Sequential: {sequential_time:.2f}s, concurrent ({args.max_workers} workers): {concurrent_time:.2f}s, '
+          f'speedup {sequential_time / concurrent_time:.1f}x for {args.n_headings} headings')
+
+
+if __name__ == '__main__':
+    main()
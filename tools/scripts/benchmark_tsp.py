@@ -0,0 +1,67 @@
+import time
+import argparse
+
+import numpy as np
+
+from virl.utils import geocode_utils, geodesy, tsp_utils
+
+
+def sample_grid_points(n, seed=0):
+    """About n street view like points: a jittered grid with ~20 meter spacing around SoHo, NY"""
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(n)))
+    spacing = 20 / 111000
+    lat, lng = np.meshgrid(np.arange(side) * spacing, np.arange(side) * spacing, indexing='ij')
+    points = np.stack([40.7233 + lat.ravel(), -74.0030 + lng.ravel() / np.cos(np.radians(40.7233))], axis=1)
+    points = points[rng.permutation(len(points))[:n]]
+    return (points + rng.normal(0, spacing / 5, points.shape)).tolist()
+
+
+def current_implementation(points, opt_algo):
+    # the distance matrix built by a python double loop, as calculate_tsp_route_with_points did before
+    distances = np.zeros((len(points), len(points)))
+    for i, point1 in enumerate(points):
+        for j, point2 in enumerate(points):
+            distances[i, j] = geocode_utils.euclidean_distance(point1, point2)
+    if opt_algo == 'nn':
+        return geocode_utils.nearest_neighbor_algorithm(distances)
+    return geocode_utils.two_opt_algorithm(distances)
+
+
+def route_length(points, route):
+    """Length in meters of the walked route"""
+    ordered = np.asarray(points)[route]
+    return float(np.sum(geodesy.haversine(ordered[:-1, 0], ordered[:-1, 1], ordered[1:, 0], ordered[1:, 1])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark the route optimizer against the current tsp implementation')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--max_points_2opt', type=int, default=1000,
+                        help='the current 2opt has no iteration cap, skip it on larger inputs')
+    parser.add_argument('--max_points_nn', type=int, default=5000)
+    parser.add_argument('--time_budget', type=float, default=None)
+    args = parser.parse_args()
+
+    print(f'{"points":>6s} {"algorithm":>22s} {"length (m)":>12s} {"time (s)":>9s}')
+    for n in args.sizes:
+        points = sample_grid_points(n)
+        methods = []
+        if n <= args.max_points_nn:
+            methods.append(('current nn', lambda: current_implementation(points, 'nn')))
+        if n <= args.max_points_2opt:
+            methods.append(('current 2opt', lambda: current_implementation(points, '2opt')))
+        methods.append(('local_search', lambda: tsp_utils.optimize_route(points, time_budget=args.time_budget)))
+        methods.append(('local_search haversine',
+                        lambda: tsp_utils.optimize_route(points, metric='haversine', time_budget=args.time_budget)))
+
+        for name, fn in methods:
+            start = time.time()
+            route = fn()
+            elapsed = time.time() - start
+            assert sorted(route) == list(range(n))
+            print(f'{n:6d} {name:>22s} {route_length(points, route):12.0f} {elapsed:9.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+import pickle
+import argparse
+
+from virl.platform.pano_graph import build_pano_graph
+
+
+def main():
+    parser = argparse.ArgumentParser(description='build the pano graph used by OfflineStreetViewMover')
+    parser.add_argument('--mapping', type=str, required=True, help='path to the gps_to_pano_mapping pickle')
+    parser.add_argument('--panorama_dir', type=str, default=None,
+                        help='directory of {pano_id}.metadata.json files with links (optional)')
+    parser.add_argument('--output', type=str, required=True, help='output path of the graph json')
+    parser.add_argument('--max_link_distance', type=float, default=25,
+                        help='maximum length (meters) of edges derived from geometry')
+    parser.add_argument('--k', type=int, default=6, help='nearest panos considered for geometric edges')
+    parser.add_argument('--heading_range', type=float, default=30,
+                        help='minimum heading difference (degrees) between geometric edges of a pano')
+    args = parser.parse_args()
+
+    with open(args.mapping, 'rb') as f:
+        gps_to_pano_mapping = pickle.load(f)
+
+    graph = build_pano_graph(
+        gps_to_pano_mapping, args.panorama_dir, max_link_distance=args.max_link_distance,
+        k=args.k, heading_range=args.heading_range
+    )
+    graph.save(args.output)
+    print(f'Saved pano graph to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import time
+import json
+import argparse
+import threading
+
+import numpy as np
+from easydict import EasyDict
+
+from virl.platform.mover import StreetViewMover
+from virl.utils import geocode_utils
+
+
+class FixturePlatform(object):
+    """
+    Outdoor relocation answered from a fixture of pano geocodes: the nearest pano within
+    `radius` meters, like the offline gps to pano mapping. `latency` emulates the api round trip.
+    """
+    def __init__(self, panos, radius=8, latency=0.0):
+        self.panos = [tuple(geocode) for geocode in panos]
+        self.pano_array = np.radians(np.array(self.panos))
+        self.radius = radius
+        self.latency = latency
+        self.n_calls = 0
+        self._lock = threading.Lock()
+
+    def relocate_geocode_by_source(self, geocode, source='outdoor'):
+        with self._lock:
+            self.n_calls += 1
+        time.sleep(self.latency)
+        # equirectangular distance is accurate enough at this scale
+        lat, lng = np.radians(geocode[0]), np.radians(geocode[1])
+        dx = (self.pano_array[:, 1] - lng) * np.cos(lat)
+        dy = self.pano_array[:, 0] - lat
+        distances = 6371008.8 * np.hypot(dx, dy)
+        idx = int(np.argmin(distances))
+        if distances[idx] > self.radius:
+            return None, None
+        return self.panos[idx], f'pano_{idx}'
+
+
+def sequential_query_nearby_area(mover, geocode, max_radius=10, delta_radius=2, delta_heading=30,
+                                 heading_range=10, existing_heading=()):
+    # the original implementation of StreetViewMover.query_nearby_area
+    possible_geocode_results = {}
+    current_geocode, _ = mover.platform.relocate_geocode_by_source(geocode, source='outdoor')
+    existing_heading = [heading % 360 for heading in existing_heading]
+
+    possible_radius = np.arange(delta_radius, max_radius, delta_radius)
+    possible_headings = np.arange(0, 360, delta_heading)
+    for heading in possible_headings:
+        for radius in possible_radius:
+            heading_to, distance_to, query_geocode = mover.query_nearby_walkable_position_single(
+                current_geocode, heading, radius, existing_heading, possible_geocode_results, heading_range
+            )
+            if heading_to is not None:
+                possible_geocode_results[query_geocode] = (heading_to, distance_to)
+                existing_heading.append(heading_to)
+
+    return possible_geocode_results
+
+
+def create_fixture(n_queries, seed=0):
+    """A street grid of panos every 10 meters around Times Square, and query points on the streets"""
+    rng = np.random.default_rng(seed)
+    origin = (40.7580, -73.9855)
+    panos = []
+    for street in range(4):
+        for step in range(-6, 7):
+            # avenues (north-south) and streets (east-west) 80 meters apart
+            panos.append(geocode_utils.get_geocode_by_heading_and_distance(
+                geocode_utils.get_geocode_by_heading_and_distance(origin, 90, street * 80), 0, step * 10))
+            panos.append(geocode_utils.get_geocode_by_heading_and_distance(
+                geocode_utils.get_geocode_by_heading_and_distance(origin, 0, street * 80 - 60), 90, step * 10 + 60))
+    queries = [panos[i] for i in rng.choice(len(panos), n_queries, replace=False)]
+    existing = [[float(h) for h in rng.choice(np.arange(0, 360, 90), rng.integers(0, 3), replace=False)]
+                for _ in range(n_queries)]
+    return {'panos': panos, 'queries': queries, 'existing_heading': existing}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='check the batched radius query against the sequential one')
+    parser.add_argument('--fixture', type=str, default=None, help='recorded fixture json, a synthetic one by default')
+    parser.add_argument('--save_fixture', type=str, default=None)
+    parser.add_argument('--n_queries', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.1, help='emulated relocation latency (seconds)')
+    parser.add_argument('--max_workers', type=int, default=8)
+    parser.add_argument('--cell_size', type=float, default=1.0, help='candidate de-duplication cell (meters)')
+    parser.add_argument('--speculate', action='store_true', help='resolve the rest of a heading ray concurrently')
+    args = parser.parse_args()
+
+    if args.fixture is not None:
+        with open(args.fixture, 'r') as f:
+            fixture = json.load(f)
+    else:
+        fixture = create_fixture(args.n_queries)
+    if args.save_fixture is not None:
+        with open(args.save_fixture, 'w') as f:
+            json.dump(fixture, f)
+
+    # same values as tools/cfgs/base_configs/default.yaml
+    radius_cfg = EasyDict(MAX_RADIUS=10, DELTA_RADIUS=3, DELTA_HEADING=45, HEADING_RANGE=20,
+                          CELL_SIZE=args.cell_size, SPECULATE=args.speculate, MAX_WORKERS=args.max_workers)
+    mover = StreetViewMover.__new__(StreetViewMover)
+    mover.cfg = EasyDict(RADIUS_QUERY=radius_cfg)
+
+    total = {'sequential': [0, 0.0], 'batched': [0, 0.0]}
+    n_candidates, n_round_trips, n_mismatch = 0, 0, 0
+    for geocode, existing_heading in zip(fixture['queries'], fixture['existing_heading']):
+        outputs = {}
+        for name in ['sequential', 'batched']:
+            mover.platform = FixturePlatform(fixture['panos'], latency=args.latency)
+            query_fn = mover.query_nearby_area if name == 'batched' else \
+                lambda *a, **kw: sequential_query_nearby_area(mover, *a, **kw)
+            start = time.time()
+            outputs[name] = query_fn(
+                tuple(geocode), max_radius=radius_cfg.MAX_RADIUS, delta_radius=radius_cfg.DELTA_RADIUS,
+                delta_heading=radius_cfg.DELTA_HEADING, heading_range=radius_cfg.HEADING_RANGE,
+                existing_heading=existing_heading
+            )
+            total[name][0] += mover.platform.n_calls
+            total[name][1] += time.time() - start
+        n_candidates += mover.last_query_stats['candidates']
+        n_round_trips += mover.last_query_stats['round_trips']
+        # the geodesic destinations differ by far less than a millimetre, compare the relocated panos
+        sequential = {k: tuple(np.round(v, 6)) for k, v in outputs['sequential'].items()}
+        batched = {k: tuple(np.round(v, 6)) for k, v in outputs['batched'].items()}
+        if list(sequential.items()) != list(batched.items()):
+            n_mismatch += 1
+
+    print(f'{len(fixture["queries"])} queries, {n_mismatch} mismatches')
+    for name, (n_calls, elapsed) in total.items():
+        print(f'{name:10s}: {n_calls} relocations, {elapsed:.2f}s')
+    saved = total['sequential'][0] - total['batched'][0]
+    print(f'Batched: {saved} relocations saved against the sequential probing '
+          f'({saved / max(total["sequential"][0], 1):+.1%}, negative is extra speculative calls), '
+          f'{n_round_trips} round trips for {n_candidates} grid candidates, '
+          f'speedup {total["sequential"][1] / total["batched"][1]:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
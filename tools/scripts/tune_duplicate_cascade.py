@@ -0,0 +1,169 @@
+import shutil
+import argparse
+import itertools
+import tempfile
+
+import numpy as np
+from PIL import Image
+from easydict import EasyDict
+
+from virl.actions.check_surrounding.duplicate_cascade import DuplicateCascade, histogram_distance
+from virl.actions.check_surrounding.visual_checker import VisualChecker
+from virl.platform.memory.memory_store import MemoryStore
+from virl.platform.street_view import StreetViewImage
+from virl.utils import geodesy
+
+
+def write_synthetic_log(root_dir, n_objects=40, street_length=400, seed=0):
+    """
+    A recorded exploration of a straight street: signboards on one side, a panorama every 10 meters,
+    and a view of every signboard within 30 meters of a panorama. The views of the same signboard
+    share its obj_id, like the duplicates found during a real exploration.
+    """
+    rng = np.random.default_rng(seed)
+    origin = (40.7233, -74.0030)
+    objects = []
+    for obj_id in range(n_objects):
+        texture = rng.integers(0, 255, (4, 6, 3), dtype=np.uint8)
+        objects.append({
+            'x': rng.uniform(0, street_length), 'y': rng.uniform(12, 20),
+            'texture': Image.fromarray(texture).resize((96, 64), Image.NEAREST),
+            'category': ['shop', 'restaurant'][obj_id % 2]
+        })
+
+    store = MemoryStore(root_dir, async_write=False)
+    n_views = {}
+    for pano_x in np.arange(0, street_length + 1, 10.0):
+        lat, lng = geodesy.destination(origin[0], origin[1], 90.0, pano_x)
+        geocode = (float(lat), float(lng))
+        for obj_id, obj in enumerate(objects):
+            dx, dy = obj['x'] - pano_x, obj['y']
+            distance = np.hypot(dx, dy)
+            if distance > 30:
+                continue
+            bearing = np.degrees(np.arctan2(dx, dy)) % 360
+            heading = float((bearing + rng.normal(0, 5)) % 360)
+
+            background = rng.normal(128, 30, (256, 256, 3)) + rng.normal(0, 40, 3)
+            image = Image.fromarray(np.clip(background, 0, 255).astype(np.uint8))
+            scale = min(1.5, 15 / distance)
+            patch = obj['texture'].resize((int(96 * scale), int(64 * scale)))
+            patch = Image.fromarray(np.clip(np.asarray(patch) * rng.uniform(0.8, 1.2), 0, 255).astype(np.uint8))
+            center_x = 128 + (bearing - heading + 180) % 360 - 180
+            x1, y1 = int(center_x - patch.size[0] / 2), int(128 - patch.size[1] / 2)
+            image.paste(patch, (x1, y1))
+
+            view = StreetViewImage(image, heading, 0, 60, geocode)
+            view.set_detect_result({'boxes': np.array([x1, y1, x1 + patch.size[0], y1 + patch.size[1]]),
+                                    'labels': obj['category'], 'scores': 0.9})
+            view_idx = n_views.get(obj_id, 0)
+            n_views[obj_id] = view_idx + 1
+            store.append(view, obj_id, view_idx)
+    store.close()
+
+
+def load_pairs(root_dir, dup_cfg):
+    """
+    Replay a recorded memory: each view against the earlier memory views of its category within the
+    retrieve radius. A pair is a duplicate if the exploration assigned both views to the same object.
+    """
+    records = MemoryStore(root_dir).replay()
+    memory_views = []
+    pairs = []
+    for obj_id, view_idx, view in records:
+        for candidate in memory_views:
+            if candidate.category == view.category and \
+                    geodesy.distance(view.geocode, candidate.geocode) < dup_cfg.RETRIEVE_RADIUS:
+                pairs.append((view, candidate, candidate.obj_id == obj_id))
+        # only the first view of an object is kept in memory
+        if view_idx == 0:
+            memory_views.append(view)
+    return pairs
+
+
+def evaluate(pairs, features, heading_decisions, thresholds, target):
+    accept_hamming, reject_hamming, accept_hist, reject_hist = thresholds
+    n_matcher, n_wrong = 0, 0
+    for (_, _, label), (hamming, hist_dist), heading_decision in zip(pairs, features, heading_decisions):
+        if heading_decision is not None:
+            n_wrong += heading_decision != label
+        elif hamming <= accept_hamming and hist_dist <= accept_hist:
+            n_wrong += not label
+        elif hamming >= reject_hamming or hist_dist >= reject_hist:
+            n_wrong += label
+        else:
+            n_matcher += 1
+    return n_matcher / max(len(pairs), 1), n_wrong
+
+
+def main():
+    parser = argparse.ArgumentParser(description='tune the thresholds of the duplicate check cascade on recorded memories')
+    parser.add_argument('--memory_dirs', type=str, nargs='*', default=[],
+                        help='visual memory directories with a memory_log.jsonl, a synthetic street by default')
+    parser.add_argument('--target', type=float, default=0.1, help='maximum fraction of the candidates sent to the matcher')
+    parser.add_argument('--retrieve_radius', type=float, default=30)
+    parser.add_argument('--fast_check_radius', type=float, default=10)
+    args = parser.parse_args()
+
+    dup_cfg = EasyDict({
+        'RETRIEVE_RADIUS': args.retrieve_radius, 'FAST_CHECK_RADIUS': args.fast_check_radius,
+        'CHECK_WITH_GEO_HEADING': False, 'HEADING_NOISE_RADIUS': 10, 'CHECK_WITH_FM': False, 'CASCADE': {}
+    })
+    # the heuristics of VisualChecker without building its models
+    cascade = DuplicateCascade(dup_cfg, VisualChecker.__new__(VisualChecker))
+    cascade.checker.checker_cfg = EasyDict({'CHECK_DUPLICATE': dup_cfg})
+
+    work_dir = None
+    memory_dirs = args.memory_dirs
+    if len(memory_dirs) == 0:
+        work_dir = tempfile.mkdtemp()
+        write_synthetic_log(work_dir)
+        memory_dirs = [work_dir]
+
+    try:
+        pairs = [pair for memory_dir in memory_dirs for pair in load_pairs(memory_dir, dup_cfg)]
+        heading_decisions = [cascade.heading_stage(view, candidate) for view, candidate, _ in pairs]
+        features = []
+        for view, candidate, _ in pairs:
+            (view_hash, view_histogram), (candidate_hash, candidate_histogram) = \
+                cascade.appearance(view), cascade.candidate_appearance(candidate)
+            features.append((int(np.count_nonzero(view_hash != candidate_hash)),
+                             histogram_distance(view_histogram, candidate_histogram)))
+    finally:
+        if work_dir is not None:
+            shutil.rmtree(work_dir)
+
+    n_positive = sum(label for _, _, label in pairs)
+    n_heading = sum(decision is None for decision in heading_decisions)
+    heading_wrong = sum(decision is not None and decision != label
+                        for decision, (_, _, label) in zip(heading_decisions, pairs))
+    print(f'{len(pairs)} candidate pairs ({n_positive} duplicates) in {len(memory_dirs)} memories')
+    print(f'heading stage: {len(pairs) - n_heading} decided ({heading_wrong} wrong), {n_heading} passed on')
+
+    results = []
+    grid = itertools.product(range(0, 17, 2), range(14, 41, 2), np.arange(0.1, 0.55, 0.05), np.arange(0.3, 0.95, 0.05))
+    for thresholds in grid:
+        if thresholds[0] >= thresholds[1] or thresholds[2] >= thresholds[3]:
+            continue
+        matcher_fraction, n_wrong = evaluate(pairs, features, heading_decisions, thresholds, args.target)
+        if matcher_fraction < args.target:
+            results.append((n_wrong, matcher_fraction, thresholds))
+
+    if len(results) == 0:
+        print(f'No thresholds send less than {args.target:.0%} of the candidates to the matcher')
+        return
+    # among the most accurate, the widest ambiguous band within the matcher budget
+    results.sort(key=lambda x: (x[0], -x[1]))
+    print(f'{"wrong":>6s} {"matcher":>8s}  ACCEPT_HAMMING REJECT_HAMMING ACCEPT_HIST REJECT_HIST')
+    for n_wrong, matcher_fraction, thresholds in results[:5]:
+        print(f'{n_wrong:6d} {matcher_fraction:8.1%}  {thresholds[0]:14d} {thresholds[1]:14d} '
+              f'{thresholds[2]:11.2f} {thresholds[3]:11.2f}')
+
+    n_wrong, matcher_fraction, thresholds = results[0]
+    print('\nCASCADE:\n  ENABLED: True\n'
+          f'  ACCEPT_HAMMING: {thresholds[0]}\n  REJECT_HAMMING: {thresholds[1]}\n'
+          f'  ACCEPT_HIST: {thresholds[2]:.2f}\n  REJECT_HIST: {thresholds[3]:.2f}')
+
+
+if __name__ == '__main__':
+    main()
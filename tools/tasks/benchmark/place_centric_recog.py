@@ -3,7 +3,6 @@ import os
 import pickle
 
 import pandas as pd
-import PIL.Image as Image
 import numpy as np
 
 from tqdm import tqdm
@@ -127,38 +126,51 @@ class BMPlaceCentricRecognition(TaskTemplate):
 
         # step 3: run recognition
         print(f'Running recognition...')
-        with tqdm(enumerate(self.image_paths), total=len(self.image_paths)) as pbar:
-            for i, image_path in pbar:
-                place_id = os.path.basename(image_path).split('.')[0]
-                place_labels = self.gt_labels[i]
-
-                if place_id in self.place_results:
-                    print(f'Place {place_id} already processed, skipping...')
-                    continue
-
-                image = Image.open(image_path)
-                result = recognizer.check(image, self.candidates, self.cared_labels)
-
-                ordered_idx = np.argsort(result['scores'])[::-1]
-                ordered_labels = result['labels'][ordered_idx]
-                top_1, top_3, top_5 = self.record_accuracy(ordered_labels, place_labels)
-
-                # update the description of the progress bar with the current accuracy
-                pbar.set_description(
-                    f'top-1: {self.top_1_acc:.4f}, ' + \
-                    f'top-3: {self.top_3_acc:.4f}, ' + \
-                    f'top-5: {self.top_5_acc:.4f}'
+        batch_size = pipeline_cfg.RECOGNITION.get('BATCH_SIZE', 1)
+        # processed places are skipped before their images are decoded
+        remaining = []
+        for i, image_path in enumerate(self.image_paths):
+            place_id = os.path.basename(image_path).split('.')[0]
+            if place_id in self.place_results:
+                print(f'Place {place_id} already processed, skipping...')
+            else:
+                remaining.append(i)
+
+        with tqdm(total=len(remaining)) as pbar:
+            for start in range(0, len(remaining), batch_size):
+                indices = remaining[start:start + batch_size]
+                batch_results = recognizer.check_batch(
+                    [self.image_paths[i] for i in indices], self.candidates, self.cared_labels
                 )
 
-                # store the scores for later analysis
-                self.score_list.append(result['scores'])
-
-                self.place_results[place_id] = dict(
-                    top_1=top_1,
-                    top_3=top_3,
-                    top_5=top_5,
-                    labels=place_labels
-                )
+                for i, result in zip(indices, batch_results):
+                    pbar.update(1)
+                    place_id = os.path.basename(self.image_paths[i]).split('.')[0]
+                    place_labels = self.gt_labels[i]
+
+                    ordered_idx = np.argsort(result['scores'])[::-1]
+                    ordered_labels = result['labels'][ordered_idx]
+                    top_1, top_3, top_5 = self.record_accuracy(ordered_labels, place_labels)
+
+                    # update the description of the progress bar with the current accuracy
+                    pbar.set_description(
+                        f'top-1: {self.top_1_acc:.4f}, ' + \
+                        f'top-3: {self.top_3_acc:.4f}, ' + \
+                        f'top-5: {self.top_5_acc:.4f}'
+                    )
+
+                    # store the scores for later analysis
+                    self.score_list.append(result['scores'])
+
+                    self.place_results[place_id] = dict(
+                        top_1=top_1,
+                        top_3=top_3,
+                        top_5=top_5,
+                        labels=place_labels
+                    )
+
+        if recognizer.inference_cache is not None:
+            print(f'Inference cache: {recognizer.inference_cache.stats()}')
 
         # step 4: calculate accuracy
         print(f'Top-1 Accuracy: {self.top_1_tp}/{self.total} ({self.top_1_acc:.4f})')
@@ -114,6 +114,10 @@ class BMStreetLoc(TaskTemplate):
             if self.step_counter % cfg.get('SAVE_INTERVAL', 10000000) == 0:
                 self.save_results()
 
+        detector = visual_checker.models.get('detector', None)
+        if detector is not None and detector.inference_cache is not None:
+            print(f'Inference cache: {detector.inference_cache.stats()}')
+
         # output results
         self.save_results()
         self.formulate_output()
@@ -404,15 +408,18 @@ class BMStreetLoc(TaskTemplate):
             box, view.shape, view.heading, view.fov
         )
         
-        candidate_place_info = None
-        for place_info in nearby_place_infos:
-            heading = place_info['heading']
-            if geocode_utils.is_heading_in_range((heading_left, heading_right), heading):
-                if candidate_place_info is None or place_info['distance'] < candidate_place_info['distance']:
-                    candidate_place_info = place_info
-        
-        is_matched = candidate_place_info is not None
-        return is_matched, candidate_place_info
+        if len(nearby_place_infos) == 0:
+            return False, None
+
+        headings = np.array([place_info['heading'] for place_info in nearby_place_infos])
+        in_range = geocode_utils.is_heading_in_range((heading_left, heading_right), headings)
+        if not np.any(in_range):
+            return False, None
+
+        # the nearest place in the heading range, the first one for ties
+        distances = np.array([place_info['distance'] for place_info in nearby_place_infos])
+        candidate_idx = np.flatnonzero(in_range)[np.argmin(distances[in_range])]
+        return True, nearby_place_infos[candidate_idx]
     
     def get_street_view_image_with_fov_list(self, platform, current_geocode, current_heading, fov_list):
         image_list = []
@@ -10,7 +10,7 @@ from virl.config import cfg
 from virl.actions.check_surrounding.visual_checker import VisualChecker
 from virl.actions.navigation import build_navigator
 from virl.platform.memory.memory import Memory
-from virl.utils import common_utils, geocode_utils, vis_utils
+from virl.utils import common_utils, geocode_utils, geodesy, vis_utils
 
 
 class RobotRX399(TaskTemplate):
@@ -85,14 +85,17 @@ class RobotRX399(TaskTemplate):
             box, view.shape, view.heading, view.fov
         )
         
-        for i, gt_geocode in enumerate(gt_list):
-            gt_heading, gt_distance = geocode_utils.get_heading_and_distance_by_geocode(
-                view.geocode, gt_geocode
-            )
-            if geocode_utils.is_heading_in_range((heading_left, heading_right), gt_heading) \
-                    and gt_distance < radius:
-                return True, i
-        
+        if len(gt_list) == 0:
+            return False, None
+
+        gt_geocodes = np.array(gt_list, dtype=np.float64)
+        gt_headings = geodesy.initial_bearing(view.geocode[0], view.geocode[1], gt_geocodes[:, 0], gt_geocodes[:, 1])
+        gt_distances = geodesy.distance(view.geocode, gt_geocodes)
+        matched = geocode_utils.is_heading_in_range((heading_left, heading_right), gt_headings) & \
+            (gt_distances < radius)
+        if np.any(matched):
+            return True, int(np.argmax(matched))
+
         return False, None
     
     def formulate_output(self, output_cfg):
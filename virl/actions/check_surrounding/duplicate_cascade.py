@@ -0,0 +1,209 @@
+import time
+
+import numpy as np
+
+from virl.utils import geocode_utils, geodesy
+
+
+def crop_box(view):
+    """The detected object of the view, the whole image without a box"""
+    image = view.image.convert('RGB')
+    if view.box is None:
+        return image
+    x1, y1, x2, y2 = [float(x) for x in np.asarray(view.box, dtype=np.float64).ravel()[:4]]
+    x1, y1 = max(0, int(x1)), max(0, int(y1))
+    x2, y2 = min(image.size[0], int(np.ceil(x2))), min(image.size[1], int(np.ceil(y2)))
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return image
+    return image.crop((x1, y1, x2, y2))
+
+
+def dhash(image, hash_size=8):
+    """
+    Difference hash: signs of the horizontal gradients of a (hash_size + 1) x hash_size thumbnail.
+
+    Returns:
+        bits (numpy.array): hash_size * hash_size booleans
+    """
+    thumbnail = np.asarray(image.convert('L').resize((hash_size + 1, hash_size)), dtype=np.int16)
+    return (thumbnail[:, 1:] > thumbnail[:, :-1]).ravel()
+
+
+def color_histogram(image, hue_bins=16, saturation_bins=4):
+    """
+    Hue and saturation histogram, so the distance does not depend on the exposure of the panorama.
+
+    Returns:
+        histogram (numpy.array): normalized hue_bins * saturation_bins histogram
+    """
+    pixels = np.asarray(image.convert('RGB').resize((64, 64)).convert('HSV'), dtype=np.int64)
+    bins = pixels[..., 0] * hue_bins // 256 * saturation_bins + pixels[..., 1] * saturation_bins // 256
+    histogram = np.bincount(bins.ravel(), minlength=hue_bins * saturation_bins).astype(np.float64)
+    return histogram / histogram.sum()
+
+
+def histogram_distance(histogram0, histogram1):
+    """1 - histogram intersection, in [0, 1]"""
+    return 1.0 - float(np.minimum(histogram0, histogram1).sum())
+
+
+class DuplicateCascade(object):
+    """
+    Cheap-first duplicate check of a new view against the visual memory. Each stage accepts
+    (duplicate), rejects (not a duplicate) or passes a candidate on to the next stage:
+        1. spatial: the memory views of the same category within RETRIEVE_RADIUS
+        2. heading: the geocode and heading heuristics accept, views looking at disjoint areas are rejected
+        3. appearance: dHash and colour histogram of the boxes, accept or reject the clear cases
+        4. matcher: feature matching, only for the ambiguous survivors
+    Every stage counts its candidates, decisions and time.
+    """
+    STAGES = ['spatial', 'heading', 'appearance', 'matcher']
+
+    def __init__(self, dup_cfg, checker):
+        """
+        Args:
+            dup_cfg: CHECK_DUPLICATE config, the thresholds of the cascade are in CHECK_DUPLICATE.CASCADE
+            checker: the VisualChecker, for its heading heuristics and feature matching
+        """
+        self.dup_cfg = dup_cfg
+        self.checker = checker
+        cascade_cfg = dup_cfg.get('CASCADE', {})
+
+        self.heading_margin = cascade_cfg.get('HEADING_MARGIN', 10)
+        self.max_object_distance = cascade_cfg.get('MAX_OBJECT_DISTANCE', 50)
+        # defaults from tools/scripts/tune_duplicate_cascade.py, retune them on recorded memories
+        self.accept_hamming = cascade_cfg.get('ACCEPT_HAMMING', 4)
+        self.reject_hamming = cascade_cfg.get('REJECT_HAMMING', 24)
+        self.accept_hist = cascade_cfg.get('ACCEPT_HIST', 0.2)
+        self.reject_hist = cascade_cfg.get('REJECT_HIST', 0.5)
+
+        self.stats = {}
+        self.reset_stats()
+        # id(view) -> (view, dhash, histogram), the appearance of the memory views is computed once
+        self.appearance_cache = {}
+        self.query_appearance = None
+
+    def reset_stats(self):
+        self.stats = {stage: {'n_in': 0, 'n_accept': 0, 'n_reject': 0, 'time': 0.0} for stage in self.STAGES}
+        self.stats['spatial']['n_queries'] = 0
+
+    def check(self, view, memory):
+        """
+        Returns:
+            is_duplicate (bool):
+            obj_id (int): the object of the first duplicate candidate, None if not duplicate
+        """
+        start = time.time()
+        candidates = memory.retrieve_by_geocode(view, radius=self.dup_cfg.RETRIEVE_RADIUS)
+        stats = self.stats['spatial']
+        stats['n_queries'] += 1
+        stats['n_in'] += len(memory.memory)
+        stats['n_reject'] += len(memory.memory) - len(candidates)
+        stats['time'] += time.time() - start
+
+        self.query_appearance = None
+        for candidate in candidates:
+            if self.check_pair(view, candidate):
+                return True, candidate.obj_id
+        return False, None
+
+    def check_pair(self, view, candidate):
+        for stage, stage_fn in [('heading', self.heading_stage), ('appearance', self.appearance_stage),
+                                ('matcher', self.matcher_stage)]:
+            start = time.time()
+            decision = stage_fn(view, candidate)
+            stats = self.stats[stage]
+            stats['n_in'] += 1
+            stats['time'] += time.time() - start
+            if decision is not None:
+                stats['n_accept' if decision else 'n_reject'] += 1
+                return decision
+        return False
+
+    def heading_range(self, view):
+        if view.box is not None:
+            heading_left, heading_right = geocode_utils.get_heading_range_to_box(
+                np.asarray(view.box, dtype=np.float64).ravel()[:4], view.shape, view.heading, view.fov
+            )
+        else:
+            heading_left, heading_right = view.heading - view.fov / 2, view.heading + view.fov / 2
+        return (heading_left - self.heading_margin) % 360, (heading_right + self.heading_margin) % 360
+
+    def heading_stage(self, view, candidate):
+        """
+        Returns:
+            True if the heuristics of VisualChecker find a duplicate, False if the boxes of the two views
+            can not see a common point within MAX_OBJECT_DISTANCE, None otherwise
+        """
+        if candidate.geocode == view.geocode:
+            if self.checker.fast_duplication_check_in_same_geocode(view, candidate):
+                return True
+        elif self.dup_cfg.CHECK_WITH_GEO_HEADING:
+            if self.checker.check_duplication_by_geocode_and_heading(
+                    view, candidate, noise_radius=self.dup_cfg.HEADING_NOISE_RADIUS):
+                return True
+
+        view_range, candidate_range = self.heading_range(view), self.heading_range(candidate)
+        # points seen by the box of the view, in meters east / north of the view
+        width = (view_range[1] - view_range[0]) % 360
+        bearings = np.radians(view_range[0] + np.linspace(0, width, 9))
+        distances = np.linspace(1, self.max_object_distance, 25)
+        xs = (np.sin(bearings)[:, None] * distances[None]).ravel()
+        ys = (np.cos(bearings)[:, None] * distances[None]).ravel()
+
+        candidate_bearing = geodesy.initial_bearing(view.geocode[0], view.geocode[1],
+                                                    candidate.geocode[0], candidate.geocode[1])
+        candidate_distance = geodesy.distance(view.geocode, candidate.geocode)
+        cx = candidate_distance * np.sin(np.radians(candidate_bearing))
+        cy = candidate_distance * np.cos(np.radians(candidate_bearing))
+
+        bearings_from_candidate = np.degrees(np.arctan2(xs - cx, ys - cy)) % 360
+        visible = geocode_utils.is_heading_in_range(candidate_range, bearings_from_candidate) & \
+            (np.hypot(xs - cx, ys - cy) <= self.max_object_distance)
+        return None if np.any(visible) else False
+
+    @staticmethod
+    def appearance(view):
+        crop = crop_box(view)
+        return dhash(crop), color_histogram(crop)
+
+    def candidate_appearance(self, candidate):
+        cached = self.appearance_cache.get(id(candidate))
+        if cached is None or cached[0] is not candidate:
+            cached = (candidate, *self.appearance(candidate))
+            self.appearance_cache[id(candidate)] = cached
+        return cached[1:]
+
+    def appearance_stage(self, view, candidate):
+        """
+        Returns:
+            True if both the dHash and the histogram are close, False if either is far, None otherwise
+        """
+        if self.query_appearance is None:
+            self.query_appearance = self.appearance(view)
+        view_hash, view_histogram = self.query_appearance
+        candidate_hash, candidate_histogram = self.candidate_appearance(candidate)
+        hamming = int(np.count_nonzero(view_hash != candidate_hash))
+        hist_dist = histogram_distance(view_histogram, candidate_histogram)
+
+        if hamming <= self.accept_hamming and hist_dist <= self.accept_hist:
+            return True
+        if hamming >= self.reject_hamming or hist_dist >= self.reject_hist:
+            return False
+        return None
+
+    def matcher_stage(self, view, candidate):
+        if not self.dup_cfg.CHECK_WITH_FM:
+            return False
+        return self.checker.check_duplicate_with_feature_matching(view, candidate, self.dup_cfg.MATCH_THRESHOLD)
+
+    def summary(self):
+        n_pairs = self.stats['heading']['n_in']
+        lines = [f'{"stage":>10s} {"in":>8s} {"accept":>8s} {"reject":>8s} {"time (ms)":>10s}']
+        for stage in self.STAGES:
+            stats = self.stats[stage]
+            lines.append(f'{stage:>10s} {stats["n_in"]:8d} {stats["n_accept"]:8d} {stats["n_reject"]:8d} '
+                         f'{stats["time"] * 1000:10.1f}')
+        matched = self.stats['matcher']['n_in']
+        lines.append(f'{matched} of {n_pairs} candidates ({matched / max(n_pairs, 1):.1%}) reached the matcher')
+        return '\n'.join(lines)
@@ -2,6 +2,7 @@ import numpy as np
 
 from virl.config import cfg
 from virl.utils import geocode_utils
+from virl.actions.check_surrounding.duplicate_cascade import DuplicateCascade
 from virl.perception.feature_matching.lightglue_client import LightGlueClient
 from virl.perception.detector import Detector
 from virl.perception.mm_llm import MultiModalLLM
@@ -33,6 +34,12 @@ class VisualChecker(object):
 
         self.create_visual_models(checker_cfg.USED_MODELS)
 
+        # cheap-first duplicate check, feature matching only for the ambiguous candidates
+        self.duplicate_cascade = None
+        if self.need_check_duplicate and self.checker_cfg.CHECK_DUPLICATE.get('CASCADE', {}).get('ENABLED', False):
+            self.duplicate_cascade = DuplicateCascade(self.checker_cfg.CHECK_DUPLICATE, self)
+            self.cascade_report_every = self.checker_cfg.CHECK_DUPLICATE.CASCADE.get('REPORT_EVERY', 50)
+
     def create_visual_models(self, used_models):
         if 'DETECT' in used_models:
             self.models['detector'] = Detector(
@@ -45,7 +52,14 @@ class VisualChecker(object):
             )
 
         if 'LIGHTGLUE' in used_models:
-            self.models['matcher'] = LightGlueClient(cfg.VISION_MODELS.LIGHTGLUE)
+            lightglue_cfg = cfg.VISION_MODELS.LIGHTGLUE
+            if lightglue_cfg.get('LOCAL', False):
+                from virl.perception.feature_matching.lightglue_local import LightGlueModel
+                # the features of the memory views are persisted with the memory
+                feature_dir = None if self.memory is None else self.memory.root_dir / 'features'
+                self.models['matcher'] = LightGlueModel(lightglue_cfg, feature_dir=feature_dir)
+            else:
+                self.models['matcher'] = LightGlueClient(lightglue_cfg)
 
     def add_cared_categories(self, categories):
         """
@@ -150,6 +164,12 @@ class VisualChecker(object):
                 print(f'>>> This is a duplicate obj with {obj_id}, add it as a novel view.')
 
     def check_duplication_single(self, view):
+        if self.duplicate_cascade is not None:
+            result = self.duplicate_cascade.check(view, self.memory)
+            if self.duplicate_cascade.stats['spatial']['n_queries'] % self.cascade_report_every == 0:
+                print(f'>>> Duplicate check cascade:\n{self.duplicate_cascade.summary()}')
+            return result
+
         # get candidates in the visual memory
         candidates = self.memory.retrieve_by_geocode(
             view, radius=self.checker_cfg.CHECK_DUPLICATE.RETRIEVE_RADIUS
@@ -213,6 +233,18 @@ class VisualChecker(object):
             return False
 
     def check_duplicate_with_feature_matching(self, view, candidate, thresh):
-        matches = self.models['matcher'].inference(view.image, candidate.image)
+        matcher = self.models['matcher']
+        view_idx = None
+        if hasattr(matcher, 'feature_store') and candidate.obj_id in self.memory.memory:
+            # the features of the memory view are persisted under its position in the memory
+            view_idx = next(
+                (i for i, x in enumerate(self.memory.memory[candidate.obj_id]) if x is candidate), None
+            )
+        if view_idx is not None:
+            candidate_key = matcher.feature_store.view_key(candidate.obj_id, view_idx, candidate)
+            matches = matcher.inference(view.image, candidate.image, key1=candidate_key)
+        else:
+            # a candidate that is not a stored memory view has no cache key
+            matches = matcher.inference(view.image, candidate.image)
         is_match = int(matches) > thresh
         return is_match
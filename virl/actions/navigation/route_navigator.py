@@ -25,7 +25,9 @@ class RouteNavigator(NavigatorTemplate):
             self.points = common_utils.load_points_in_txt_to_list(local_point_path)
         else:
             print('>>> RouteNavigator: sampling and relocate points in polygon area')
-            seed_points = geocode_utils.grid_sample_quadrangle(self.polygon_area, cfg.SPACING)
+            seed_points = geocode_utils.grid_sample_quadrangle(
+                self.polygon_area, cfg.SPACING, lattice=cfg.get('LATTICE', 'square'), jitter=cfg.get('JITTER', 0.0)
+            )
             relocated_points, _ = geocode_utils.relocate_point_list_in_polygon(
                 platform, seed_points, self.polygon_area
             )
@@ -42,7 +44,8 @@ class RouteNavigator(NavigatorTemplate):
         else:
             print(f'>>> RouteNavigator: calculate route with {cfg.TSP_ALGO}')
             route = geocode_utils.calculate_tsp_route_with_points(
-                self.points, cfg.TSP_ALGO
+                self.points, cfg.TSP_ALGO, metric=cfg.get('TSP_METRIC', 'euclidean'),
+                time_budget=cfg.get('TSP_TIME_BUDGET', None)
             )
             pickle.dump(route, open(local_route_path, 'wb'))
             print('>>> RouteNavigator: save route to local file {}'.format(local_route_path))
@@ -7,7 +7,7 @@ import numpy as np
 from .navigator_template import NavigatorTemplate
 from virl.lm import UnifiedChat
 from virl.lm import prompt as prompt_templates
-from virl.utils import geocode_utils, common_utils
+from virl.utils import geocode_utils, geodesy, common_utils
 from virl.utils.geocode_utils import DIRECTION_SET_ABS
 from virl.perception.recognizer.recognizer import Recognizer
 
@@ -225,13 +225,12 @@ class VisionLanguageNavigator(NavigatorTemplate):
                     not info_dict['dest']:
                 return "No landmarks nearby"
         
-        dist_landmark_list = []
-        for landmark in self.landmark_list:
-            if landmark is not None:
-                distance = geocode_utils.calculate_distance_from_geocode(self.current_geocode, landmark['geocode'])
-                dist_landmark_list.append(distance)
-            else:
-                dist_landmark_list.append(1000000)
+        dist_landmark_list = np.full(len(self.landmark_list), 1000000.0)
+        valid_idx = [i for i, landmark in enumerate(self.landmark_list) if landmark is not None]
+        if len(valid_idx) > 0:
+            dist_landmark_list[valid_idx] = geodesy.distance(
+                self.current_geocode, [self.landmark_list[i]['geocode'] for i in valid_idx]
+            )
 
         min_idx = np.argmin(dist_landmark_list)
         min_distance = dist_landmark_list[min_idx]
@@ -2,6 +2,7 @@ import torch
 import copy
 import numpy as np
 
+from virl.perception.inference_cache import InferenceCache, build_inference_cache
 from virl.utils import common_utils, geocode_utils, vis_utils
 
 
@@ -18,7 +19,9 @@ class Detector(object):
         self.need_double_check = self.detect_cfg.get('DOUBLE_CHECK', None) and self.detect_cfg.DOUBLE_CHECK.ENABLED
 
         self.model = None
+        self.model_cfg = None
         self.build_model(vision_model_cfg)
+        self.inference_cache = build_inference_cache(vision_model_cfg, self.detect_cfg.NAME)
 
     def build_model(self, vision_model_cfg):
         """
@@ -45,12 +48,19 @@ class Detector(object):
             detector_class = getattr(module, class_name)
 
             devices = "cuda" if torch.cuda.is_available() else "cpu"
-            self.model = detector_class(getattr(vision_model_cfg, self.detect_cfg.NAME), devices=devices)
+            self.model_cfg = getattr(vision_model_cfg, self.detect_cfg.NAME)
+            self.model = detector_class(self.model_cfg, devices=devices)
         else:
             raise NotImplementedError(f"Detector {self.detect_cfg.NAME} is not implemented.")
 
     def detect(self, image, candidates, cared_labels, score_thresh, need_draw):
-        results, _ = self.model.inference(image, candidates, score_thresh, need_draw)
+        if self.inference_cache is None:
+            results, _ = self.model.inference(image, candidates, score_thresh, need_draw)
+        else:
+            key = InferenceCache.make_key(self.detect_cfg.NAME, self.model_cfg, image, candidates, score_thresh)
+            results = self.inference_cache.get(
+                key, self.detect_cfg.NAME, lambda: self.model.inference(image, candidates, score_thresh, need_draw)[0]
+            )
         filtered_results = self.filter_unrelated_labels(results, cared_labels)
         # this is optional
         result_image = vis_utils.draw_with_results(image, filtered_results)
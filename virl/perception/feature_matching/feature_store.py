@@ -0,0 +1,94 @@
+import os
+import hashlib
+
+import numpy as np
+
+from virl.utils.common_utils import LRUCache
+
+
+class FeatureStore(object):
+    """
+    Local features of images in an in-memory LRU, so a view is only encoded once across comparisons.
+    The features of the memory views are also persisted as npz files in cache_dir (next to the visual
+    memory) under a key of the view (view_key), because the images reloaded on resume are decoded from
+    the lossy files of the memory and hash differently from the original ones. Query views are keyed by
+    their content (image_key) and kept in memory only, so the directory grows with the memory alone.
+    """
+    def __init__(self, cache_dir=None, max_bytes=512 * 1024 ** 2):
+        """
+        Args:
+            cache_dir (str or Path): directory of the npz files, None to keep the features in memory only
+            max_bytes (int): size of the in-memory LRU
+        """
+        self.cache_dir = None if cache_dir is None else str(cache_dir)
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        self.memory = LRUCache(max_bytes=max_bytes)
+        self.n_extracted = 0
+
+    @staticmethod
+    def image_key(image):
+        """
+        Args:
+            image (PIL.Image):
+
+        Returns:
+            key (str): hash of the image mode, size and pixels
+        """
+        sha1 = hashlib.sha1(f'{image.mode}_{image.size[0]}_{image.size[1]}'.encode('utf-8'))
+        sha1.update(image.tobytes())
+        return sha1.hexdigest()
+
+    @staticmethod
+    def view_key(obj_id, view_idx, view):
+        """
+        Args:
+            obj_id (int): object of the view in the visual memory
+            view_idx (int): index of the view in the views of the object
+            view (StreetViewImage): its camera is part of the key, so a view lost before reaching the memory
+                log does not leave stale features for the view that reuses its id after a resume
+
+        Returns:
+            key (str): hash of the memory position and the camera of the view
+        """
+        camera = [float(x) for x in (*view.geocode, view.heading, view.pitch, view.fov)]
+        return hashlib.sha1(f'view_{obj_id}_{view_idx}_{camera!r}'.encode('utf-8')).hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f'{key}.npz')
+
+    def get(self, key):
+        """
+        Returns:
+            features (dict): name -> numpy.array, None if the image was never encoded
+        """
+        features = self.memory.get(key)
+        if features is not None or self.cache_dir is None:
+            return features
+
+        path = self.get_path(key)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            features = {name: data[name] for name in data.files}
+        self.memory.put(key, features, nbytes=sum(x.nbytes for x in features.values()))
+        return features
+
+    def put(self, key, features, persist=False):
+        """
+        Args:
+            key (str):
+            features (dict): name -> numpy.array
+            persist (bool): also write the features to cache_dir, for the memory views
+        """
+        self.n_extracted += 1
+        self.memory.put(key, features, nbytes=sum(x.nbytes for x in features.values()))
+        if self.cache_dir is None or not persist:
+            return
+
+        path = self.get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # np.savez adds the suffix to paths without it
+        tmp_path = f'{path[:-len(".npz")]}.{os.getpid()}.tmp.npz'
+        np.savez(tmp_path, **features)
+        os.replace(tmp_path, path)
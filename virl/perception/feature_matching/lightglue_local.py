@@ -3,6 +3,8 @@ from lightglue.utils import load_image, rbd
 import torch
 import numpy as np
 
+from virl.perception.feature_matching.feature_store import FeatureStore
+
 
 def numpy_image_to_torch(image: np.ndarray) -> torch.Tensor:
     """Normalize the image tensor and reorder the dimensions."""
@@ -16,15 +18,27 @@ def numpy_image_to_torch(image: np.ndarray) -> torch.Tensor:
 
 
 class LightGlueModel(object):
-    def __init__(self) -> None:
+    def __init__(self, cfg=None, feature_dir=None) -> None:
+        """
+        Args:
+            cfg: MAX_NUM_KEYPOINTS, DEVICE (default: cuda if available, otherwise cpu) and
+                 FEATURE_CACHE_MB (size of the in-memory feature cache)
+            feature_dir: directory to persist the extracted features, None to keep them in memory only
+        """
+        cfg = {} if cfg is None else cfg
+        self.device = cfg.get('DEVICE', None) or ('cuda' if torch.cuda.is_available() else 'cpu')
+
         # SuperPoint+LightGlue
-        self.extractor = SuperPoint(max_num_keypoints=2048).eval().cuda()  # load the extractor
-        self.matcher = LightGlue(features='superpoint').eval().cuda()  # load the matcher
+        max_num_keypoints = cfg.get('MAX_NUM_KEYPOINTS', 2048)
+        self.extractor = SuperPoint(max_num_keypoints=max_num_keypoints).eval().to(self.device)  # load the extractor
+        self.matcher = LightGlue(features='superpoint').eval().to(self.device)  # load the matcher
 
         # or DISK+LightGlue
         # extractor = DISK(max_num_keypoints=2048).eval().cuda()  # load the extractor
         # matcher = LightGlue(features='disk').eval().cuda()  # load the matcher
 
+        self.feature_store = FeatureStore(feature_dir, max_bytes=cfg.get('FEATURE_CACHE_MB', 512) * 1024 ** 2)
+
     @staticmethod
     def load(pil_image):
         pil_image = pil_image.convert('RGB')
@@ -32,25 +46,63 @@ class LightGlueModel(object):
         # image = image[..., ::-1]
         return numpy_image_to_torch(image)
 
-    def inference(self, image0, image1):
-        image0 = self.load(image0).cuda()
-        image1 = self.load(image1).cuda()
+    def extract(self, pil_image, key=None):
+        """
+        Local features of the image, extracted once per image.
 
-        with torch.no_grad():
-            # extract local features
-            feats0 = self.extractor.extract(image0)  # auto-resize the image, disable with resize=None
-            feats1 = self.extractor.extract(image1)
+        Args:
+            pil_image: PIL.Image
+            key: FeatureStore.view_key of a memory view, its features are persisted in the feature dir.
+                 default: hash of the image content, the features are only kept in memory
+
+        Returns:
+            feats: dict of numpy.array with a batch dimension, the input of match
+        """
+        persist = key is not None
+        if key is None:
+            key = self.feature_store.image_key(pil_image)
+        feats = self.feature_store.get(key)
+        if feats is None:
+            with torch.no_grad():
+                # auto-resize the image, disable with resize=None
+                feats = self.extractor.extract(self.load(pil_image).to(self.device))
+            feats = {name: value.cpu().numpy() for name, value in feats.items()}
+            self.feature_store.put(key, feats, persist=persist)
+        return feats
+
+    def match(self, feats0, feats1):
+        """
+        Args:
+            feats0, feats1: features returned by extract
 
-            # match the features
+        Returns:
+            number of matched keypoints
+        """
+        feats0, feats1 = [{name: torch.from_numpy(value).to(self.device) for name, value in feats.items()}
+                          for feats in (feats0, feats1)]
+        with torch.no_grad():
             matches01 = self.matcher({'image0': feats0, 'image1': feats1})
             feats0, feats1, matches01 = [rbd(x) for x in [feats0, feats1, matches01]]  # remove batch dimension
 
         kpts0, kpts1, matches = feats0['keypoints'], feats1['keypoints'], matches01['matches']
         m_kpts0, m_kpts1 = kpts0[matches[..., 0]], kpts1[matches[..., 1]]
-
-        torch.cuda.empty_cache()
         return len(m_kpts0)
 
+    def inference(self, image0, image1, key0=None, key1=None):
+        """
+        Args:
+            image0, image1: PIL.Image
+            key0, key1: keys of the images in the feature store, see extract
+
+        Returns:
+            number of matched keypoints
+        """
+        n_matches = self.match(self.extract(image0, key0), self.extract(image1, key1))
+
+        if self.device == 'cuda':
+            torch.cuda.empty_cache()
+        return n_matches
+
 
 if __name__ == '__main__':
     from PIL import Image
@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import pickle
+import sqlite3
+import hashlib
+import threading
+
+import numpy as np
+from PIL import Image
+
+from virl.utils.sqlite_utils import ThreadLocalSQLite, total_bytes, evict_least_recently_used
+
+
+# transport settings of the model clients that do not change the outputs and must not be part of the key
+IGNORED_CFG_KEYS = ('SERVER', 'TIMEOUT', 'DEADLINE', 'MAX_RETRIES', 'BACKOFF', 'BATCH_SIZE', 'JPEG_QUALITY',
+                    'FETCH_WORKERS')
+
+# one cache per sqlite database, shared by the detector, recognizer and multi-modal llm of a run
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def update_input_hash(sha256, value):
+    """
+    Feed an inference input into the hash: images by their pixels, image paths by their file content,
+    StreetViewImage by its image, containers element-wise and everything else by its repr.
+    """
+    if isinstance(value, Image.Image):
+        sha256.update(f'image|{value.mode}|{value.size[0]}|{value.size[1]}|'.encode('utf-8'))
+        sha256.update(value.tobytes())
+    elif isinstance(value, np.ndarray):
+        sha256.update(f'array|{value.dtype}|{value.shape}|'.encode('utf-8'))
+        sha256.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, str) and os.path.isfile(value):
+        with open(value, 'rb') as f:
+            sha256.update(b'file|')
+            sha256.update(hashlib.sha256(f.read()).digest())
+    elif isinstance(value, (list, tuple)):
+        sha256.update(f'list|{len(value)}|'.encode('utf-8'))
+        for x in value:
+            update_input_hash(sha256, x)
+    elif isinstance(value, dict):
+        sha256.update(f'dict|{len(value)}|'.encode('utf-8'))
+        for k in sorted(value, key=str):
+            sha256.update(f'{k}|'.encode('utf-8'))
+            update_input_hash(sha256, value[k])
+    elif hasattr(value, 'image') and isinstance(value.image, Image.Image):
+        # StreetViewImage, the camera parameters do not change what the model sees
+        update_input_hash(sha256, value.image)
+    else:
+        sha256.update(f'{type(value).__name__}|{value!r}|'.encode('utf-8'))
+
+
+def canonicalize_cfg(model_cfg):
+    if model_cfg is None:
+        return 'null'
+    items = {k: v for k, v in dict(model_cfg).items() if k not in IGNORED_CFG_KEYS}
+    return json.dumps(items, sort_keys=True, default=str, separators=(',', ':'))
+
+
+class InferenceCache(object):
+    """
+    Persistent, content-addressed cache of perception model outputs backed by sqlite.
+
+    Keys are the sha256 of the inputs (image content, candidates, thresholds, ...), the model name
+    and its config without the transport settings, so a rerun on unchanged inputs never calls the model.
+    Values are pickled. The database runs in WAL mode with one connection per thread, and once it
+    grows over max_bytes the least recently used entries are evicted down to 90% of it.
+    """
+    def __init__(self, cache_dir, max_bytes=1024 ** 3):
+        """
+        Args:
+            cache_dir (str): directory of the sqlite database
+            max_bytes (int): size limit of the stored values
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, 'inference_cache.sqlite')
+        self.max_bytes = max_bytes
+
+        self.db = ThreadLocalSQLite(self.db_path)
+        self.lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self.n_evicted = 0
+
+        with self.db.connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'key TEXT PRIMARY KEY, model TEXT, value BLOB, nbytes INTEGER, created_at REAL, accessed_at REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at)')
+            self.cur_bytes = total_bytes(conn, 'results')
+
+    @staticmethod
+    def make_key(model_name, model_cfg, *inputs):
+        """
+        Args:
+            model_name (str): e.g., GLIP, CLIPLocal
+            model_cfg (dict): config of the model
+            inputs: image, candidates, thresholds and other arguments of the inference
+
+        Returns:
+            key (str): hex sha256
+        """
+        sha256 = hashlib.sha256(f'{model_name}|{canonicalize_cfg(model_cfg)}|'.encode('utf-8'))
+        for value in inputs:
+            update_input_hash(sha256, value)
+        return sha256.hexdigest()
+
+    def _count(self, counter, model_name, n=1):
+        with self.lock:
+            counter[model_name] = counter.get(model_name, 0) + n
+
+    def lookup(self, key, model_name):
+        """
+        Returns:
+            (is_hit, value)
+        """
+        conn = self.db.connect()
+        row = conn.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self._count(self.misses, model_name)
+            return False, None
+
+        self._count(self.hits, model_name)
+        with conn:
+            conn.execute('UPDATE results SET accessed_at = ? WHERE key = ?', (time.time(), key))
+        return True, pickle.loads(row[0])
+
+    def store(self, key, model_name, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+
+        now = time.time()
+        with self.db.connect() as conn:
+            old = conn.execute('SELECT nbytes FROM results WHERE key = ?', (key,)).fetchone()
+            conn.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)',
+                (key, model_name, sqlite3.Binary(blob), len(blob), now, now)
+            )
+        with self.lock:
+            self.cur_bytes += len(blob) - (old[0] if old is not None else 0)
+            need_evict = self.cur_bytes > self.max_bytes
+        if need_evict:
+            self.evict()
+
+    def evict(self):
+        """Drop the least recently used entries until the cache is below 90% of max_bytes"""
+        with self.lock, self.db.connect() as conn:
+            # the sizes are re-read, other processes may have written to the same database
+            n_evicted, self.cur_bytes = evict_least_recently_used(conn, 'results', int(self.max_bytes * 0.9))
+            self.n_evicted += n_evicted
+
+    def get(self, key, model_name, compute_fn):
+        """
+        Args:
+            key (str): from make_key
+            model_name (str): for the hit and miss counters
+            compute_fn (callable): runs the model on a miss
+
+        Returns:
+            the cached or computed output
+        """
+        is_hit, value = self.lookup(key, model_name)
+        if is_hit:
+            return value
+
+        value = compute_fn()
+        self.store(key, model_name, value)
+        return value
+
+    def get_batch(self, keys, model_name, compute_fn):
+        """
+        Args:
+            keys (list): from make_key, one per input
+            model_name (str): for the hit and miss counters
+            compute_fn (callable): called with the indices of the misses, returns their outputs in order
+
+        Returns:
+            outputs (list): one per key
+        """
+        outputs = [None] * len(keys)
+        miss_indices = []
+        for i, key in enumerate(keys):
+            is_hit, value = self.lookup(key, model_name)
+            if is_hit:
+                outputs[i] = value
+            else:
+                miss_indices.append(i)
+
+        if len(miss_indices) > 0:
+            for i, value in zip(miss_indices, compute_fn(miss_indices)):
+                self.store(keys[i], model_name, value)
+                outputs[i] = value
+        return outputs
+
+    def stats(self):
+        with self.lock:
+            models = set(self.hits) | set(self.misses)
+            return {
+                model: {'hits': self.hits.get(model, 0), 'misses': self.misses.get(model, 0)}
+                for model in sorted(models)
+            }
+
+
+def is_sampled(model_cfg, generative=False):
+    """
+    Whether the outputs of a model are sampled, judged from its config: DO_SAMPLE is set, or a
+    generative model (multi-modal llm) has a TEMPERATURE above 0. The TEMPERATURE of the CLIP-like
+    recognizers is a logit scale and does not make them sampled.
+    """
+    if model_cfg is None:
+        return False
+    if model_cfg.get('DO_SAMPLE', False):
+        return True
+    return generative and (model_cfg.get('TEMPERATURE', None) or 0) > 0
+
+
+def build_inference_cache(vision_model_cfg, model_name, generative=False):
+    """
+    Models are assumed deterministic unless their config samples (see is_sampled) or they are
+    listed in EXCLUDE_MODELS, which is meant for models whose sampling does not show in the config,
+    e.g. GPT4V with the default temperature of the api.
+
+    Args:
+        vision_model_cfg: VISION_MODELS config, the cache is configured by VISION_MODELS.INFERENCE_CACHE
+        model_name (str): name of the model that will use the cache
+        generative (bool): whether the model generates text, so its TEMPERATURE is a sampling temperature
+
+    Returns:
+        InferenceCache shared by the models with the same CACHE_DIR, None if the cache is disabled
+        or the outputs of the model are sampled
+    """
+    cache_cfg = vision_model_cfg.get('INFERENCE_CACHE', None)
+    if cache_cfg is None or not cache_cfg.get('ENABLED', False):
+        return None
+    if model_name in cache_cfg.get('EXCLUDE_MODELS', []):
+        return None
+    if is_sampled(vision_model_cfg.get(model_name, None), generative=generative):
+        print(f'Inference cache is disabled for {model_name}, its outputs are sampled.')
+        return None
+
+    cache_dir = os.path.abspath(cache_cfg.CACHE_DIR)
+    with _CACHES_LOCK:
+        if cache_dir not in _CACHES:
+            _CACHES[cache_dir] = InferenceCache(cache_dir, max_bytes=int(cache_cfg.get('MAX_MB', 1024) * 1024 ** 2))
+        return _CACHES[cache_dir]
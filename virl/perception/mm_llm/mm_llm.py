@@ -1,13 +1,16 @@
 from importlib import import_module
 
+from virl.perception.inference_cache import InferenceCache, build_inference_cache
 from virl.utils import common_utils
 
 
 class MultiModalLLM(object):
     def __init__(self, model_cfg, name):
         self.model_cfg = model_cfg
+        self.name = name
 
         self.model = self.create_mm_llm(name)
+        self.inference_cache = build_inference_cache(model_cfg, name, generative=True)
 
     def create_mm_llm(self, name):
         # Mapping of model names to their respective class imports
@@ -41,7 +44,15 @@ class MultiModalLLM(object):
     def check(self, image, question, return_json=False):
         print(f'>>> Check with multi-modal language model.')
         common_utils.print_prompt(question)
-        answer = self.model.ask(image, question, return_json=return_json)
+        if self.inference_cache is None:
+            answer = self.model.ask(image, question, return_json=return_json)
+        else:
+            key = InferenceCache.make_key(
+                self.name, self.model_cfg.get(self.name, None), image, question, return_json
+            )
+            answer = self.inference_cache.get(
+                key, self.name, lambda: self.model.ask(image, question, return_json=return_json)
+            )
         common_utils.print_answer(answer)
 
         return answer
@@ -12,6 +12,7 @@ class CLIPClient(object):
     def __init__(self, cfg):
         self.server_url = cfg.SERVER
         self.client = Client(self.server_url)
+        self.max_retries = cfg.get('MAX_RETRIES', 5)
 
     def inference(self, img, text, temperature=100.0, img_format=None):
         """
@@ -31,8 +32,7 @@ class CLIPClient(object):
         output_dir = os.path.join(cfg.get('OUTPUT_DIR', 'output'), 'tmp')
         img_path = common_utils.save_tmp_image_to_file(img, output_dir, img_format)
 
-        while True:
-            flag = True
+        for attempt in range(self.max_retries + 1):
             try:
                 answer = self.client.predict(
                     img_path,
@@ -40,12 +40,13 @@ class CLIPClient(object):
                     temperature,  # float (numeric value between 1 and 100) in 'Temperature' Slider component
                     api_name="/predict"
                 )
+                break
             except requests.Timeout:
+                if attempt == self.max_retries:
+                    os.remove(img_path)
+                    raise
                 print('Timeout! Resend the message.')
-                flag = False
-            if flag:
-                break
-        
+
         logit_list, score_list = ast.literal_eval(answer)
         logit_list = ast.literal_eval(logit_list)
         score_list = ast.literal_eval(score_list)
@@ -0,0 +1,96 @@
+import io
+import time
+
+import requests
+from PIL import Image
+
+
+class CLIPHTTPClient(object):
+    """
+    Client of clip_http_server: the images are sent as JPEG bytes in one multipart request per
+    batch, and every call has a bounded number of retries within a deadline.
+    """
+    def __init__(self, cfg):
+        self.server_url = cfg.SERVER.rstrip('/')
+        self.timeout = cfg.get('TIMEOUT', 30)
+        self.deadline = cfg.get('DEADLINE', 120)
+        self.max_retries = cfg.get('MAX_RETRIES', 3)
+        self.backoff = cfg.get('BACKOFF', 0.5)
+        self.batch_size = cfg.get('BATCH_SIZE', 32)
+        self.jpeg_quality = cfg.get('JPEG_QUALITY', 95)
+        self.session = requests.Session()
+
+    def encode_image(self, img):
+        # jpeg files are sent as they are, without decoding and encoding them again
+        if isinstance(img, str):
+            if img.lower().endswith(('.jpg', '.jpeg')):
+                with open(img, 'rb') as f:
+                    return f.read()
+            with Image.open(img) as f:
+                img = f.convert('RGB')
+
+        buffer = io.BytesIO()
+        img.convert('RGB').save(buffer, format='JPEG', quality=self.jpeg_quality)
+        return buffer.getvalue()
+
+    def post(self, files, data):
+        """
+        Retry the connection errors, timeouts and server errors with exponential backoff, at most
+        max_retries times and until the deadline.
+        """
+        deadline = time.time() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.time()
+            try:
+                response = self.session.post(
+                    f'{self.server_url}/predict', files=files, data=data, timeout=min(self.timeout, remaining)
+                )
+                if response.status_code < 500:
+                    response.raise_for_status()
+                    return response.json()
+                error = f'server error {response.status_code}'
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = repr(e)
+
+            delay = self.backoff * 2 ** attempt
+            if attempt == self.max_retries or time.time() + delay >= deadline:
+                break
+            print(f'CLIP server request failed ({error}), retry in {delay:.1f}s.')
+            time.sleep(delay)
+
+        raise TimeoutError(f'CLIP server {self.server_url} failed after {attempt + 1} attempts: {error}')
+
+    def inference(self, img, text, temperature=100.0):
+        """
+        Args:
+            img: PIL.Image format
+            text: classification candidates in string format, separated by ',,',
+                  for example: 'restaurant,,bar,,cafe,,hotel'.
+            temperature: only works for CLIP model, default: 100.0
+
+        Returns:
+            results: dict, {'scores': list of scores for each candidate in the text in the same order}
+        """
+        return self.inference_batch([img], text, temperature)[0]
+
+    def inference_batch(self, images, text, temperature=100.0, batch_size=None):
+        """
+        Args:
+            images: list of PIL.Image or image paths
+            text: classification candidates in string format, separated by ',,'
+            temperature: only works for CLIP model, default: 100.0
+            batch_size: number of images per request, default: BATCH_SIZE of the config
+
+        Returns:
+            results: list of dict, the results of inference for each image
+        """
+        batch_size = self.batch_size if batch_size is None else batch_size
+        results = []
+        for start in range(0, len(images), batch_size):
+            files = [('images', (f'{i}.jpg', self.encode_image(img), 'image/jpeg'))
+                     for i, img in enumerate(images[start:start + batch_size])]
+            answer = self.post(files, {'text': text, 'temperature': temperature})
+            results.extend({'logits': logits, 'scores': scores}
+                           for logits, scores in zip(answer['logits'], answer['scores']))
+
+        return results
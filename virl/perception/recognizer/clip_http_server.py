@@ -0,0 +1,121 @@
+import io
+import time
+import zlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+from flask import Flask, jsonify, request
+
+
+class StubCLIPModel(object):
+    """
+    A CLIP shaped model without weights, to measure the transport overhead of the server.
+    Image features are a fixed random projection of an 8x8 thumbnail and text features are
+    seeded by the label, so the results are deterministic.
+    """
+    def __init__(self, dim=64, seed=0):
+        self.dim = dim
+        self.projection = np.random.default_rng(seed).normal(size=(8 * 8 * 3, dim))
+
+    def encode_text(self, candidates):
+        features = np.stack([
+            np.random.default_rng(zlib.crc32(label.encode('utf-8'))).normal(size=self.dim) for label in candidates
+        ])
+        return features / np.linalg.norm(features, axis=-1, keepdims=True)
+
+    def inference_batch(self, images, text, temperature=100.0):
+        thumbnails = np.stack([np.asarray(img.convert('RGB').resize((8, 8)), dtype=np.float64).ravel() / 255
+                               for img in images])
+        image_features = thumbnails @ self.projection
+        image_features /= np.linalg.norm(image_features, axis=-1, keepdims=True)
+
+        logits = temperature * image_features @ self.encode_text(text.split(',,')).T
+        scores = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        scores /= scores.sum(axis=-1, keepdims=True)
+        return [{'logits': logit, 'scores': score} for logit, score in zip(logits.tolist(), scores.tolist())]
+
+
+def decode_image(data):
+    with Image.open(io.BytesIO(data)) as img:
+        return img.convert('RGB')
+
+
+def create_app(model, decode_workers=4):
+    """
+    POST /predict, multipart form:
+        images: one or more encoded images (JPEG), scored in one batch
+        text: candidates separated by ',,'
+        temperature: float, default 100.0
+    Response: {'logits': [[float]], 'scores': [[float]]}, one row per image
+    """
+    app = Flask(__name__)
+    # one batch on the model at a time, the requests still decode their images concurrently
+    model_lock = threading.Lock()
+    decode_pool = ThreadPoolExecutor(max_workers=decode_workers)
+
+    @app.route('/health')
+    def health():
+        return jsonify({'status': 'OK'})
+
+    @app.route('/predict', methods=['POST'])
+    def predict():
+        files = request.files.getlist('images')
+        text = request.form.get('text', '')
+        if len(files) == 0 or len(text) == 0:
+            return jsonify({'error': 'images and text are required'}), 400
+        temperature = float(request.form.get('temperature', 100.0))
+
+        images = list(decode_pool.map(decode_image, [file.read() for file in files]))
+
+        start = time.time()
+        with model_lock:
+            if hasattr(model, 'inference_batch'):
+                answers = model.inference_batch(images, text, temperature)
+            else:
+                answers = [model.inference(img, text, temperature) for img in images]
+
+        return jsonify({
+            'logits': [answer['logits'] for answer in answers],
+            'scores': [answer['scores'] for answer in answers],
+            'model_time': time.time() - start
+        })
+
+    return app
+
+
+def build_model(args):
+    from easydict import EasyDict
+
+    if args.model == 'stub':
+        return StubCLIPModel()
+    elif args.model == 'CLIPLocal':
+        from virl.perception.recognizer.clip_local import CLIPLocal
+        return CLIPLocal(EasyDict({'NAME': args.model_name, 'BATCH_SIZE': args.batch_size}))
+    elif args.model == 'OpenCLIP':
+        from virl.perception.recognizer.open_clip_local import OpenCLIPLocal
+        return OpenCLIPLocal(EasyDict({'NAME': args.model_name, 'PRETRAINED': args.pretrained,
+                                       'BATCH_SIZE': args.batch_size}))
+    elif args.model == 'EvaCLIP':
+        from virl.perception.recognizer.eva_clip_client import EvaCLIPClient
+        return EvaCLIPClient(EasyDict({'MODEL_NAME': args.model_name, 'MODEL_PATH': args.model_path}))
+    else:
+        raise NotImplementedError(f'Model {args.model} is not implemented.')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default='127.0.0.1')
+    parser.add_argument("--port", type=int, default=22412)
+    parser.add_argument("--model", type=str, default='CLIPLocal', choices=['stub', 'CLIPLocal', 'OpenCLIP', 'EvaCLIP'])
+    parser.add_argument("--model_name", type=str, default='ViT-L/14@336px')
+    parser.add_argument("--pretrained", type=str, default=None, help='OpenCLIP only')
+    parser.add_argument("--model_path", type=str, default=None, help='EvaCLIP only')
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--decode_workers", type=int, default=4)
+    args = parser.parse_args()
+
+    app = create_app(build_model(args), args.decode_workers)
+    app.run(host=args.host, port=args.port, threaded=True)
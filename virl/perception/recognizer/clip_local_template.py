@@ -0,0 +1,124 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+import PIL.Image as Image
+
+from virl.utils.common_utils import LRUCache
+
+
+class CLIPLocalTemplate(object):
+    """
+    Shared inference of the local CLIP style models.
+
+    Text embeddings are cached per (model, normalized label), since the same candidate lists
+    are scored against thousands of images, and images are decoded and preprocessed in a thread
+    pool, one batch ahead of the model.
+    """
+    def __init__(self, cfg):
+        self.model_name = cfg.NAME
+        self.temperature = cfg.get('TEMPERATURE', 100.0)
+        self.batch_size = cfg.get('BATCH_SIZE', 32)
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.model = None
+        self.preprocess = None
+        self.tokenizer = None
+
+        self.text_cache = LRUCache(max_bytes=cfg.get('TEXT_CACHE_MB', 64) * 1024 ** 2)
+        self.preprocess_pool = ThreadPoolExecutor(max_workers=cfg.get('PREPROCESS_WORKERS', 4))
+        # assembles the next batch from the preprocess pool, a separate pool so it never waits on itself
+        self.prefetch_pool = ThreadPoolExecutor(max_workers=1)
+
+    def logit_scale(self):
+        raise NotImplementedError
+
+    @staticmethod
+    def normalize_label(label):
+        # the CLIP tokenizers lower case and collapse the whitespaces as well
+        return re.sub(r'\s+', ' ', label.strip().lower())
+
+    def encode_text(self, candidates):
+        """
+        Args:
+            candidates (list): candidate labels
+
+        Returns:
+            text_features (torch.Tensor): (K, D) normalized text embeddings, in the order of the candidates
+        """
+        keys = [(self.model_name, self.normalize_label(label)) for label in candidates]
+        labels = dict(zip(keys, candidates))
+        features = {key: self.text_cache.get(key) for key in labels}
+        missing = [key for key, feature in features.items() if feature is None]
+        if len(missing) > 0:
+            tok = self.tokenizer([labels[key] for key in missing]).to(self.device)
+            with torch.no_grad(), torch.cuda.amp.autocast():
+                text_features = self.model.encode_text(tok)
+                text_features /= text_features.norm(dim=-1, keepdim=True)
+            for key, feature in zip(missing, text_features):
+                feature = feature.clone()
+                features[key] = feature
+                self.text_cache.put(key, feature, nbytes=feature.numel() * feature.element_size())
+
+        return torch.stack([features[key] for key in keys])
+
+    def load_and_preprocess(self, img):
+        if isinstance(img, str):
+            with Image.open(img) as f:
+                img = f.convert('RGB')
+        return self.preprocess(img)
+
+    def preprocess_batch(self, images):
+        return torch.stack(list(self.preprocess_pool.map(self.load_and_preprocess, images)))
+
+    def inference(self, img, text, temperature=None):
+        """
+        Args:
+            img: PIL.Image format
+            text: classification candidates in string format, separated by ',,',
+                  for example: 'restaurant,,bar,,cafe,,hotel'.
+            temperature: only works for CLIP model, default: 100.0
+
+        Returns:
+            results: dict, {'scores': list of scores for each candidate in the text in the same order}
+        """
+        return self.inference_batch([img], text, temperature)[0]
+
+    def inference_batch(self, images, text, temperature=None, batch_size=None):
+        """
+        Args:
+            images: list of PIL.Image or image paths, the paths are decoded in the preprocess pool
+            text: classification candidates in string format, separated by ',,', or a list of candidates
+            temperature: only works for CLIP model, default: 100.0
+            batch_size: number of images per forward pass, default: BATCH_SIZE of the model config
+
+        Returns:
+            results: list of dict, the results of inference for each image
+        """
+        if temperature is None:
+            temperature = self.temperature
+        temperature /= 100.0  # the default temperature is 100.0
+        batch_size = self.batch_size if batch_size is None else batch_size
+
+        candidates = text.split(',,') if isinstance(text, str) else list(text)
+        text_features = self.encode_text(candidates)
+
+        batches = [images[i:i + batch_size] for i in range(0, len(images), batch_size)]
+        results = []
+        # the next batch is preprocessed while the model runs on the current one
+        next_batch = self.prefetch_pool.submit(self.preprocess_batch, batches[0]) if batches else None
+        for i in range(len(batches)):
+            image = next_batch.result().to(self.device)
+            if i + 1 < len(batches):
+                next_batch = self.prefetch_pool.submit(self.preprocess_batch, batches[i + 1])
+
+            with torch.no_grad(), torch.cuda.amp.autocast():
+                image_features = self.model.encode_image(image)
+                image_features /= image_features.norm(dim=-1, keepdim=True)
+
+                text_logits = temperature * self.logit_scale() * image_features @ text_features.T.to(image_features.dtype)
+                text_probs = torch.nn.functional.softmax(text_logits, dim=-1)
+
+            logits, probs = text_logits.float().cpu().numpy().tolist(), text_probs.float().cpu().numpy().tolist()
+            results.extend({'logits': logit, 'scores': prob} for logit, prob in zip(logits, probs))
+
+        return results
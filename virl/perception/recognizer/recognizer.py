@@ -3,6 +3,8 @@ import cv2
 import numpy as np
 from PIL import Image
 
+from virl.perception.inference_cache import InferenceCache, build_inference_cache
+
 
 class Recognizer(object):
     def __init__(self, vision_model_cfg, recognize_cfg, messager=None, platform=None) -> None:
@@ -10,12 +12,15 @@ class Recognizer(object):
         self.messager = messager
         self.platform = platform
 
+        self.model_cfg = getattr(vision_model_cfg, self.recognize_cfg.NAME)
         self.model = self.build_model(vision_model_cfg)
+        self.inference_cache = build_inference_cache(vision_model_cfg, self.recognize_cfg.NAME)
 
     def build_model(self, vision_model_cfg):
         model_cfg = getattr(vision_model_cfg, self.recognize_cfg.NAME)
         recognizer_mapping = {
             'CLIP': ('virl.perception.recognizer.clip_client', 'CLIPClient'),
+            'CLIPServer': ('virl.perception.recognizer.clip_http_client', 'CLIPHTTPClient'),
             'EvaCLIP': ('virl.perception.recognizer.eva_clip_client', 'EvaCLIPClient'),
             'LLaVA': ('virl.perception.recognizer.llava_client', 'LLaVAClient'),
             'PaddleOCR': ('virl.perception.recognizer.paddle_ocr', 'PaddleOCR'),
@@ -50,9 +55,47 @@ class Recognizer(object):
         Returns:
 
         """
-        answer = self.model.inference(img, candidates)
-        score_list = answer['scores']
+        if self.inference_cache is None:
+            answer = self.model.inference(img, candidates)
+        else:
+            answer = self.inference_cache.get(
+                self.make_cache_key(img, candidates), self.recognize_cfg.NAME,
+                lambda: self.model.inference(img, candidates)
+            )
+        return self.filter_cared_labels(answer['scores'], candidates, cared_labels)
+
+    def check_batch(self, imgs, candidates, cared_labels):
+        """
+        Batched version of check, for the models with inference_batch (the local CLIP models).
+
+        Args:
+            imgs: list of images in PIL.Image format or image paths
+            candidates: candidates in string format, separated by ',,'
+            cared_labels: list of cared labels
+
+        Returns:
+            results: list of the results of check for each image
+        """
+        if self.inference_cache is None:
+            answers = self.inference_batch(imgs, candidates)
+        else:
+            # only the images missing from the cache are sent to the model
+            answers = self.inference_cache.get_batch(
+                [self.make_cache_key(img, candidates) for img in imgs], self.recognize_cfg.NAME,
+                lambda indices: self.inference_batch([imgs[i] for i in indices], candidates)
+            )
+        return [self.filter_cared_labels(answer['scores'], candidates, cared_labels) for answer in answers]
+
+    def inference_batch(self, imgs, candidates):
+        if hasattr(self.model, 'inference_batch'):
+            return self.model.inference_batch(imgs, candidates)
+        return [self.model.inference(Image.open(img) if isinstance(img, str) else img, candidates) for img in imgs]
+
+    def make_cache_key(self, img, candidates):
+        return InferenceCache.make_key(self.recognize_cfg.NAME, self.model_cfg, img, candidates)
 
+    @staticmethod
+    def filter_cared_labels(score_list, candidates, cared_labels):
         results = {
             'labels': [],
             'scores': [],
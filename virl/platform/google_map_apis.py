@@ -1,5 +1,6 @@
 import os
 import time
+import threading
 import requests
 import pickle
 import warnings
@@ -10,11 +11,38 @@ import PIL.Image as Image
 
 from io import BytesIO
 from queue import PriorityQueue
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from shapely.geometry import Point
 
-from virl.utils.common_utils import ComparableObj
+from virl.utils.common_utils import ComparableObj, LRUCache, TokenBucket
 from virl.utils import geocode_utils, common_utils
-from virl.platform.street_view import StreetViewImage, get_perspective_from_panorama
+from virl.utils.spatial_index import build_or_load_mapping_index
+from virl.platform.http_cache import HTTPCache
+from virl.platform.relocation_cache import RelocationCache
+from virl.platform.street_view import StreetViewImage, get_perspective_from_panorama, get_perspectives_from_panorama, \
+    set_remap_grid_cache_size
+
+
+_SESSION_LOCK = threading.Lock()
+_SESSION = None
+_SESSION_PID = None
+
+
+def get_http_session(pool_size=32):
+    """
+    Process-wide requests.Session with a connection pool, so repeated calls to the same
+    Google endpoints reuse connections. A new session is created after a fork.
+    """
+    global _SESSION, _SESSION_PID
+    with _SESSION_LOCK:
+        if _SESSION is None or _SESSION_PID != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _SESSION, _SESSION_PID = session, os.getpid()
+        return _SESSION
 
 
 class GoogleMapAPI(object):
@@ -32,6 +60,19 @@ class GoogleMapAPI(object):
             'place_photos': 'https://maps.googleapis.com/maps/api/place/photo'
         }
 
+        # requests per second of all threads using this api, a limiter can also be shared by several apis
+        self.rate_limiter = kwargs.get('rate_limiter', None) or TokenBucket(kwargs.get('rate_limit', 0))
+
+        # persistent response cache shared by all endpoints
+        http_cache_cfg = kwargs.get('http_cache_cfg', None)
+        if http_cache_cfg is not None and http_cache_cfg.ENABLED:
+            self.http_cache = HTTPCache(
+                http_cache_cfg.CACHE_DIR, mode=http_cache_cfg.get('MODE', 'read_write'),
+                ttls=http_cache_cfg.get('TTL', None), default_ttl=http_cache_cfg.get('DEFAULT_TTL', -1)
+            )
+        else:
+            self.http_cache = None
+
         offline_cfg = kwargs['offline_cfg']
         if offline_cfg.ENABLED:
             self.offline_cfg = offline_cfg
@@ -39,6 +80,23 @@ class GoogleMapAPI(object):
             self.offline_mode = True
         else:
             self.offline_mode = False
+
+        # memoized relocate_geocode_by_source results
+        relocation_cache_cfg = kwargs.get('relocation_cache_cfg', None)
+        if relocation_cache_cfg is not None and relocation_cache_cfg.ENABLED:
+            if self.offline_mode and getattr(self, 'offline_mapping', False):
+                # results depend on the mapping file and the radius, do not mix them with other mappings
+                namespace = f'offline:{os.path.abspath(self.mapping_path)}:{os.path.getmtime(self.mapping_path)}:' \
+                            f'{offline_cfg.MAPPING_RADIUS}'
+            else:
+                namespace = 'online'
+            cache_dir = relocation_cache_cfg.get('CACHE_DIR', 'None')
+            self.relocation_cache = RelocationCache(
+                cache_dir if cache_dir != 'None' else None, grid_m=relocation_cache_cfg.get('GRID_M', 0.5),
+                max_entries=relocation_cache_cfg.get('MAX_ENTRIES', 100000), namespace=namespace
+            )
+        else:
+            self.relocation_cache = None
     
     def init_offline(self, offline_cfg):
         self.panorama_dir = offline_cfg.PANORAMA_DIR
@@ -47,14 +105,53 @@ class GoogleMapAPI(object):
         if self.panorama_dir != 'None':
             self.offline_pano = True
             print(f'Offline panorama mode is enabled. Panorama dir: {self.panorama_dir}')
+            # decoded panoramas and metadata are shared by all headings rendered at the same position
+            self.panorama_cache = LRUCache(max_bytes=offline_cfg.get('PANO_CACHE_MB', 1024) * 1024 ** 2)
+            set_remap_grid_cache_size(offline_cfg.get('REMAP_GRID_CACHE_MB', 256) * 1024 ** 2)
         
         if self.mapping_path != 'None':
             self.offline_mapping = True
             print(f'Offline mapping mode is enabled. Mapping path: {self.mapping_path}')
             self.gps_to_pano_mapping = pickle.load(open(self.mapping_path, 'rb'))
 
+            # spatial index for sub-linear relocation, persisted next to the mapping file
+            index_cfg = offline_cfg.get('SPATIAL_INDEX', {})
+            if index_cfg.get('ENABLED', True):
+                self.mapping_index = build_or_load_mapping_index(
+                    self.mapping_path, self.gps_to_pano_mapping, cell_deg=index_cfg.get('CELL_DEG', 0.0005)
+                )
+            else:
+                self.mapping_index = None
+
         # TODO: add place information
 
+    def http_get(self, endpoint: str, params: dict, fetch_delay: float = 0):
+        """
+        GET an endpoint in self.base_urls through the http cache (if enabled).
+
+        Args:
+            endpoint (str): key of self.base_urls
+            params (dict): query params
+            fetch_delay (float): seconds to sleep before a network request (skipped on cache hits)
+
+        Network requests wait for self.rate_limiter, cache hits do not.
+
+        Returns:
+            response: requests.Response or http_cache.CachedResponse
+        """
+        base_url = self.base_urls[endpoint]
+
+        def fetch():
+            if fetch_delay > 0:
+                time.sleep(fetch_delay)
+            self.rate_limiter.acquire()
+            return get_http_session().get(base_url, params=params)
+
+        if self.http_cache is None:
+            return fetch()
+
+        return self.http_cache.get(endpoint, params, fetch)
+
     def get_geocode_from_address(self, address: str, language='en') -> tuple:
         """
         Parse natural language address to geocode, a.k.a latitude and longitude
@@ -67,7 +164,7 @@ class GoogleMapAPI(object):
         Returns:
             (latitude, longitude)
         """
-        base_url = self.base_urls['geocode']
+        endpoint = 'geocode'
 
         params = {
             'address': address,
@@ -75,7 +172,7 @@ class GoogleMapAPI(object):
             'key': self.key
         }
 
-        response_json = requests.get(base_url, params=params).json()
+        response_json = self.http_get(endpoint, params).json()
 
         latitude = response_json['results'][0]['geometry']['location']['lat']
         longitude = response_json['results'][0]['geometry']['location']['lng']
@@ -103,7 +200,7 @@ class GoogleMapAPI(object):
         Returns:
             geocode (tuple): latitude and longitude
         """
-        base_url = self.base_urls['findplacefromtext']
+        endpoint = 'findplacefromtext'
         params = {
             'fields': ','.join(query_info),
             'input': address,
@@ -112,7 +209,7 @@ class GoogleMapAPI(object):
             'key': self.key
         }
 
-        response_json = requests.get(base_url, params=params).json()
+        response_json = self.http_get(endpoint, params).json()
 
         if response_json['status'] != 'OK':
             print(response_json)
@@ -150,7 +247,7 @@ class GoogleMapAPI(object):
             final_list: a list of place information ranked by ranking_type or rankby
         """
         pri_queue = PriorityQueue()
-        base_url = self.base_urls['nearby_search']
+        endpoint = 'nearby_search'
         # url = "location=-33.8670522%2C151.1957362&radius=1500&type=restaurant&key=YOUR_API_KEY"        
         params = {
             'location': f'{geocode[0]},{geocode[1]}',
@@ -159,7 +256,7 @@ class GoogleMapAPI(object):
         }
         params.update(kwargs)
 
-        response_json = requests.get(base_url, params=params).json()
+        response_json = self.http_get(endpoint, params).json()
         pri_queue = self.parse_nearby_json(
             response_json, geocode, pri_queue, ranking_type, relocated=relocated, radius=radius_custom,
             cal_distance=cal_distance, type_custom=type_custom, polygon_filter=polygon_filter
@@ -169,9 +266,8 @@ class GoogleMapAPI(object):
         # https://maps.googleapis.com/maps/api/place/nearbysearch/json?pagetoken=NEXT_PAGE_TOKEN&key=YOUR_API_KEY
         while not no_next_page and response_json.get('next_page_token', None) and pri_queue.qsize() > 0:
             next_page_token = response_json['next_page_token']
-            next_url = f'{base_url}?pagetoken={next_page_token}&key={self.key}'
             # sleep to wait the preparation of next page
-            response_json = self.loop_to_get_next_page(next_url)
+            response_json = self.loop_to_get_next_page(endpoint, next_page_token)
 
             pri_queue = self.parse_nearby_json(
                 response_json, geocode, pri_queue, ranking_type, relocated=relocated, radius=radius_custom,
@@ -182,11 +278,11 @@ class GoogleMapAPI(object):
 
         return final_list
 
-    @staticmethod
-    def loop_to_get_next_page(next_url):
+    def loop_to_get_next_page(self, endpoint, next_page_token):
+        params = {'pagetoken': next_page_token, 'key': self.key}
         while True:
-            time.sleep(2)  # sleep to wait the preparation of next page
-            response_json = requests.get(next_url).json()
+            # sleep to wait the preparation of next page
+            response_json = self.http_get(endpoint, params, fetch_delay=2).json()
             if response_json['status'] == 'OK':
                 return response_json
 
@@ -218,7 +314,7 @@ class GoogleMapAPI(object):
             list: _description_
         """
         pri_queue = PriorityQueue()
-        base_url = self.base_urls['textsearch']
+        endpoint = 'textsearch'
         params = {
             'location': f'{geocode[0]},{geocode[1]}',
             'query': query,
@@ -228,7 +324,7 @@ class GoogleMapAPI(object):
         }
         params.update(kwargs)
 
-        response_json = requests.get(base_url, params=params).json()
+        response_json = self.http_get(endpoint, params).json()
         pri_queue = self.parse_nearby_json(
             response_json, geocode, pri_queue, ranking_type, radius=radius_custom, min_reviews=min_reviews
         )
@@ -237,9 +333,8 @@ class GoogleMapAPI(object):
         # https://maps.googleapis.com/maps/api/place/nearbysearch/json?pagetoken=NEXT_PAGE_TOKEN&key=YOUR_API_KEY
         while response_json.get('next_page_token', None):
             next_page_token = response_json['next_page_token']
-            next_url = f'{base_url}?pagetoken={next_page_token}&key={self.key}'
             # sleep to wait the preparation of next page
-            response_json = self.loop_to_get_next_page(next_url)
+            response_json = self.loop_to_get_next_page(endpoint, next_page_token)
             pri_queue = self.parse_nearby_json(
                 response_json, geocode, pri_queue, ranking_type, radius=radius_custom, min_reviews=min_reviews
             )
@@ -341,7 +436,7 @@ class GoogleMapAPI(object):
             else:
                 warnings.warn(f'Cannot find the streetview image for {geocode} in offline database. Call online api.')
 
-        base_url = self.base_urls['streetview']
+        endpoint = 'streetview'
         # example url:
         # https://maps.googleapis.com/maps/api/streetview?size=400x400&location=47.5763831,-122.4211769&fov=80&heading=0&pitch=0&key=YOUR_API_KEY
         params = {
@@ -354,7 +449,7 @@ class GoogleMapAPI(object):
             'key': self.key
         }
 
-        response = requests.get(base_url, params=params)
+        response = self.http_get(endpoint, params)
 
         if response.status_code == 200:
             image = Image.open(BytesIO(response.content))
@@ -393,14 +488,10 @@ class GoogleMapAPI(object):
             geocode, pano_id = self.relocate_geocode_by_source(geocode, source=source)
         
         # Step 2: load the panorama image
-        pano_img_path = os.path.join(self.panorama_dir, f'{pano_id}.jpg')
-        pano_image_metadata_path = os.path.join(self.panorama_dir, f'{pano_id}.metadata.json')
-        if not os.path.exists(pano_img_path):
-            warnings.warn(f'Cannot find the panorama image for {pano_id} in {self.panorama_dir}')
+        img, img_metadata = self.load_panorama_offline(pano_id)
+        if img is None:
             return False, None
 
-        img = cv2.imread(pano_img_path, cv2.IMREAD_COLOR)
-        img_metadata = json.load(open(pano_image_metadata_path, 'r'))
         north_rotation = img_metadata['rotation']
         image = get_perspective_from_panorama(img, fov, heading, pitch, size[1], size[0], north_rotation)
         
@@ -410,7 +501,155 @@ class GoogleMapAPI(object):
 
         return True, street_image
         
+    def load_panorama_offline(self, pano_id):
+        """
+        Load the decoded panorama and its metadata, cached by an LRU bounded by PANO_CACHE_MB.
+
+        Returns:
+            img (numpy.array): BGR panorama, None if the panorama is missing or cannot be decoded
+            img_metadata (dict): panorama metadata
+        """
+        cached = self.panorama_cache.get(pano_id)
+        if cached is not None:
+            return cached
+
+        pano_img_path = os.path.join(self.panorama_dir, f'{pano_id}.jpg')
+        pano_image_metadata_path = os.path.join(self.panorama_dir, f'{pano_id}.metadata.json')
+        if not os.path.exists(pano_img_path):
+            warnings.warn(f'Cannot find the panorama image for {pano_id} in {self.panorama_dir}')
+            return None, None
+
+        img = cv2.imread(pano_img_path, cv2.IMREAD_COLOR)
+        if img is None:
+            warnings.warn(f'Cannot decode the panorama image {pano_img_path}, it may be corrupted')
+            return None, None
+        with open(pano_image_metadata_path, 'r') as f:
+            img_metadata = json.load(f)
+        # the cached array is shared, make sure nobody modifies it in place
+        img.setflags(write=False)
+        self.panorama_cache.put(pano_id, (img, img_metadata), nbytes=img.nbytes)
+
+        return img, img_metadata
+
+    def render_views(self, pano, headings, pitches, fov, size, geocode=None, start_idx=0):
+        """
+        Render several perspective views of one offline panorama in one call.
+        The panorama is decoded once, the sampling grids of all views are built in one
+        vectorized pass, and the views are remapped on a thread pool.
+
+        Args:
+            pano (str): panorama id
+            headings (list): compass headings of the cameras
+            pitches (list or int): pitch of each heading, or one pitch for all
+            fov (int): field of view of the camera in degrees
+            size (tuple): (width, height)
+            geocode (tuple): geocode stored in the returned StreetViewImage
+            start_idx (int): index of the first view in the check around process
+
+        Returns:
+            list: a list of StreetViewImage, None if the panorama is missing or cannot be decoded
+        """
+        img, img_metadata = self.load_panorama_offline(pano)
+        if img is None:
+            return None
+
+        images = get_perspectives_from_panorama(
+            img, fov, headings, pitches, size[1], size[0], img_metadata['rotation']
+        )
+        if not isinstance(pitches, (list, tuple)):
+            pitches = [pitches] * len(headings)
+
+        return [
+            StreetViewImage(image, heading, pitch, fov, geocode, i=start_idx + i)
+            for i, (image, heading, pitch) in enumerate(zip(images, headings, pitches))
+        ]
+
+    def get_streetviews_from_geocode(self, geocode: tuple, size: tuple, heading_list: list,
+                                     pitch: int, fov: int, source: str = 'outdoor', max_workers: int = 8,
+                                     skip_failed: bool = False):
+        """
+        Get the street view images of several headings at one geocode.
+        In offline panorama mode all views are rendered from one decoded panorama with render_views.
+        Online, the headings are fetched concurrently over the shared pooled session.
+
+        Args:
+            max_workers (int): maximum number of concurrent online requests
+            skip_failed (bool): skip the headings that fail online with a warning instead of raising the first
+                error. The returned list is then shorter than heading_list, callers that index heading_list
+                with the position of an image must keep the default.
+
+        Returns:
+            list: a list of StreetViewImage in the order of heading_list
+        """
+        heading_list = list(heading_list)
+        if self.offline_mode and self.offline_pano:
+            if geocode in self.gps_to_pano_mapping:
+                pano_geocode, pano_id = geocode, self.gps_to_pano_mapping[geocode]
+            else:
+                pano_geocode, pano_id = self.relocate_geocode_by_source(geocode, source=source)
+
+            images = self.render_views(pano_id, heading_list, pitch, fov, size, geocode=pano_geocode)
+            if images is not None:
+                return images
+            warnings.warn(f'Cannot find the panorama image for {pano_id} in {self.panorama_dir}. Call online api.')
+
+        def fetch(i):
+            try:
+                return self.get_streetview_from_geocode(
+                    geocode, size, heading_list[i], pitch, fov, source=source, idx=i
+                ), None
+            except Exception as e:
+                return None, e
+
+        if max_workers > 1 and len(heading_list) > 1:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(heading_list))) as executor:
+                results = list(executor.map(fetch, range(len(heading_list))))
+        else:
+            results = [fetch(i) for i in range(len(heading_list))]
+
+        images = []
+        errors = []
+        for heading, (image, error) in zip(heading_list, results):
+            if error is None:
+                images.append(image)
+            elif not skip_failed:
+                raise error
+            else:
+                warnings.warn(f'Failed to get the streetview at {geocode} with heading {heading}: {error}')
+                errors.append(error)
+
+        if len(heading_list) > 0 and len(images) == 0:
+            raise errors[0]
+
+        return images
+
     def relocate_geocode_by_source(self, geocode: tuple, source: str = 'outdoor'):
+        """
+        Snap a geocode to the nearest street view panorama.
+
+        Args:
+            geocode (tuple): latitude and longitude
+            source (str): street view source, e.g., outdoor
+
+        Returns:
+            new_geocode (tuple): geocode of the panorama, None if there is no panorama or the api failed
+            pano_id (str): panorama id, None if there is no panorama or the api failed
+        """
+        if self.relocation_cache is None:
+            result = self._relocate_geocode_by_source(geocode, source)
+        else:
+            result = self.relocation_cache.get(
+                geocode, source, lambda: self._relocate_geocode_by_source(geocode, source)
+            )
+
+        return result if result is not None else (None, None)
+
+    def _relocate_geocode_by_source(self, geocode: tuple, source: str = 'outdoor'):
+        """
+        Returns:
+            (new_geocode, pano_id): (None, None) if there is no panorama (ZERO_RESULTS),
+                None if the api failed (e.g., UNKNOWN_ERROR), which the relocation cache does not store
+        """
         if self.offline_mode and self.offline_mapping:
             is_success, new_geocode, pano_id = self._relocate_geocode_by_source_offline(geocode)
             if is_success:
@@ -419,7 +658,7 @@ class GoogleMapAPI(object):
                 warnings.warn(f'Cannot find the nearest geocode within {self.offline_cfg.MAPPING_RADIUS} '
                               f'for {geocode}. Call online api.')
         
-        base_url = self.base_urls['streetview_meta']
+        endpoint = 'streetview_meta'
 
         params = {
             'location': f'{geocode[0]},{geocode[1]}',
@@ -427,15 +666,17 @@ class GoogleMapAPI(object):
             'key': self.key
         }
         
-        response_json = requests.get(base_url, params=params).json()
+        response_json = self.http_get(endpoint, params).json()
         if response_json['status'] == 'OK':
             new_geocode = (response_json['location']['lat'], response_json['location']['lng'])
             pano_id = response_json['pano_id']
             return new_geocode, pano_id
-        elif response_json['status'] in ['ZERO_RESULTS', 'UNKNOWN_ERROR']:
+        elif response_json['status'] == 'ZERO_RESULTS':
             return None, None
         else:
+            # transient errors must not be cached as "no panorama here"
             print(f'Relocated geocode error: {response_json}')
+            return None
 
     def _relocate_geocode_by_source_offline(self, geocode: tuple):
         # for the case that geocode is in the mapping file, directly get the pano id
@@ -446,6 +687,15 @@ class GoogleMapAPI(object):
         
         # for the case that geocode is not in the mapping file,
         # calculate the disatnce to find the nearest geocode.
+        if self.mapping_index is not None:
+            idx, distance = self.mapping_index.query_nearest(geocode, max_radius=self.offline_cfg.MAPPING_RADIUS)
+            if idx is not None and distance < self.offline_cfg.MAPPING_RADIUS:
+                nearest_geocode = self.mapping_index.geocode(idx)
+                pano_id = self.gps_to_pano_mapping[nearest_geocode]
+                return True, nearest_geocode, pano_id
+            else:
+                return False, None, None
+
         gps_list = list(self.gps_to_pano_mapping.keys())
         distance_matrix = geocode_utils.cal_distance_between_two_position_list(
             [geocode], gps_list
@@ -458,6 +708,31 @@ class GoogleMapAPI(object):
         else:
             return False, None, None
 
+    def get_nearby_panos_offline(self, geocode: tuple, k: int = None, radius: float = None):
+        """
+        Query the offline panoramas around a geocode with the spatial index.
+
+        Args:
+            geocode (tuple): latitude and longitude
+            k (int): the number of nearest panoramas, None for no limit (radius must be given)
+            radius (float): the search radius in meters, None for no limit (k must be given)
+
+        Returns:
+            list: a list of (geocode, pano_id, distance) sorted by distance
+        """
+        assert k is not None or radius is not None
+        if k is None:
+            idx_list, distances = self.mapping_index.query_radius(geocode, radius)
+        else:
+            idx_list, distances = self.mapping_index.query_knn(geocode, k, max_radius=radius)
+
+        results = []
+        for idx, distance in zip(idx_list, distances):
+            nearest_geocode = self.mapping_index.geocode(idx)
+            results.append((nearest_geocode, self.gps_to_pano_mapping[nearest_geocode], float(distance)))
+
+        return results
+
     def get_routing(self, origin, destination, mode='walking', avoid='indoor', language='en',
                     way_points=None, polyline=False, stopover=False, optimized=False,
                     no_last_leg=False, modify_destination=True, **kwargs):
@@ -488,8 +763,8 @@ class GoogleMapAPI(object):
             way_points_str = self.formulate_waypoints(way_points, stopover, optimized)
             params['waypoints'] = f'{way_points_str}'
 
-        base_url = self.base_urls['directions']
-        response_json = requests.get(base_url, params=params).json()
+        endpoint = 'directions'
+        response_json = self.http_get(endpoint, params).json()
 
         if stopover or optimized:
             legs = response_json['routes'][0]['legs']  # [:-1]
@@ -624,7 +899,7 @@ class GoogleMapAPI(object):
         return subsampled_geocode_list
 
     def get_place_reviews(self, place_id, language='en', fields='reviews'):
-        base_url = self.base_urls['place_details']
+        endpoint = 'place_details'
 
         params = {
             'place_id': place_id,
@@ -633,7 +908,7 @@ class GoogleMapAPI(object):
             'key': self.key,
         }
 
-        response_json = requests.get(base_url, params=params).json()
+        response_json = self.http_get(endpoint, params).json()
         try:
             reviews = response_json['result']['reviews']
         except:
@@ -665,8 +940,8 @@ class GoogleMapAPI(object):
     def get_transportation_time(self, origin, destination, mode='walking', avoid='indoor', language='en'):
         params, _, _ = self._get_route_params(origin, destination, mode, avoid, language)
 
-        base_url = self.base_urls['directions']
-        response_json = requests.get(base_url, params=params).json()
+        endpoint = 'directions'
+        response_json = self.http_get(endpoint, params).json()
 
         legs = response_json['routes'][0]['legs']
         all_time = 0
@@ -676,7 +951,7 @@ class GoogleMapAPI(object):
         return all_time
 
     def get_place_photo(self, photo_reference, max_width=400, max_height=400):
-        base_url = self.base_urls['place_photos']
+        endpoint = 'place_photos'
 
         params = {
             'maxwidth': max_width,  # ranging in 1-1600.
@@ -685,7 +960,7 @@ class GoogleMapAPI(object):
             'key': self.key,
         }
 
-        response = requests.get(base_url, params=params)
+        response = self.http_get(endpoint, params)
 
         if response.status_code == 200:
             image = Image.open(BytesIO(response.content))
@@ -702,7 +977,7 @@ class GoogleMapAPI(object):
         Returns:
 
         """
-        base_url = self.base_urls['place_details']
+        endpoint = 'place_details'
 
         params = {
             'place_id': place_id,
@@ -710,7 +985,7 @@ class GoogleMapAPI(object):
             'key': self.key,
         }
 
-        response_json = requests.get(base_url, params=params).json()
+        response_json = self.http_get(endpoint, params).json()
         photo_info_list = response_json['result']['photos']
         photo_refer_list = [x['photo_reference'] for x in photo_info_list]
 
@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from virl.utils.sqlite_utils import ThreadLocalSQLite
+
+
+# query params that do not change the response and must not be part of the cache key
+IGNORED_PARAMS = ('key',)
+# json status returned by google map apis that should not be replayed
+TRANSIENT_STATUS = ('INVALID_REQUEST', 'OVER_QUERY_LIMIT', 'REQUEST_DENIED', 'UNKNOWN_ERROR')
+
+
+class CacheMissError(Exception):
+    pass
+
+
+class CachedResponse(object):
+    """A minimal stand-in for requests.Response, shared by cache hits and misses"""
+    def __init__(self, status_code, content, content_type='', from_cache=False):
+        self.status_code = status_code
+        self.content = content
+        self.content_type = content_type
+        self.from_cache = from_cache
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class HTTPCache(object):
+    """
+    Persistent, content-addressed HTTP response cache backed by sqlite.
+
+    Keys are the sha256 of the canonicalised (endpoint, params without api key).
+    The database runs in WAL mode with one connection per thread, so several threads
+    and processes (e.g. parallel collectors) can share one cache directory.
+
+    Modes:
+        read_write: serve hits, fetch and store misses
+        offline: replay only, raise CacheMissError on a miss (expired entries are still served)
+    """
+    def __init__(self, cache_dir, mode='read_write', ttls=None, default_ttl=-1):
+        """
+        Args:
+            cache_dir (str): directory of the sqlite database
+            mode (str): read_write or offline
+            ttls (dict): {endpoint: ttl in seconds}, -1 means never expire
+            default_ttl (float): ttl for endpoints not in ttls
+        """
+        assert mode in ['read_write', 'offline'], f'Unknown http cache mode: {mode}'
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, 'http_cache.sqlite')
+        self.mode = mode
+        self.ttls = dict(ttls) if ttls is not None else {}
+        self.default_ttl = default_ttl
+
+        self.db = ThreadLocalSQLite(self.db_path)
+        self.lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+
+        with self.db.connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, endpoint TEXT, params TEXT, status_code INTEGER, '
+                'content_type TEXT, content BLOB, created_at REAL)'
+            )
+
+    @staticmethod
+    def canonicalize(endpoint, params):
+        items = sorted((str(k), str(v)) for k, v in params.items() if k not in IGNORED_PARAMS)
+        return json.dumps([endpoint, items], separators=(',', ':'), ensure_ascii=False)
+
+    @staticmethod
+    def make_key(endpoint, params):
+        return hashlib.sha256(HTTPCache.canonicalize(endpoint, params).encode('utf-8')).hexdigest()
+
+    def _count(self, counter, endpoint):
+        with self.lock:
+            counter[endpoint] = counter.get(endpoint, 0) + 1
+
+    def lookup(self, endpoint, params):
+        """
+        Returns:
+            CachedResponse or None if missing or expired
+        """
+        key = self.make_key(endpoint, params)
+        row = self.db.connect().execute(
+            'SELECT status_code, content_type, content, created_at FROM responses WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        status_code, content_type, content, created_at = row
+        ttl = self.ttls.get(endpoint, self.default_ttl)
+        if self.mode != 'offline' and ttl is not None and ttl >= 0 and time.time() - created_at > ttl:
+            return None
+
+        return CachedResponse(status_code, bytes(content), content_type, from_cache=True)
+
+    def store(self, endpoint, params, response):
+        key = self.make_key(endpoint, params)
+        with self.db.connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, endpoint, self.canonicalize(endpoint, params), response.status_code,
+                 response.content_type, sqlite3.Binary(response.content), time.time())
+            )
+
+    @staticmethod
+    def is_cacheable(response):
+        if response.status_code != 200:
+            return False
+        if 'json' in response.content_type:
+            try:
+                status = response.json().get('status', None)
+            except (ValueError, AttributeError):
+                return False
+            return status not in TRANSIENT_STATUS
+        return True
+
+    def get(self, endpoint, params, fetch_fn):
+        """
+        Args:
+            endpoint (str): endpoint name, e.g., nearby_search
+            params (dict): query params
+            fetch_fn (callable): called on a miss, returns a requests.Response
+
+        Returns:
+            CachedResponse
+        """
+        cached = self.lookup(endpoint, params)
+        if cached is not None:
+            self._count(self.hits, endpoint)
+            return cached
+
+        self._count(self.misses, endpoint)
+        if self.mode == 'offline':
+            raise CacheMissError(f'HTTP cache miss in offline mode: {self.canonicalize(endpoint, params)}')
+
+        raw_response = fetch_fn()
+        response = CachedResponse(
+            raw_response.status_code, raw_response.content, raw_response.headers.get('Content-Type', '')
+        )
+        if self.is_cacheable(response):
+            self.store(endpoint, params, response)
+
+        return response
+
+    def stats(self):
+        with self.lock:
+            endpoints = set(self.hits) | set(self.misses)
+            return {
+                endpoint: {'hits': self.hits.get(endpoint, 0), 'misses': self.misses.get(endpoint, 0)}
+                for endpoint in sorted(endpoints)
+            }
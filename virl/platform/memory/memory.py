@@ -1,8 +1,8 @@
 import os
-import shutil
 import pickle
 
-from virl.utils import geocode_utils, common_utils, vis_utils
+from virl.platform.memory.memory_store import MemoryStore
+from virl.utils.spatial_index import GeocodeSpatialHash
 
 
 class Memory(object):
@@ -21,50 +21,98 @@ class Memory(object):
         self.memory_cfg = memory_cfg
         self.memory = {}
         self.idx = 0
+        # category -> spatial hash of (obj_id, view_idx), maintained in add
+        self.index = {}
+        self.index_cell_m = memory_cfg.get('INDEX_CELL_M', 10)
+        # obj_id -> number of views saved on disk, including the ones not kept in memory
+        self.n_saved_views = {}
         self.root_dir = output_dir / memory_cfg.PATH
         os.makedirs(self.root_dir, exist_ok=True)
-        
+
+        # views are appended to a record log and their images written in the background
+        self.store = MemoryStore(
+            self.root_dir, image_format=memory_cfg.get('IMAGE_FORMAT', 'jpg'),
+            image_quality=memory_cfg.get('IMAGE_QUALITY', 90), async_write=memory_cfg.get('ASYNC_WRITE', True)
+        )
+        # checkpoint of the versions that pickled the whole memory
         self.memory_ckpt_path = self.root_dir / 'memory.pkl'
-        if os.path.exists(self.memory_ckpt_path):
+        if os.path.exists(self.store.log_path) or os.path.exists(self.memory_ckpt_path):
             self.resume_memory()
 
     def add(self, view, cur_results):
         self.memory[self.idx] = [view]
         view.set_obj_id(self.idx)
+        self.index_view(view, self.idx, 0)
         self.idx += 1
 
         # to save it on disk
-        os.makedirs(os.path.join(self.root_dir, str(self.idx - 1)), exist_ok=True)
         self.save_view_to_file(view, self.idx - 1, cur_results)
 
     def remove(self):
         raise NotImplementedError
 
+    def index_view(self, view, obj_id, view_idx):
+        if view.category not in self.index:
+            self.index[view.category] = GeocodeSpatialHash(self.index_cell_m, metric='vincenty')
+        self.index[view.category].add(view.geocode, (obj_id, view_idx))
+
+    def build_index(self):
+        self.index = {}
+        for obj_id, view_list in self.memory.items():
+            for view_idx, view in enumerate(view_list):
+                self.index_view(view, obj_id, view_idx)
+
     def retrieve_by_geocode(self, refer_view, radius=5):
-        # TODO: optimize this to make it run faster.
-        refer_geocode = refer_view.geocode
-        refer_category = refer_view.category
+        """
+        Returns:
+            list: the first view within radius of each object of the same category, in the order of the objects
+        """
+        index = self.index.get(refer_view.category, None)
+        if index is None:
+            return []
+
+        matches = sorted(item for item, distance in index.query_radius(refer_view.geocode, radius) if distance < radius)
         candidate_objects = []
-        for obj_id, view_list in self.memory.items():
-            for candidate in view_list:
-                obj_geocode = candidate.geocode
-                distance = geocode_utils.calculate_distance_from_geocode(
-                    refer_geocode, obj_geocode
-                )
-                if distance < radius and candidate.category == refer_category:
-                    candidate_objects.append(candidate)
-                    break
+        matched_obj_ids = set()
+        for obj_id, view_idx in matches:
+            if obj_id not in matched_obj_ids:
+                matched_obj_ids.add(obj_id)
+                candidate_objects.append(self.memory[obj_id][view_idx])
 
         return candidate_objects
 
+    def retrieve_knn_by_geocode(self, refer_view, k=1, max_radius=None):
+        """
+        Returns:
+            list: [(view, distance)] the views of the k nearest objects of the same category, nearest first
+        """
+        index = self.index.get(refer_view.category, None)
+        if index is None:
+            return []
+
+        n_views = k
+        while True:
+            results = []
+            matched_obj_ids = set()
+            neighbours = index.query_knn(refer_view.geocode, n_views, max_radius=max_radius)
+            for (obj_id, view_idx), distance in neighbours:
+                if obj_id not in matched_obj_ids:
+                    matched_obj_ids.add(obj_id)
+                    results.append((self.memory[obj_id][view_idx], distance))
+            # objects with several views may hide farther objects
+            if len(results) >= k or len(neighbours) < n_views:
+                return results[:k]
+            n_views *= 2
+
     def add_new_view_to_exist_memory(self, view, obj_id, cur_results):
         # self.memory[obj_id].append(view)
         self.save_view_to_file(view, obj_id, cur_results)
 
     def save_view_to_file(self, view, obj_id, cur_results):
         view.set_obj_id(obj_id)
-        result_image = vis_utils.draw_with_results(view.image, cur_results)
-        result_image.save(f'{self.root_dir}/{obj_id}/{view.geocode[0]}_{view.geocode[1]}_{view.heading}_{view.fov}.png')
+        view_idx = self.n_saved_views.get(obj_id, 0)
+        self.n_saved_views[obj_id] = view_idx + 1
+        self.store.append(view, obj_id, view_idx, cur_results)
 
     def count_category(self):
         count_result = {}
@@ -96,17 +144,38 @@ class Memory(object):
         return geocode_by_cate
 
     def save_memory(self):
-        result_dict = {
-            'memory': self.memory,
-            'idx': self.idx
-        }
-
-        with open(self.memory_ckpt_path, 'wb') as f:
-            pickle.dump(result_dict, f)
+        """
+        The views are already in the record log, only wait for the pending writes.
+        """
+        self.store.flush()
 
     def resume_memory(self):
+        self.memory = {}
+        self.n_saved_views = {}
+        records = self.store.replay()
+        if len(records) == 0 and os.path.exists(self.memory_ckpt_path):
+            self.migrate_pickle_checkpoint()
+            return
+
+        for obj_id, view_idx, view in records:
+            self.n_saved_views[obj_id] = max(self.n_saved_views.get(obj_id, 0), view_idx + 1)
+            # only the first view of an object is kept in memory, see add_new_view_to_exist_memory
+            if view_idx == 0:
+                self.memory[obj_id] = [view]
+                self.index_view(view, obj_id, 0)
+        self.idx = max(self.n_saved_views.keys(), default=-1) + 1
+        print(f'>>> Resumed {len(self.memory)} objects ({len(records)} views) from {self.store.log_path}')
+
+    def migrate_pickle_checkpoint(self):
         with open(self.memory_ckpt_path, 'rb') as f:
             result_dict = pickle.load(f)
 
         self.memory = result_dict['memory']
         self.idx = result_dict['idx']
+        self.build_index()
+        # the visualizations are already on disk
+        for obj_id, view_list in self.memory.items():
+            for view_idx, view in enumerate(view_list):
+                self.store.append(view, obj_id, view_idx)
+            self.n_saved_views[obj_id] = len(view_list)
+        self.store.flush()
@@ -0,0 +1,226 @@
+import os
+import json
+import queue
+import threading
+
+import numpy as np
+import PIL.Image as Image
+
+from virl.platform.street_view import StreetViewImage
+from virl.utils import vis_utils
+
+
+class StoredStreetViewImage(StreetViewImage):
+    """
+    A view replayed from the memory store. The image is only read from disk on first access,
+    so resuming a long exploration does not decode every stored image.
+    """
+    def __init__(self, image_path, shape, heading, pitch, fov, geocode, i=None):
+        self.image_path = image_path
+        self._image = None
+        self.heading = heading
+        self.pitch = pitch
+        self.shape = shape
+        self.fov = fov
+        self.geocode = geocode
+        self.box = None
+        self.i = i
+
+        self.obj_id = None
+        self.category = None
+        self.box_score = None
+
+    @property
+    def image(self):
+        if self._image is None and self.image_path is not None:
+            with Image.open(self.image_path) as image:
+                self._image = image.convert('RGB')
+        return self._image
+
+    @image.setter
+    def image(self, image):
+        self._image = image
+
+
+class MemoryStore(object):
+    """
+    Append-only, incremental persistence of the visual memory.
+
+    Every stored view is one json line in memory_log.jsonl. The images are encoded and written
+    by a background thread, which appends the record of a view only after its image files are
+    completely on disk, so the log never references a missing or partial image. A crash loses at
+    most the views still in the queue, and a partially written last line is dropped on replay.
+    """
+    LOG_NAME = 'memory_log.jsonl'
+
+    def __init__(self, root_dir, image_format='jpg', image_quality=90, async_write=True):
+        """
+        Args:
+            root_dir (str or Path): directory of the memory
+            image_format (str): jpg, webp or png
+            image_quality (int): quality of the lossy formats
+            async_write (bool): write in a background thread, otherwise in the calling thread
+        """
+        self.root_dir = str(root_dir)
+        self.log_path = os.path.join(self.root_dir, self.LOG_NAME)
+        self.image_format = image_format.lower()
+        self.image_quality = image_quality
+        self.async_write = async_write
+
+        self.log_file = None
+        self.queue = queue.Queue()
+        self.error = None
+        self.n_bytes = 0
+        self.worker = None
+
+    @property
+    def extension(self):
+        return 'jpg' if self.image_format == 'jpeg' else self.image_format
+
+    def start(self):
+        os.makedirs(os.path.join(self.root_dir, 'images'), exist_ok=True)
+        self.log_file = open(self.log_path, 'a', encoding='utf-8')
+        if self.async_write and self.worker is None:
+            self.worker = threading.Thread(target=self._run, daemon=True)
+            self.worker.start()
+
+    def append(self, view, obj_id, view_idx, cur_results=None):
+        """
+        Queue one view of an object. The images are drawn and encoded later, so the view must not
+        be modified by the caller afterwards.
+
+        Args:
+            view (StreetViewImage): the view, with its detection results
+            obj_id (int):
+            view_idx (int): index of the view in the views of the object
+            cur_results (dict): detection results drawn on the saved visualization, None to skip it
+        """
+        self._raise_error()
+        if self.log_file is None:
+            self.start()
+
+        job = (view, obj_id, view_idx, cur_results)
+        if self.worker is not None:
+            self.queue.put(job)
+        else:
+            self._write(*job)
+
+    def flush(self):
+        """Block until all queued views are on disk"""
+        if self.worker is not None:
+            self.queue.join()
+        if self.log_file is not None:
+            self.log_file.flush()
+            os.fsync(self.log_file.fileno())
+        self._raise_error()
+
+    def close(self):
+        self.flush()
+        if self.worker is not None:
+            self.queue.put(None)
+            self.worker.join()
+            self.worker = None
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError(f'Failed to write the visual memory to {self.root_dir}') from error
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    return
+                self._write(*job)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def _save_image(self, image, path):
+        # write to a temporary file first, a crash leaves no partial image at the final path
+        tmp_path = f'{path}.tmp'
+        if self.extension == 'png':
+            image.save(tmp_path, format='PNG')
+        else:
+            image.convert('RGB').save(tmp_path, format='JPEG' if self.extension == 'jpg' else 'WEBP',
+                                      quality=self.image_quality)
+        os.replace(tmp_path, path)
+        self.n_bytes += os.path.getsize(path)
+
+    def _write(self, view, obj_id, view_idx, cur_results):
+        image_path = None
+        if view.image is not None:
+            image_path = os.path.join('images', f'{obj_id}_{view_idx}.{self.extension}')
+            self._save_image(view.image, os.path.join(self.root_dir, image_path))
+        if cur_results is not None:
+            result_image = vis_utils.draw_with_results(view.image, cur_results)
+            os.makedirs(os.path.join(self.root_dir, str(obj_id)), exist_ok=True)
+            self._save_image(result_image, os.path.join(
+                self.root_dir, str(obj_id),
+                f'{view.geocode[0]}_{view.geocode[1]}_{view.heading}_{view.fov}.{self.extension}'
+            ))
+
+        record = {
+            'obj_id': obj_id, 'view_idx': view_idx, 'geocode': list(view.geocode), 'heading': view.heading,
+            'pitch': view.pitch, 'fov': view.fov, 'shape': list(view.shape), 'i': view.i,
+            'category': view.category, 'box': view.box, 'box_score': view.box_score, 'image': image_path
+        }
+        line = json.dumps(record, default=_to_json) + '\n'
+        self.log_file.write(line)
+        self.log_file.flush()
+        self.n_bytes += len(line.encode('utf-8'))
+
+    def replay(self):
+        """
+        Returns:
+            records (list): the views in the log, in the order they were written, as
+                (obj_id, view_idx, StoredStreetViewImage)
+        """
+        if not os.path.exists(self.log_path):
+            return []
+
+        records = []
+        valid_bytes = 0
+        with open(self.log_path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b'\n'):
+                    break
+                valid_bytes += len(line)
+                records.append((record['obj_id'], record['view_idx'], self._record_to_view(record)))
+
+        if valid_bytes < os.path.getsize(self.log_path):
+            print(f'>>> Dropped a partially written record at the end of {self.log_path}')
+            with open(self.log_path, 'r+b') as f:
+                f.truncate(valid_bytes)
+
+        return records
+
+    def _record_to_view(self, record):
+        image_path = None if record['image'] is None else os.path.join(self.root_dir, record['image'])
+        view = StoredStreetViewImage(
+            image_path, tuple(record['shape']), record['heading'], record['pitch'], record['fov'],
+            tuple(record['geocode']), i=record['i']
+        )
+        view.set_detect_result({
+            'boxes': None if record['box'] is None else np.array(record['box']),
+            'labels': record['category'],
+            'scores': record['box_score']
+        })
+        view.set_obj_id(record['obj_id'])
+        return view
+
+
+def _to_json(obj):
+    # numpy arrays and scalars, torch tensors
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
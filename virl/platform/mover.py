@@ -2,7 +2,7 @@ import time
 import os
 import numpy as np
 
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from selenium import webdriver
 from selenium.webdriver.common.action_chains import ActionChains
@@ -12,7 +12,9 @@ from selenium.common.exceptions import StaleElementReferenceException
 from webdriver_manager.chrome import ChromeDriverManager
 
 from virl.platform.file_template import get_file_template_by_name
-from virl.utils import geocode_utils
+from virl.platform.pano_graph import PanoGraph
+from virl.platform.relocation_cache import quantize_geocode
+from virl.utils import geocode_utils, geodesy
 
 
 class StreetViewMover(object):
@@ -250,23 +252,89 @@ class StreetViewMover(object):
 
     def query_nearby_area(self, geocode, max_radius=10, delta_radius=2, delta_heading=30,
                           heading_range=10, existing_heading=()):
+        """
+        Probe a polar grid (heading x radius) around the geocode for nearby walkable positions.
+
+        The candidates are computed in one vectorized geodesic pass and probed in the sequential
+        order. Candidates falling in the same RADIUS_QUERY.CELL_SIZE cell share one relocation, so
+        the query never makes more backend calls than the sequential probing.
+        With RADIUS_QUERY.SPECULATE, a missing relocation is resolved concurrently with the remaining
+        radii of the same heading ray, which the sequential probing needs unless the ray reaches a
+        walkable position towards its heading. This lowers the latency but can spend extra calls.
+        Statistics of the query are kept in self.last_query_stats, with the calls saved against
+        the sequential probing (negative only when speculation spent more).
+        """
+        start_time = time.time()
         possible_geocode_results = {}
         current_geocode, _ = self.platform.relocate_geocode_by_source(geocode, source='outdoor')
         existing_heading = [heading % 360 for heading in existing_heading]
 
         possible_radius = np.arange(delta_radius, max_radius, delta_radius)
         possible_headings = np.arange(0, 360, delta_heading)
-        for heading in possible_headings:
-            for radius in possible_radius:
-                heading_to, distance_to, query_geocode = self.query_nearby_walkable_position_single(
-                    current_geocode, heading, radius, existing_heading, possible_geocode_results, heading_range
+        candidate_lat, candidate_lng = geodesy.destination(
+            current_geocode[0], current_geocode[1], possible_headings[:, None], possible_radius[None, :]
+        )
+        candidates = [[(float(lat), float(lng)) for lat, lng in zip(row_lat, row_lng)]
+                      for row_lat, row_lng in zip(candidate_lat, candidate_lng)]
+
+        radius_cfg = self.cfg.get('RADIUS_QUERY', {})
+        relocator = _NearbyRelocator(self.platform, cell_size=radius_cfg.get('CELL_SIZE', 1.0))
+        speculate = radius_cfg.get('SPECULATE', False)
+        max_workers = radius_cfg.get('MAX_WORKERS', 8) if speculate else 1
+        cells = [(i, j) for i in range(len(possible_headings)) for j in range(len(possible_radius))]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for cursor, (i, j) in enumerate(cells):
+                if not self.check_valid_of_heading(possible_headings[i], existing_heading, heading_range=heading_range):
+                    continue
+                if speculate and not relocator.is_resolved(candidates[i][j]):
+                    # resolve this candidate together with the next ones the sequential probing is likely to need
+                    relocator.prefetch(self._speculate_nearby_candidates(
+                        cells[cursor:], candidates, possible_headings, current_geocode, relocator,
+                        existing_heading, possible_geocode_results, heading_range, max_workers
+                    ), executor)
+                relocated_geocode, _ = relocator.relocate(candidates[i][j])
+                heading_to, distance_to = self._check_nearby_position(
+                    current_geocode, relocated_geocode, existing_heading, possible_geocode_results, heading_range
                 )
                 if heading_to is not None:
-                    possible_geocode_results[query_geocode] = (heading_to, distance_to)
+                    possible_geocode_results[relocated_geocode] = (heading_to, distance_to)
                     existing_heading.append(heading_to)
 
+        n_candidates = len(possible_headings) * len(possible_radius)
+        self.last_query_stats = {
+            'candidates': n_candidates,
+            # relocations of the sequential probing, one per candidate it reaches
+            'sequential_calls': relocator.n_requests,
+            'backend_calls': relocator.n_backend_calls,
+            'round_trips': relocator.n_round_trips,
+            'saved_calls': relocator.n_requests - relocator.n_backend_calls,
+            'time': time.time() - start_time
+        }
+
         return possible_geocode_results
 
+    def _speculate_nearby_candidates(self, cells, candidates, possible_headings, current_geocode, relocator,
+                                     existing_heading, possible_geocode_results, heading_range, max_workers):
+        """
+        Returns:
+            list: up to max_workers unresolved candidates of the heading ray of cells[0], in probing order,
+                starting with cells[0]
+        """
+        selected = []
+        ray = cells[0][0]
+        for i, j in cells:
+            if i != ray or len(selected) >= max_workers:
+                break
+            if relocator.is_resolved(candidates[i][j]):
+                relocated_geocode, _ = relocator.peek(candidates[i][j])
+                if relocated_geocode is not None and relocated_geocode != current_geocode and \
+                        relocated_geocode not in possible_geocode_results:
+                    # the ray may stop at this walkable position
+                    break
+                continue
+            selected.append(candidates[i][j])
+        return selected
+
     def query_nearby_walkable_position_single(self, current_geocode, heading, radius, existing_heading,
                                               possible_geocode_results, heading_range):
         if not self.check_valid_of_heading(heading, existing_heading, heading_range=heading_range):
@@ -274,6 +342,15 @@ class StreetViewMover(object):
         possible_geocode = geocode_utils.get_geocode_by_heading_and_distance(current_geocode, heading, radius)
 
         relocated_geocode, _ = self.platform.relocate_geocode_by_source(possible_geocode, source='outdoor')
+        heading_to_B, distance_to_B = self._check_nearby_position(
+            current_geocode, relocated_geocode, existing_heading, possible_geocode_results, heading_range
+        )
+        if heading_to_B is None:
+            return None, None, None
+        return heading_to_B, distance_to_B, relocated_geocode
+
+    def _check_nearby_position(self, current_geocode, relocated_geocode, existing_heading,
+                               possible_geocode_results, heading_range):
         if relocated_geocode is not None and relocated_geocode != current_geocode and \
                 relocated_geocode not in possible_geocode_results:
             heading_to_B = geocode_utils.calculate_heading_between_geocodes(current_geocode, relocated_geocode)
@@ -281,11 +358,8 @@ class StreetViewMover(object):
 
             # for each heading, only consider its nearest walkable geocode
             if self.check_valid_of_heading(heading_to_B, existing_heading, heading_range=heading_range):
-                return heading_to_B, distance_to_B, relocated_geocode
-            else:
-                return None, None, None
-        else:
-            return None, None, None
+                return heading_to_B, distance_to_B
+        return None, None
 
     @staticmethod
     def check_valid_of_heading(heading, existing_heading, heading_range=10):
@@ -293,3 +367,129 @@ class StreetViewMover(object):
             if (abs(heading - heading_to_B) % 360) < heading_range:
                 return False
         return True
+
+
+class _NearbyRelocator(object):
+    """
+    Memoized outdoor relocation of the radius query candidates. Candidates are de-duplicated by
+    the cell_size x cell_size meters grid cell they fall in, snapped like the relocation cache.
+    """
+    def __init__(self, platform, cell_size=1.0):
+        self.platform = platform
+        self.cell_size = cell_size
+        self.results = {}
+        self.n_requests = 0
+        self.n_backend_calls = 0
+        self.n_round_trips = 0
+
+    def make_key(self, geocode):
+        return quantize_geocode(geocode, self.cell_size)
+
+    def _relocate(self, geocode):
+        return self.platform.relocate_geocode_by_source(geocode, source='outdoor')
+
+    def is_resolved(self, geocode):
+        return self.make_key(geocode) in self.results
+
+    def peek(self, geocode):
+        return self.results[self.make_key(geocode)]
+
+    def prefetch(self, geocodes, executor):
+        pending = {}
+        for geocode in geocodes:
+            key = self.make_key(geocode)
+            if key not in self.results:
+                pending.setdefault(key, geocode)
+        self.n_backend_calls += len(pending)
+        self.n_round_trips += 1 if pending else 0
+        if len(pending) == 1:
+            results = [self._relocate(geocode) for geocode in pending.values()]
+        else:
+            results = executor.map(self._relocate, pending.values())
+        for key, result in zip(pending.keys(), results):
+            self.results[key] = result
+
+    def relocate(self, geocode):
+        self.n_requests += 1
+        key = self.make_key(geocode)
+        if key not in self.results:
+            self.n_backend_calls += 1
+            self.n_round_trips += 1
+            self.results[key] = self._relocate(geocode)
+        return self.results[key]
+
+
+class OfflineStreetViewMover(StreetViewMover):
+    """
+    Drop-in replacement of StreetViewMover without a browser. Links, moves, heading changes and
+    the current geocode are answered from a precomputed pano graph (see pano_graph.build_pano_graph).
+    The radius query of StreetViewMover is inherited and works on the platform relocation.
+    """
+    def __init__(self, key, cfg, initial_geocode, platform, output_dir):
+        self.cfg = cfg
+        self.street_view_query = cfg.get('STREET_VIEW_QUERY', True)
+        self.radius_query = cfg.get('RADIUS_QUERY', False) and cfg.RADIUS_QUERY.ENABLED
+        self.platform = platform
+
+        # list of (neighbour pano id, heading) of the current pano
+        self.current_path_elements = []
+        # tuple: (geocode, heading, distance)
+        self.current_possible_geocodes = []
+
+        self.graph = PanoGraph.load(cfg.PANO_GRAPH_PATH)
+        print(f'Offline mover is enabled with {len(self.graph)} panos from {cfg.PANO_GRAPH_PATH}')
+        self.current_pano_id = self._locate(initial_geocode)
+        self.current_heading = 0.0
+        self.current_pitch = 0.0
+
+    def _locate(self, geocode):
+        _, pano_id = self.platform.relocate_geocode_by_source(geocode)
+        if pano_id in self.graph.nodes:
+            return pano_id
+        return self.graph.nearest(geocode)
+
+    def _get_all_possible_paths(self):
+        self.current_path_elements = list(self.graph.neighbours(self.current_pano_id))
+
+    def move(self, idx, max_waited_time=5):
+        self._move(idx)
+        current_geocode = self.get_current_geocode()
+        self.current_path_elements = []
+        self.current_possible_geocodes = []
+        return current_geocode
+
+    def move_by_elements(self, idx):
+        self.current_pano_id = self.current_path_elements[idx][0]
+
+    def _move_by_geocode(self, geocode):
+        self.current_pano_id = self._locate(geocode)
+
+    def adjust_heading_web(self, heading):
+        self.current_heading = float(heading) % 360
+
+    def close(self):
+        pass
+
+    def get_current_geocode(self):
+        return self.graph.geocode(self.current_pano_id)
+
+    def get_current_heading_and_pitch(self):
+        return self.current_heading, self.current_pitch
+
+    def get_suitable_heading_to_path(self, idx):
+        """
+
+        Args:
+            idx: the index of the path element
+
+        Returns:
+            heading: the heading that is suitable to the specific path
+        """
+        self._get_all_possible_paths()
+        return self.current_path_elements[idx][1]
+
+
+MOVERS = {
+    'StreetViewMover': StreetViewMover,
+    'OfflineStreetViewMover': OfflineStreetViewMover,
+}
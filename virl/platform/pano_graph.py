@@ -0,0 +1,153 @@
+import os
+import json
+
+from virl.utils import geocode_utils
+from virl.utils.spatial_index import GeocodeGridIndex
+
+
+class PanoGraph(object):
+    """
+    Street view adjacency graph: pano id -> geocode and pano id -> [(neighbour pano id, heading)].
+    Headings are compass headings from the pano to the neighbour, like the links of the
+    Google Maps street view.
+    """
+    def __init__(self, nodes=None, edges=None):
+        """
+        Args:
+            nodes (dict): {pano_id: (lat, lng)}
+            edges (dict): {pano_id: [(neighbour_pano_id, heading), ...]}
+        """
+        self.nodes = {pano_id: tuple(geocode) for pano_id, geocode in (nodes or {}).items()}
+        self.edges = {pano_id: [(nbr, float(heading)) for nbr, heading in links]
+                      for pano_id, links in (edges or {}).items()}
+        self._index = None
+        self._index_ids = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def neighbours(self, pano_id):
+        return self.edges.get(pano_id, [])
+
+    def geocode(self, pano_id):
+        return self.nodes[pano_id]
+
+    def add_edge(self, pano_id, neighbour, heading=None):
+        if pano_id == neighbour:
+            return
+        if heading is None:
+            heading = geocode_utils.calculate_heading_between_geocodes(self.nodes[pano_id], self.nodes[neighbour])
+        links = self.edges.setdefault(pano_id, [])
+        if all(nbr != neighbour for nbr, _ in links):
+            links.append((neighbour, float(heading) % 360))
+
+    def nearest(self, geocode):
+        """
+        Returns:
+            pano_id (str): the pano nearest to the geocode, None for an empty graph
+        """
+        if self._index is None:
+            self._index_ids = list(self.nodes.keys())
+            self._index = GeocodeGridIndex([self.nodes[pano_id] for pano_id in self._index_ids])
+        idx, _ = self._index.query_nearest(geocode)
+        return None if idx is None else self._index_ids[self._index.input_idx[idx]]
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'nodes': {pano_id: list(geocode) for pano_id, geocode in self.nodes.items()},
+                'edges': {pano_id: [[nbr, heading] for nbr, heading in links] for pano_id, links in self.edges.items()}
+            }, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls(data['nodes'], data['edges'])
+
+
+def _parse_metadata_links(metadata):
+    """
+    Read the links of a panorama metadata file. Supported link formats are pano id strings
+    or dicts with one of pano / panoid / pano_id / id and an optional heading / yaw.
+
+    Returns:
+        list: [(pano_id, heading or None)]
+    """
+    links = []
+    for link in metadata.get('links', []) or []:
+        if isinstance(link, str):
+            links.append((link, None))
+            continue
+        pano_id = next((link[key] for key in ('pano', 'panoid', 'pano_id', 'id') if key in link), None)
+        if isinstance(pano_id, dict):
+            pano_id = pano_id.get('id', None)
+        heading = link.get('heading', link.get('yaw', None))
+        if pano_id is not None:
+            links.append((str(pano_id), heading))
+    return links
+
+
+def build_pano_graph(gps_to_pano_mapping, panorama_dir=None, max_link_distance=25, k=6, heading_range=30):
+    """
+    Build the pano graph of an offline dataset.
+
+    Edges come from the `links` of the panorama metadata ({pano_id}.metadata.json in panorama_dir)
+    when they are available. Panoramas without metadata links are connected to their nearest
+    panoramas within max_link_distance, keeping at most one neighbour per heading_range sector
+    (the nearest one), which approximates the street view arrows. All edges are made symmetric.
+
+    Args:
+        gps_to_pano_mapping (dict): {(lat, lng): pano_id}
+        panorama_dir (str): directory of the panorama metadata, None to only use the geometry
+        max_link_distance (float): maximum length in meters of a geometric edge
+        k (int): number of nearest panoramas considered for geometric edges
+        heading_range (float): minimum heading difference between two geometric edges of a pano
+
+    Returns:
+        PanoGraph
+    """
+    nodes = {}
+    for geocode, pano_id in gps_to_pano_mapping.items():
+        # keep the first geocode if a pano appears several times
+        nodes.setdefault(str(pano_id), tuple(geocode))
+    graph = PanoGraph(nodes)
+
+    pano_ids = list(nodes.keys())
+    index = GeocodeGridIndex([nodes[pano_id] for pano_id in pano_ids])
+    n_metadata_links = 0
+    for pano_id in pano_ids:
+        links = []
+        if panorama_dir is not None:
+            metadata_path = os.path.join(panorama_dir, f'{pano_id}.metadata.json')
+            if os.path.exists(metadata_path):
+                with open(metadata_path, 'r') as f:
+                    links = [(nbr, heading) for nbr, heading in _parse_metadata_links(json.load(f)) if nbr in nodes]
+
+        if links:
+            n_metadata_links += len(links)
+            for neighbour, heading in links:
+                graph.add_edge(pano_id, neighbour, heading)
+            continue
+
+        idx_list, distances = index.query_knn(nodes[pano_id], k + 1, max_radius=max_link_distance)
+        headings = []
+        for idx, distance in zip(idx_list, distances):
+            neighbour = pano_ids[index.input_idx[idx]]
+            if neighbour == pano_id or distance <= 0:
+                continue
+            heading = geocode_utils.calculate_heading_between_geocodes(nodes[pano_id], nodes[neighbour])
+            if all(min(abs(heading - h) % 360, 360 - abs(heading - h) % 360) >= heading_range for h in headings):
+                headings.append(heading)
+                graph.add_edge(pano_id, neighbour, heading)
+
+    # street view links are bidirectional
+    for pano_id in pano_ids:
+        for neighbour, _ in list(graph.neighbours(pano_id)):
+            graph.add_edge(neighbour, pano_id)
+
+    print(f'Built pano graph with {len(graph)} panos, {sum(len(v) for v in graph.edges.values())} edges '
+          f'({n_metadata_links} from metadata links)')
+    return graph
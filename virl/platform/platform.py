@@ -1,7 +1,10 @@
 import tqdm
+import warnings
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from .google_map_apis import GoogleMapAPI
-from .mover import StreetViewMover
+from .mover import MOVERS
 from virl.utils import geocode_utils
 
 
@@ -9,6 +12,9 @@ class Platform(GoogleMapAPI):
     def __init__(self, platform_cfg, output_dir, **kwargs):
         offline_cfg = platform_cfg.get('OFFLINE', None)
         kwargs['offline_cfg'] = offline_cfg
+        kwargs['http_cache_cfg'] = platform_cfg.get('HTTP_CACHE', None)
+        kwargs['relocation_cache_cfg'] = platform_cfg.get('RELOCATION_CACHE', None)
+        kwargs.setdefault('rate_limit', platform_cfg.get('RATE_LIMIT', 0))
         
         super().__init__(**kwargs)
         self.platform_cfg = platform_cfg
@@ -17,7 +23,8 @@ class Platform(GoogleMapAPI):
         self.street_view_cfg = platform_cfg.STREET_VIEW
 
     def initialize_mover(self, initial_geocode):
-        self.mover = StreetViewMover(
+        mover_cls = MOVERS[self.platform_cfg.MOVER.get('NAME', 'StreetViewMover')]
+        self.mover = mover_cls(
             self.key, self.platform_cfg.MOVER, initial_geocode, self,
             output_dir=self.output_dir
         )
@@ -44,7 +51,6 @@ class Platform(GoogleMapAPI):
         pitch = pitch if pitch is not None else self.street_view_cfg.get('PITCH', 0)
         fov = fov if fov is not None else self.street_view_cfg.get('FOV', 90)
         source = source if source is not None else self.street_view_cfg.get('SOURCE', 'outdoor')
-        images = []
 
         if heading_list is None and not all_around:
             heading_range = self.street_view_cfg.get('HEADING_RANGE', 360)
@@ -54,10 +60,11 @@ class Platform(GoogleMapAPI):
         elif heading_list is None and all_around:
             heading_list = range(0, 360, fov)
 
-        for i, heading in enumerate(heading_list):
-            images.append(self.get_streetview_from_geocode(
-                geocode, size, heading, pitch, fov, source=source, idx=i
-            ))
+        # offline: one panorama decode and one batched rendering; online: concurrent requests
+        images = self.get_streetviews_from_geocode(
+            geocode, size, heading_list, pitch, fov, source=source,
+            max_workers=self.street_view_cfg.get('FETCH_WORKERS', 8)
+        )
 
         return images
 
@@ -85,3 +92,52 @@ class Platform(GoogleMapAPI):
                 photos.append(photo)
 
         return photos
+
+    def relocate_geocodes(self, geocode_list, source='outdoor', polygon=None, max_workers=None, progress=True):
+        """Relocate a list of geocodes to street view panoramas concurrently.
+
+        The requests run on a bounded thread pool and share the rate limiter of the platform.
+        Geocodes snapping to the same panorama are merged, and the output follows the order of
+        the input list (not the completion order), so it is reproducible for the TSP step.
+
+        Args:
+            geocode_list (list): a list of geocodes, e.g., from geocode_utils.grid_sample_quadrangle
+            source (str): street view source, e.g., outdoor
+            polygon (list): keep only the panoramas inside this polygon (lat, lng), None to keep all
+            max_workers (int): number of concurrent relocations, default to PLATFORM.RELOCATION_WORKERS
+            progress (bool): show a progress bar
+
+        Returns:
+            list: geocodes of the unique panoramas
+            list: their pano ids
+        """
+        if max_workers is None:
+            max_workers = self.platform_cfg.get('RELOCATION_WORKERS', 8)
+
+        results = [None] * len(geocode_list)
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = {
+                executor.submit(self.relocate_geocode_by_source, geocode, source): idx
+                for idx, geocode in enumerate(geocode_list)
+            }
+            for future in tqdm.tqdm(as_completed(futures), total=len(futures), disable=not progress,
+                                    desc='Relocating'):
+                idx = futures[future]
+                try:
+                    results[idx] = future.result()
+                except Exception as e:
+                    warnings.warn(f'Failed to relocate {geocode_list[idx]}: {e}')
+
+        relocations = [result for result in results if result is not None and result[0] is not None]
+        if polygon is not None and len(relocations) > 0:
+            in_polygon = geocode_utils.points_in_polygon([position for position, _ in relocations], polygon)
+            relocations = [relocation for relocation, inside in zip(relocations, in_polygon) if inside]
+
+        unique_relocations = {}
+        for relocated_position, pano_id in relocations:
+            key = pano_id if pano_id is not None else relocated_position
+            if key not in unique_relocations:
+                unique_relocations[key] = (relocated_position, pano_id)
+
+        return [position for position, _ in unique_relocations.values()], \
+            [pano_id for _, pano_id in unique_relocations.values()]
@@ -0,0 +1,151 @@
+import os
+import time
+import threading
+
+import numpy as np
+
+from virl.utils.common_utils import LRUCache
+from virl.utils.sqlite_utils import ThreadLocalSQLite
+from virl.utils.spatial_index import METERS_PER_DEGREE
+
+
+class _Flight(object):
+    """A lookup in progress, waited on by concurrent identical lookups"""
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def quantize_geocode(geocode, grid_m):
+    """
+    Returns:
+        tuple: (row, col) of the grid_m x grid_m meters cell containing the geocode
+    """
+    cell_deg = grid_m / METERS_PER_DEGREE
+    row = int(np.floor(geocode[0] / cell_deg))
+    # longitude cells are widened by the latitude of the row, so cells stay about grid_m wide
+    lng_cell_deg = cell_deg / max(np.cos(np.radians((row + 0.5) * cell_deg)), 1e-6)
+    col = int(np.floor(geocode[1] / lng_cell_deg))
+    return row, col
+
+
+class RelocationCache(object):
+    """
+    Memoized results of relocate_geocode_by_source.
+
+    Geocodes are quantized to a grid of `grid_m` meters, so every query inside a cell
+    shares one result (pano id and snapped geocode). Results live in an in-memory LRU
+    in front of a sqlite store (WAL mode, shared across runs and processes), and
+    concurrent lookups of the same key wait for a single backend call.
+    """
+    def __init__(self, cache_dir=None, grid_m=0.5, max_entries=100000, namespace='online'):
+        """
+        Args:
+            cache_dir (str): directory of the sqlite store, None for the in-memory LRU only
+            grid_m (float): size of a quantization cell in meters
+            max_entries (int): capacity of the in-memory LRU
+            namespace (str): tag of the backend the results come from, e.g. online or an offline mapping
+        """
+        self.grid_m = grid_m
+        self.namespace = namespace
+        # every entry is counted as one "byte", so the LRU is bounded by the number of entries
+        self.memory = LRUCache(max_bytes=max_entries)
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.n_backend_calls = 0
+
+        self.db = None
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.db = ThreadLocalSQLite(os.path.join(cache_dir, 'relocation_cache.sqlite'))
+            with self.db.connect() as conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS relocations ('
+                    'key TEXT PRIMARY KEY, lat REAL, lng REAL, pano_id TEXT, created_at REAL)'
+                )
+
+    def make_key(self, geocode, source):
+        row, col = quantize_geocode(geocode, self.grid_m)
+        return f'{self.namespace}|{source}|{self.grid_m}|{row}|{col}'
+
+    def _load(self, key):
+        if self.db is None:
+            return None
+        row = self.db.connect().execute(
+            'SELECT lat, lng, pano_id FROM relocations WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        lat, lng, pano_id = row
+        # a stored NULL geocode is a cached "no panorama here"
+        return ((lat, lng) if lat is not None else None), pano_id
+
+    def _store(self, key, result):
+        if self.db is None:
+            return
+        new_geocode, pano_id = result
+        lat, lng = new_geocode if new_geocode is not None else (None, None)
+        with self.db.connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO relocations VALUES (?, ?, ?, ?, ?)',
+                (key, lat, lng, pano_id, time.time())
+            )
+
+    def get(self, geocode, source, compute_fn):
+        """
+        Args:
+            geocode (tuple): latitude and longitude
+            source (str): street view source, e.g., outdoor
+            compute_fn (callable): backend lookup, returns (new_geocode, pano_id)
+
+        Returns:
+            (new_geocode, pano_id)
+        """
+        key = self.make_key(geocode, source)
+        result = self.memory.get(key)
+        if result is not None:
+            return result
+
+        with self.lock:
+            flight = self.flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = _Flight()
+                self.flights[key] = flight
+
+        if not is_leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            result = self._load(key)
+            if result is None:
+                with self.lock:
+                    self.n_backend_calls += 1
+                result = compute_fn()
+                # api errors (e.g., UNKNOWN_ERROR) return None and are not cached, ZERO_RESULTS is cached
+                if result is not None:
+                    result = (tuple(result[0]) if result[0] is not None else None, result[1])
+                    self._store(key, result)
+            if result is not None:
+                self.memory.put(key, result, nbytes=1)
+            flight.result = result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.event.set()
+
+        return result
+
+    def stats(self):
+        return {
+            'memory_hits': self.memory.hits,
+            'memory_misses': self.memory.misses,
+            'backend_calls': self.n_backend_calls,
+        }
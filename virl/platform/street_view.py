@@ -1,8 +1,17 @@
+import os
 import cv2
 import PIL.Image as Image
 
 import numpy as np
 
+from concurrent.futures import ThreadPoolExecutor
+
+from virl.utils.common_utils import LRUCache
+
+
+# cache of the cv2.remap sampling grids, which only depend on the camera and the panorama shape
+REMAP_GRID_CACHE = LRUCache(max_bytes=256 * 1024 ** 2)
+
 
 class StreetViewImage(object):
     def __init__(self, image, heading, pitch, fov, geocode, i=None):
@@ -65,27 +74,13 @@ def lonlat2XY(lonlat, shape):
     return out
 
 
-def get_perspective_from_panorama(_img, FOV, heading, pitch, height, width, north_rotation):
-    """
-    Modified from https://github.com/fuenwang/Equirec2Perspec
-    heading is left/right angle, pitch is up/down angle, both in degree
-    Args:
-        _img:
-        FOV:
-        heading:
-        pitch:
-        height:
-        width:
-        north_rotation:
+def set_remap_grid_cache_size(max_bytes):
+    REMAP_GRID_CACHE.max_bytes = max_bytes
+    REMAP_GRID_CACHE.clear()
 
-    Returns:
-
-    """
-    # adjust heading to match the Google street view format
-    heading = ((heading - 180) % 360 + north_rotation) % 360
-    
-    [_height, _width, _] = _img.shape
 
+def _perspective_rays(FOV, height, width):
+    """Camera rays (before rotation) of every output pixel, with shape (height, width, 3)"""
     f = 0.5 * width * 1 / np.tan(0.5 * FOV / 180.0 * np.pi)
     cx = (width - 1) / 2.0
     cy = (height - 1) / 2.0
@@ -101,20 +96,134 @@ def get_perspective_from_panorama(_img, FOV, heading, pitch, height, width, nort
     x, y = np.meshgrid(x, y)
     z = np.ones_like(x)
     xyz = np.concatenate([x[..., None], y[..., None], z[..., None]], axis=-1)
-    xyz = xyz @ K_inv.T
+    return xyz @ K_inv.T
+
+
+def get_perspective_remap_grids(FOV, headings, pitches, height, width, pano_shape):
+    """
+    Build (or fetch from cache) the float32 map_x / map_y grids of several views at once.
+
+    The camera rotation is R2 @ R1 = R1 @ Rx(pitch), where R1 rotates around the vertical axis by
+    the heading. A rotation around the vertical axis only shifts the longitude, so the expensive
+    ray -> (lon, lat) pass runs once per distinct pitch, and every heading is a vectorized
+    longitude shift (wrapped to [-pi, pi) like the arctan2 of the rotated rays).
+
+    Args:
+        FOV: field of view in degree
+        headings: headings in the panorama frame, i.e. already adjusted by the north rotation
+        pitches: pitches in degree, one per heading
+        height: output height
+        width: output width
+        pano_shape: shape of the panorama image
 
-    y_axis = np.array([0.0, 1.0, 0.0], np.float32)
+    Returns:
+        list: (map_x, map_y) per view, each with shape (height, width)
+    """
+    keys = [(float(FOV), float(heading), float(pitch), int(height), int(width), tuple(pano_shape[:2]))
+            for heading, pitch in zip(headings, pitches)]
+    grids = [REMAP_GRID_CACHE.get(key) for key in keys]
+    missing = [i for i, grid in enumerate(grids) if grid is None]
+    if not missing:
+        return grids
+
+    rays = _perspective_rays(FOV, height, width)
     x_axis = np.array([1.0, 0.0, 0.0], np.float32)
-    R1, _ = cv2.Rodrigues(y_axis * np.radians(heading))
-    R2, _ = cv2.Rodrigues(np.dot(R1, x_axis) * np.radians(pitch))
-    R = R2 @ R1
-    xyz = xyz @ R.T
-    lonlat = xyz2lonlat(xyz)
-    XY = lonlat2XY(lonlat, shape=_img.shape).astype(np.float32)
-    persp = cv2.remap(_img, XY[..., 0], XY[..., 1], cv2.INTER_CUBIC, borderMode=cv2.BORDER_WRAP)
+    for pitch in sorted(set(float(pitches[i]) for i in missing)):
+        group = [i for i in missing if float(pitches[i]) == pitch]
+        R_pitch, _ = cv2.Rodrigues(x_axis * np.radians(pitch))
+        lonlat = xyz2lonlat(rays @ R_pitch.T)
+        Y = lonlat2XY(lonlat, shape=pano_shape)[..., 1].astype(np.float32)
+
+        # (n, 1, 1) + (h, w) -> (n, h, w)
+        shifts = np.radians(np.array([float(headings[i]) for i in group]))[:, None, None]
+        lon = np.mod(lonlat[None, ..., 0] + shifts + np.pi, 2 * np.pi) - np.pi
+        X = ((lon / (2 * np.pi) + 0.5) * (pano_shape[1] - 1)).astype(np.float32)
+        for j, i in enumerate(group):
+            grid = (np.ascontiguousarray(X[j]), Y)
+            REMAP_GRID_CACHE.put(keys[i], grid)
+            grids[i] = grid
+
+    return grids
+
+
+def get_perspective_remap_grid(FOV, heading, pitch, height, width, pano_shape):
+    """
+    Build (or fetch from cache) the float32 map_x / map_y grids for cv2.remap.
+
+    Args:
+        FOV: field of view in degree
+        heading: heading in the panorama frame, i.e. already adjusted by the north rotation
+        pitch: pitch in degree
+        height: output height
+        width: output width
+        pano_shape: shape of the panorama image
+
+    Returns:
+        map_x, map_y (numpy.array): the sampling grids with shape (height, width)
+    """
+    return get_perspective_remap_grids(FOV, [heading], [pitch], height, width, pano_shape)[0]
+
+
+def _remap_to_pil(_img, map_x, map_y):
+    persp = cv2.remap(_img, map_x, map_y, cv2.INTER_CUBIC, borderMode=cv2.BORDER_WRAP)
 
     # Convert the final obtained image to a PIL Image
     persp_rgb = cv2.cvtColor(persp, cv2.COLOR_BGR2RGB)  # Convert BGR to RGB
-    pil_image = Image.fromarray(persp_rgb)
+    return Image.fromarray(persp_rgb)
+
+
+def get_perspective_from_panorama(_img, FOV, heading, pitch, height, width, north_rotation):
+    """
+    Modified from https://github.com/fuenwang/Equirec2Perspec
+    heading is left/right angle, pitch is up/down angle, both in degree
+    Args:
+        _img:
+        FOV:
+        heading:
+        pitch:
+        height:
+        width:
+        north_rotation:
+
+    Returns:
+
+    """
+    # adjust heading to match the Google street view format
+    heading = ((heading - 180) % 360 + north_rotation) % 360
 
-    return pil_image
+    map_x, map_y = get_perspective_remap_grid(FOV, heading, pitch, height, width, _img.shape)
+    return _remap_to_pil(_img, map_x, map_y)
+
+
+def get_perspectives_from_panorama(_img, FOV, headings, pitches, height, width, north_rotation, max_workers=None):
+    """
+    Batched get_perspective_from_panorama: all views of one decoded panorama are rendered
+    in one call, with vectorized sampling grids and cv2.remap (which releases the GIL) on a thread pool.
+
+    Args:
+        _img: BGR panorama
+        FOV: field of view in degree
+        headings: list of headings in degree
+        pitches: list of pitches (one per heading) or a single pitch in degree
+        height: output height
+        width: output width
+        north_rotation: north rotation of the panorama
+        max_workers: number of remap threads (default: number of views, capped by the CPU count)
+
+    Returns:
+        list: PIL images, in the order of headings
+    """
+    if np.isscalar(pitches):
+        pitches = [pitches] * len(headings)
+    assert len(pitches) == len(headings)
+    if len(headings) == 0:
+        return []
+
+    pano_headings = [((heading - 180) % 360 + north_rotation) % 360 for heading in headings]
+    grids = get_perspective_remap_grids(FOV, pano_headings, pitches, height, width, _img.shape)
+    if len(grids) == 1:
+        return [_remap_to_pil(_img, *grids[0])]
+
+    max_workers = max_workers or min(len(grids), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda grid: _remap_to_pil(_img, *grid), grids))
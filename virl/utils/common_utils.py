@@ -6,9 +6,13 @@ import re
 import random
 import string
 import os
+import threading
+import time
 
 import numpy as np
 
+from collections import OrderedDict
+
 from termcolor import colored
 from PIL import Image
 
@@ -48,6 +52,89 @@ class AverageMeter(object):
         self.avg = self.sum / self.count
 
 
+class TokenBucket(object):
+    """A thread-safe token bucket rate limiter, shared by all threads making api requests"""
+    def __init__(self, rate, capacity=None):
+        """
+        Args:
+            rate (float): tokens (requests) added per second, <= 0 disables rate limiting
+            capacity (float): maximum burst size, default to rate
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.last_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1.0):
+        """Block until `tokens` tokens are available"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_time) * self.rate)
+                self.last_time = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait_time = (tokens - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+
+class LRUCache(object):
+    """A thread-safe LRU cache bounded by the total bytes of the stored values"""
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.data = OrderedDict()
+        self.cur_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_nbytes(value):
+        if isinstance(value, (tuple, list)):
+            return sum(LRUCache.get_nbytes(x) for x in value)
+        if hasattr(value, 'nbytes'):
+            return value.nbytes
+        return len(value) if isinstance(value, (bytes, str)) else 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.data:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.data.move_to_end(key)
+            return self.data[key][0]
+
+    def put(self, key, value, nbytes=None):
+        nbytes = self.get_nbytes(value) if nbytes is None else nbytes
+        if nbytes > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.data:
+                self.cur_bytes -= self.data.pop(key)[1]
+            self.data[key] = (value, nbytes)
+            self.cur_bytes += nbytes
+            while self.cur_bytes > self.max_bytes:
+                _, (_, evicted_nbytes) = self.data.popitem(last=False)
+                self.cur_bytes -= evicted_nbytes
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.cur_bytes = 0
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+
 class ComparableObj(object):
     def __init__(self, priority, data):
         self.data = data
@@ -2,14 +2,14 @@ import math
 import torch
 import polyline
 import folium
-import tqdm
 
 import numpy as np
 
 from folium.plugins import FastMarkerCluster
 from geopy.distance import geodesic
-from geopy.point import Point
-from shapely.geometry import Point, Polygon
+from shapely.geometry import Polygon
+
+from virl.utils import geodesy, tsp_utils
 
 
 DIRECTION_HEADING = [0, 45, 90, 135, 180, 225, 270, 315]
@@ -44,23 +44,7 @@ def calculate_heading_between_geocodes(point_a: tuple, point_b: tuple):
         point_a (tuple): _description_
         point_b (tuple): _description_
     """
-    lat1 = math.radians(point_a[0])
-    lat2 = math.radians(point_b[0])
-    
-    diff_long = math.radians(point_b[1] - point_a[1])
-    
-    x = math.sin(diff_long) * math.cos(lat2)
-    y = math.cos(lat1) * math.sin(lat2) - (math.sin(lat1) * math.cos(lat2) * math.cos(diff_long))
-    
-    initial_bearing = math.atan2(x, y)
-    
-    # Now we have the initial bearing but math.atan2() returns values from -π to + π 
-    # So we need to normalize the result by converting it to a compass bearing as measured in degrees, 
-    # i.e. the range 0° ... 360°
-    initial_bearing = math.degrees(initial_bearing)
-    compass_bearing = (initial_bearing + 360) % 360
-    
-    return compass_bearing
+    return float(geodesy.initial_bearing(point_a[0], point_a[1], point_b[0], point_b[1]))
 
 
 def calculate_headings_between_geocode_lists(points_a: list, points_b: list):
@@ -73,23 +57,9 @@ def calculate_headings_between_geocode_lists(points_a: list, points_b: list):
     """
     points_a, points_b = np.array(points_a), np.array(points_b)
 
-    lat1 = np.radians(points_a[:, 0])[:, np.newaxis]
-    lat2 = np.radians(points_b[:, 0])
-
-    diff_long = np.radians(points_b[:, 1] - points_a[:, 1][:, np.newaxis])
-
-    x = np.sin(diff_long) * np.cos(lat2)
-    y = np.cos(lat1) * np.sin(lat2) - (np.sin(lat1) * np.cos(lat2) * np.cos(diff_long))
-
-    initial_bearing = np.arctan2(x, y)
-
-    # Now we have the initial bearing but np.arctan2() returns values from -π to + π 
-    # So we need to normalize the result by converting it to a compass bearing as measured in degrees, 
-    # i.e. the range 0° ... 360°
-    initial_bearing = np.degrees(initial_bearing)
-    compass_bearing = (initial_bearing + 360) % 360
-
-    return compass_bearing
+    return geodesy.initial_bearing(
+        points_a[:, 0, np.newaxis], points_a[:, 1, np.newaxis], points_b[:, 0], points_b[:, 1]
+    )
 
 
 def get_heading_pitch_fov_to_box(bbox, image_shape, heading, pitch, fov=90,
@@ -250,42 +220,87 @@ def calculate_spatial_relationship_with_headings(agent_heading, heading_to):
     return spatial_relation
 
 
-def frange(start, stop, step):
-    i = start
-    while i < stop:
-        yield i
-        i += step
+def _ray_casting_contains(rings, xs, ys):
+    """Even-odd rule over all rings, so points inside holes are outside the polygon"""
+    inside = np.zeros(xs.shape, dtype=bool)
+    for ring in rings:
+        ring = np.asarray(ring, dtype=np.float64)
+        x1, y1 = ring[:, 0], ring[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+        for ex1, ey1, ex2, ey2 in zip(x1, y1, x2, y2):
+            if ey1 == ey2:
+                continue
+            crosses = (ey1 > ys) != (ey2 > ys)
+            x_intersect = ex1 + (ys - ey1) * (ex2 - ex1) / (ey2 - ey1)
+            inside ^= crosses & (xs < x_intersect)
+    return inside
 
 
-def grid_sample_quadrangle(quadrangle, spacing):
+def points_in_polygon(points, polygon, holes=None):
     """
-    Function to sample points inside a quadrangle
+    Vectorized point in polygon test.
+
     Args:
-    quadrangle (list): a list of four tuples representing the quadrangle (lat, lng)
-    spacing (float): the spacing between grid points
+        points (list or numpy.array): (N, 2) points (lat, lng)
+        polygon (list): a list of tuples representing the polygon (lat, lng)
+        holes (list): a list of polygons cut out of the polygon
 
     Returns:
-    list: a list of tuples representing the sampled points (lat, lng)
+        numpy.array: (N,) bool mask, True for the points strictly inside the polygon
     """
-    # Create a polygon object
-    polygon = Polygon(quadrangle)
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    try:
+        # shapely >= 2.0
+        from shapely import contains_xy
+        return contains_xy(Polygon(polygon, holes), points[:, 0], points[:, 1])
+    except ImportError:
+        return _ray_casting_contains([polygon] + list(holes or []), points[:, 0], points[:, 1])
+
 
-    # Get the bounding box of the polygon
-    minx, miny, maxx, maxy = polygon.bounds
+def grid_sample_quadrangle(quadrangle, spacing, holes=None, lattice='square', jitter=0.0, seed=0):
+    """
+    Function to sample points inside a polygon. The lattice is laid out in a local metric
+    projection of the polygon, so the spacing is in meters along both axes.
+    Args:
+    quadrangle (list): a list of tuples representing the polygon (lat, lng), any number of vertices
+    spacing (float): the spacing between grid points in meters
+    holes (list): a list of polygons cut out of the sampled area
+    lattice (str): square or hex (equilateral triangles, about 15% more points for the same spacing)
+    jitter (float): random offset of each point, as a fraction of the spacing
+    seed (int): random seed of the jitter
+
+    Returns:
+    list: a list of tuples representing the sampled points (lat, lng)
+    """
+    vertices = np.asarray(quadrangle, dtype=np.float64)
+    min_lat, min_lng = vertices.min(axis=0)
+    max_lat, max_lng = vertices.max(axis=0)
 
-    # Convert the spacing from meters to degrees
-    spacing_lat = spacing / 111000
-    spacing_lng = spacing / 111000
+    # Convert the spacing from meters to degrees around the center of the polygon
+    meters_per_degree = np.pi / 180 * geodesy.EARTH_RADIUS
+    spacing_lat = spacing / meters_per_degree
+    spacing_lng = spacing / (meters_per_degree * np.cos(np.radians((min_lat + max_lat) / 2)))
 
     # Create a grid of points inside the bounding box
-    points = []
-    for x in frange(minx, maxx, spacing_lat):
-        for y in frange(miny, maxy, spacing_lng):
-            point = Point(x, y)
-            if polygon.contains(point):
-                points.append((x, y))
+    if lattice == 'square':
+        lat, lng = np.meshgrid(np.arange(min_lat, max_lat, spacing_lat),
+                               np.arange(min_lng, max_lng, spacing_lng), indexing='ij')
+    elif lattice == 'hex':
+        row_spacing = spacing_lat * np.sqrt(3) / 2
+        lat, lng = np.meshgrid(np.arange(min_lat, max_lat, row_spacing),
+                               np.arange(min_lng - spacing_lng / 2, max_lng, spacing_lng), indexing='ij')
+        # shift every other row by half of the spacing
+        lng = lng + (np.arange(lat.shape[0]) % 2)[:, np.newaxis] * spacing_lng / 2
+    else:
+        raise ValueError(f'Unknown lattice: {lattice}')
+
+    points = np.stack([lat.ravel(), lng.ravel()], axis=1)
+    if jitter > 0:
+        rng = np.random.default_rng(seed)
+        points += rng.uniform(-jitter, jitter, points.shape) * np.array([spacing_lat, spacing_lng])
 
-    return points
+    points = points[points_in_polygon(points, quadrangle, holes)]
+    return [tuple(point) for point in points.tolist()]
 
 
 def is_point_in_quadrangle(point, quadrangle):
@@ -298,22 +313,18 @@ def is_point_in_quadrangle(point, quadrangle):
     Returns:
     bool: True if the point is in the quadrangle, False otherwise
     """
-    point = Point(point)
-    polygon = Polygon(quadrangle)
-    return polygon.contains(point)
+    return bool(points_in_polygon([point], quadrangle)[0])
 
 
 def relocate_point_list_in_polygon(platform, point_list, polygon):
-    relocated_points = {}
-    for point in tqdm.tqdm(point_list, total=len(point_list)):
-        relocated_position, pano_id = platform.relocate_geocode_by_source(point, source='outdoor')
-        if relocated_position is None or not is_point_in_quadrangle(relocated_position, polygon):
-            continue
-
-        if relocated_position not in relocated_points:
-            relocated_points[relocated_position] = pano_id
+    """
+    Relocate the points to street view panoramas inside the polygon, see Platform.relocate_geocodes
 
-    return list(relocated_points.keys()), list(relocated_points.values())
+    Returns:
+        list: geocodes of the unique panoramas, in the order of point_list
+        list: their pano ids
+    """
+    return platform.relocate_geocodes(point_list, source='outdoor', polygon=polygon)
 
 
 def euclidean_distance(coord1, coord2):
@@ -370,24 +381,26 @@ def two_opt_algorithm(distances):
     return tour
 
 
-def calculate_tsp_route_with_points(point_list, opt_algo='2opt'):
+def calculate_tsp_route_with_points(point_list, opt_algo='2opt', metric='euclidean', time_budget=None):
     """
     Calculate the tsp route with a list of points
     Args:
         point_list:
-        opt_algo
+        opt_algo (str): nn, 2opt or local_search (2-opt and Or-opt on nearest neighbour candidates,
+            scales to thousands of points)
+        metric (str): euclidean (on the coordinates) or haversine (meters)
+        time_budget (float): seconds spent on improving the route by local_search, None for no limit
 
     Returns:
 
     """
-    # calculate the distance
-    distances = np.zeros((len(point_list), len(point_list)))
+    print(f"Start to run {opt_algo} algorithm")
+    if opt_algo == 'local_search':
+        return tsp_utils.optimize_route(point_list, metric=metric, time_budget=time_budget)
 
-    for i, point1 in enumerate(point_list):
-        for j, point2 in enumerate(point_list):
-            distances[i, j] = euclidean_distance(point1, point2)
+    # calculate the distance
+    distances = tsp_utils.distance_matrix(point_list, metric=metric)
 
-    print(f"Start to run {opt_algo} algorithm")
     if opt_algo == 'nn':
         route = nearest_neighbor_algorithm(distances)
     elif opt_algo == '2opt':
@@ -399,14 +412,7 @@ def calculate_tsp_route_with_points(point_list, opt_algo='2opt'):
 
 
 def haversine_distance(lat1, lon1, lat2, lon2):
-    lon1, lat1, lon2, lat2 = map(np.radians, [lon1, lat1, lon2, lat2])
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = np.sin(dlat / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2.0) ** 2
-    c = 2 * np.arcsin(np.sqrt(a))
-    km = 6371.0 * c
-    m = km * 1000
-    return m
+    return geodesy.haversine(lat1, lon1, lat2, lon2)
 
 
 def cal_distance_between_two_position_list(position_list_a, position_list_b):
@@ -421,14 +427,7 @@ def cal_distance_between_two_position_list(position_list_a, position_list_b):
     Returns:
         dist_matrix (numpy.array): _description_
     """
-    positions_a = np.array(position_list_a)
-    positions_b = np.array(position_list_b)
-
-    dist_matrix = haversine_distance(
-        positions_a[:, 0, np.newaxis], positions_a[:, 1, np.newaxis], positions_b[:, 0], positions_b[:, 1]
-    )
-
-    return dist_matrix
+    return geodesy.cdist(position_list_a, position_list_b, method='haversine')
 
 
 def create_polygon_around_geocode(geocode, max_distance):
@@ -486,11 +485,12 @@ def is_heading_in_range(heading_range, heading, heading_epsilon=0.0):
     heading_left = (heading_left - heading_epsilon) % 360
     heading_right = (heading_right + heading_epsilon) % 360
     
+    # element-wise operators, so that heading can also be a numpy array
     if heading_left < heading_right:
-        return heading_left <= heading <= heading_right
+        return (heading_left <= heading) & (heading <= heading_right)
     else:
         # wraps around 0/360
-        return heading >= heading_left or heading <= heading_right
+        return (heading >= heading_left) | (heading <= heading_right)
 
 
 def get_heading_list_by_range_and_fov(cur_heading, heading_range, fov):
@@ -513,14 +513,8 @@ def calculate_square_region(point1, point2, buffer=10):
     R = 6378137  # Radius of the Earth in meters
 
     def offset_point(lat, lon, d, angle):
-        lat1 = math.radians(lat)
-        lon1 = math.radians(lon)
-        brng = math.radians(angle)
-
-        lat2 = math.asin(math.sin(lat1) * math.cos(d / R) + math.cos(lat1) * math.sin(d / R) * math.cos(brng))
-        lon2 = lon1 + math.atan2(math.sin(brng) * math.sin(d / R) * math.cos(lat1),
-                                 math.cos(d / R) - math.sin(lat1) * math.sin(lat2))
-        return math.degrees(lat2), math.degrees(lon2)
+        lat2, lon2 = geodesy.spherical_destination(lat, lon, angle, d, radius=R)
+        return float(lat2), float(lon2)
 
     # Calculate the angle of the line between the two points
     angle = math.atan2(lng2 - lng1, lat2 - lat1) * 180 / math.pi
@@ -544,43 +538,18 @@ def calculate_square_region(point1, point2, buffer=10):
 
 def extend_line(point1, point2, extension_distance):
     def calculate_new_point(lat, lon, bearing, distance):
-        R = 6378.1  # Radius of the Earth in km
-        bearing = math.radians(bearing)
-
-        lat1 = math.radians(lat)
-        lon1 = math.radians(lon)
-
-        lat2 = math.asin(math.sin(lat1) * math.cos(distance / R) + 
-                         math.cos(lat1) * math.sin(distance / R) * math.cos(bearing))
-        lon2 = lon1 + math.atan2(math.sin(bearing) * math.sin(distance / R) * math.cos(lat1),
-                            math.cos(distance / R) - math.sin(lat1) * math.sin(lat2))
-
-        return math.degrees(lat2), math.degrees(lon2)
-
-    def calculate_bearing(pointA, pointB):
-        lat1 = math.radians(pointA[0])
-        lat2 = math.radians(pointB[0])
-        diff_long = math.radians(pointB[1] - pointA[1])
-
-        x = math.sin(diff_long) * math.cos(lat2)
-        y = math.cos(lat1) * math.sin(lat2) - (math.sin(lat1) * math.cos(lat2) * math.cos(diff_long))
-
-        initial_bearing = math.atan2(x, y)
-        initial_bearing = math.degrees(initial_bearing)
-        compass_bearing = (initial_bearing + 360) % 360
-
-        return compass_bearing
-
-    distance_km = extension_distance / 1000  # convert meters to kilometers
+        # sphere with a radius of 6378.1 km
+        lat2, lon2 = geodesy.spherical_destination(lat, lon, bearing, distance, radius=6378100)
+        return float(lat2), float(lon2)
 
-    bearing = calculate_bearing(point1, point2)
+    bearing = float(geodesy.initial_bearing(point1[0], point1[1], point2[0], point2[1]))
 
     # Extend in the direction of point1 to point2
-    extended_point2 = calculate_new_point(point2[0], point2[1], bearing, distance_km)
+    extended_point2 = calculate_new_point(point2[0], point2[1], bearing, extension_distance)
 
     # Extend in the opposite direction
     opposite_bearing = (bearing + 180) % 360
-    extended_point1 = calculate_new_point(point1[0], point1[1], opposite_bearing, distance_km)
+    extended_point1 = calculate_new_point(point1[0], point1[1], opposite_bearing, extension_distance)
 
     return extended_point1, extended_point2
 
@@ -0,0 +1,227 @@
+"""
+Vectorized geodesy kernels. All functions take latitudes / longitudes in degrees and distances
+in meters, and broadcast over numpy arrays like numpy ufuncs, so a loop of geopy calls can be
+replaced by one call over arrays.
+"""
+import numpy as np
+
+
+# WGS-84 ellipsoid, the default of geopy.distance.geodesic
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = (1 - WGS84_F) * WGS84_A
+
+# mean earth radius used by the haversine distance
+EARTH_RADIUS = 6371000.0
+
+
+def _as_arrays(*args):
+    return np.broadcast_arrays(*[np.asarray(x, dtype=np.float64) for x in args])
+
+
+def haversine(lat1, lng1, lat2, lng2, radius=EARTH_RADIUS):
+    """
+    Great circle distance on a sphere. About 0.5% off the ellipsoidal distance, but several
+    times faster than vincenty.
+
+    Returns:
+        distance (numpy.array): distance in meters
+    """
+    lat1, lng1, lat2, lng2 = map(np.radians, _as_arrays(lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2.0) ** 2
+    return 2 * radius * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def vincenty(lat1, lng1, lat2, lng2, max_iter=200, tol=1e-12):
+    """
+    Ellipsoidal distance on WGS-84 (Vincenty's inverse formula). Agrees with
+    geopy.distance.geodesic to a fraction of a millimetre. The formula does not converge for
+    nearly antipodal points, these are computed with geopy instead.
+
+    Returns:
+        distance (numpy.array): distance in meters
+    """
+    lat1, lng1, lat2, lng2 = _as_arrays(lat1, lng1, lat2, lng2)
+    a, b, f = WGS84_A, WGS84_B, WGS84_F
+
+    L = np.radians(lng2 - lng1)
+    tan_u1 = (1 - f) * np.tan(np.radians(lat1))
+    tan_u2 = (1 - f) * np.tan(np.radians(lat2))
+    cos_u1 = 1 / np.sqrt(1 + tan_u1 ** 2)
+    cos_u2 = 1 / np.sqrt(1 + tan_u2 ** 2)
+    sin_u1, sin_u2 = tan_u1 * cos_u1, tan_u2 * cos_u2
+
+    lam = L
+    converged = np.zeros(lam.shape, dtype=bool)
+    for _ in range(max_iter):
+        sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+        sin_sigma = np.sqrt((cos_u2 * sin_lam) ** 2 + (cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam) ** 2)
+        cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+        # coincident points have sin_sigma == 0
+        sin_alpha = np.divide(cos_u1 * cos_u2 * sin_lam, sin_sigma,
+                              out=np.zeros_like(sin_sigma), where=sin_sigma != 0)
+        cos_sq_alpha = 1 - sin_alpha ** 2
+        # equatorial lines have cos_sq_alpha == 0
+        cos_2sigma_m = np.divide(2 * sin_u1 * sin_u2, cos_sq_alpha,
+                                 out=np.zeros_like(cos_sq_alpha), where=cos_sq_alpha != 0)
+        cos_2sigma_m = np.where(cos_sq_alpha != 0, cos_sigma - cos_2sigma_m, 0.0)
+        C = f / 16 * cos_sq_alpha * (4 + f * (4 - 3 * cos_sq_alpha))
+        lam_new = L + (1 - C) * f * sin_alpha * (
+            sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2))
+        )
+        converged = np.abs(lam_new - lam) < tol
+        lam = lam_new
+        if np.all(converged):
+            break
+
+    u_sq = cos_sq_alpha * (a ** 2 - b ** 2) / b ** 2
+    A = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    B = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) -
+        B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+    ))
+    distance = b * A * (sigma - delta_sigma)
+
+    if not np.all(converged):
+        from geopy.distance import geodesic
+        distance = np.array(distance)
+        for idx in zip(*np.nonzero(~converged)):
+            distance[idx] = geodesic((lat1[idx], lng1[idx]), (lat2[idx], lng2[idx])).meters
+
+    return distance
+
+
+def distance(points_a, points_b, method='vincenty'):
+    """
+    Element-wise distance between two arrays of geocodes.
+
+    Args:
+        points_a (numpy.array or list): (..., 2) latitude and longitude
+        points_b (numpy.array or list): (..., 2) latitude and longitude, broadcastable with points_a
+        method (str): vincenty or haversine
+
+    Returns:
+        distance (numpy.array): distance in meters
+    """
+    points_a, points_b = np.asarray(points_a, dtype=np.float64), np.asarray(points_b, dtype=np.float64)
+    if method == 'vincenty':
+        return vincenty(points_a[..., 0], points_a[..., 1], points_b[..., 0], points_b[..., 1])
+    elif method == 'haversine':
+        return haversine(points_a[..., 0], points_a[..., 1], points_b[..., 0], points_b[..., 1])
+    else:
+        raise ValueError(f'Unknown distance method: {method}')
+
+
+def cdist(points_a, points_b, method='haversine'):
+    """
+    Distance between each pair of the two collections of geocodes.
+
+    Args:
+        points_a (numpy.array or list): (N, 2) latitude and longitude
+        points_b (numpy.array or list): (M, 2) latitude and longitude
+        method (str): haversine or vincenty
+
+    Returns:
+        dist_matrix (numpy.array): (N, M) distance in meters
+    """
+    points_a = np.asarray(points_a, dtype=np.float64).reshape(-1, 2)
+    points_b = np.asarray(points_b, dtype=np.float64).reshape(-1, 2)
+    return distance(points_a[:, np.newaxis], points_b[np.newaxis], method=method)
+
+
+def initial_bearing(lat1, lng1, lat2, lng2):
+    """
+    Initial great circle bearing from point 1 to point 2.
+
+    Returns:
+        bearing (numpy.array): compass bearing in degrees, clockwise from north in [0, 360)
+    """
+    lat1, lng1, lat2, lng2 = _as_arrays(lat1, lng1, lat2, lng2)
+    lat1, lat2 = np.radians(lat1), np.radians(lat2)
+    diff_lng = np.radians(lng2 - lng1)
+
+    x = np.sin(diff_lng) * np.cos(lat2)
+    y = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(diff_lng)
+    return (np.degrees(np.arctan2(x, y)) + 360) % 360
+
+
+def spherical_destination(lat, lng, bearing, distance, radius=EARTH_RADIUS):
+    """
+    Destination along a great circle of a sphere with the given radius. Use destination
+    for the ellipsoidal (geopy compatible) result.
+
+    Returns:
+        lat, lng (numpy.array): destination latitude and longitude in degrees
+    """
+    lat, lng, bearing, distance = _as_arrays(lat, lng, bearing, distance)
+    lat1, lng1, bearing = np.radians(lat), np.radians(lng), np.radians(bearing)
+    delta = distance / radius
+
+    lat2 = np.arcsin(np.sin(lat1) * np.cos(delta) + np.cos(lat1) * np.sin(delta) * np.cos(bearing))
+    lng2 = lng1 + np.arctan2(np.sin(bearing) * np.sin(delta) * np.cos(lat1),
+                             np.cos(delta) - np.sin(lat1) * np.sin(lat2))
+    return np.degrees(lat2), np.degrees(lng2)
+
+
+def destination(lat, lng, bearing, distance, max_iter=50, tol=1e-12):
+    """
+    Vectorized forward geodesic problem on the WGS-84 ellipsoid (Vincenty's direct formula).
+    Agrees with geopy.distance.geodesic(...).destination to well below a millimetre.
+
+    Args:
+        lat (float or numpy.array): start latitude in degrees
+        lng (float or numpy.array): start longitude in degrees
+        bearing (float or numpy.array): initial bearing in degrees, clockwise from north
+        distance (float or numpy.array): distance in meters
+        max_iter (int): maximum number of iterations
+        tol (float): convergence threshold of sigma in radians
+
+    Returns:
+        lat, lng (numpy.array): destination latitude and longitude in degrees, broadcast shape of the inputs
+    """
+    lat, lng, bearing, distance = _as_arrays(lat, lng, bearing, distance)
+    a, b, f = WGS84_A, WGS84_B, WGS84_F
+
+    alpha1 = np.radians(bearing)
+    sin_alpha1, cos_alpha1 = np.sin(alpha1), np.cos(alpha1)
+    tan_u1 = (1 - f) * np.tan(np.radians(lat))
+    cos_u1 = 1 / np.sqrt(1 + tan_u1 ** 2)
+    sin_u1 = tan_u1 * cos_u1
+    sigma1 = np.arctan2(tan_u1, cos_alpha1)
+    sin_alpha = cos_u1 * sin_alpha1
+    cos_sq_alpha = 1 - sin_alpha ** 2
+    u_sq = cos_sq_alpha * (a ** 2 - b ** 2) / b ** 2
+    A = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    B = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+
+    sigma = distance / (b * A)
+    for _ in range(max_iter):
+        cos_2sigma_m = np.cos(2 * sigma1 + sigma)
+        sin_sigma, cos_sigma = np.sin(sigma), np.cos(sigma)
+        delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) -
+            B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+        ))
+        sigma_new = distance / (b * A) + delta_sigma
+        converged = np.all(np.abs(sigma_new - sigma) < tol)
+        sigma = sigma_new
+        if converged:
+            break
+
+    cos_2sigma_m = np.cos(2 * sigma1 + sigma)
+    sin_sigma, cos_sigma = np.sin(sigma), np.cos(sigma)
+    x = sin_u1 * sin_sigma - cos_u1 * cos_sigma * cos_alpha1
+    lat2 = np.arctan2(
+        sin_u1 * cos_sigma + cos_u1 * sin_sigma * cos_alpha1,
+        (1 - f) * np.sqrt(sin_alpha ** 2 + x ** 2)
+    )
+    lam = np.arctan2(sin_sigma * sin_alpha1, cos_u1 * cos_sigma - sin_u1 * sin_sigma * cos_alpha1)
+    C = f / 16 * cos_sq_alpha * (4 + f * (4 - 3 * cos_sq_alpha))
+    L = lam - (1 - C) * f * sin_alpha * (
+        sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2))
+    )
+    lng2 = (lng + np.degrees(L) + 180) % 360 - 180
+
+    return np.degrees(lat2), lng2
@@ -0,0 +1,295 @@
+import os
+
+import numpy as np
+
+from virl.utils import geodesy
+from virl.utils.geocode_utils import haversine_distance
+
+
+# meters per degree of latitude on the sphere used by haversine_distance
+METERS_PER_DEGREE = 6371000.0 * np.pi / 180.0
+
+
+class GeocodeGridIndex(object):
+    """
+    A geohash-like bucket grid over (lat, lng) for sub-linear nearest / k-nearest / radius
+    queries. Points are bucketed into square cells of `cell_deg` degrees, sorted by cell key,
+    and every query only computes haversine distances for the cells overlapping its search box.
+
+    Distances are computed with geocode_utils.haversine_distance, so the results are identical
+    to a linear scan with geocode_utils.cal_distance_between_two_position_list.
+    Note: longitude wrap-around at the antimeridian is not handled (city-scale data only).
+    """
+    def __init__(self, geocodes, values=None, cell_deg=0.0005):
+        geocodes = np.asarray(geocodes, dtype=np.float64).reshape(-1, 2)
+        self.cell_deg = float(cell_deg)
+
+        rows, cols = self._cell_of(geocodes[:, 0], geocodes[:, 1])
+        keys = self._key(rows, cols)
+        order = np.argsort(keys, kind='stable')
+
+        # the position of each point in the input, used to break distance ties like a linear scan
+        self.input_idx = order
+        self.lats = geocodes[order, 0]
+        self.lngs = geocodes[order, 1]
+        self.values = None if values is None else np.asarray(values)[order]
+        self.cell_keys, self.cell_starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+        self.cell_ends = self.cell_starts + counts
+
+    def __len__(self):
+        return len(self.lats)
+
+    def _cell_of(self, lat, lng):
+        rows = np.floor((np.asarray(lat) + 90.0) / self.cell_deg).astype(np.int64)
+        cols = np.floor((np.asarray(lng) + 180.0) / self.cell_deg).astype(np.int64)
+        return rows, cols
+
+    def _key(self, rows, cols):
+        n_cols = int(np.ceil(360.0 / self.cell_deg)) + 1
+        return rows * n_cols + cols
+
+    def geocode(self, idx):
+        return float(self.lats[idx]), float(self.lngs[idx])
+
+    def _candidates(self, geocode, radius):
+        """Indices of all points whose cell overlaps the bounding box of the search circle."""
+        lat, lng = geocode
+        # small margin to be safe against floating point at the cell borders
+        dlat = radius / METERS_PER_DEGREE * 1.01 + 1e-12
+        max_abs_lat = min(abs(lat) + dlat, 89.9)
+        dlng = dlat / np.cos(np.radians(max_abs_lat))
+        if dlat >= 180 or dlng >= 360:
+            return np.arange(len(self))
+
+        row_min, col_min = self._cell_of(lat - dlat, lng - dlng)
+        row_max, col_max = self._cell_of(lat + dlat, lng + dlng)
+        n_cells = (row_max - row_min + 1) * (col_max - col_min + 1)
+        if n_cells >= len(self.cell_keys):
+            return np.arange(len(self))
+
+        rows, cols = np.meshgrid(np.arange(row_min, row_max + 1), np.arange(col_min, col_max + 1), indexing='ij')
+        query_keys = self._key(rows.ravel(), cols.ravel())
+        pos = np.searchsorted(self.cell_keys, query_keys)
+        valid = pos < len(self.cell_keys)
+        pos, query_keys = pos[valid], query_keys[valid]
+        pos = pos[self.cell_keys[pos] == query_keys]
+        if len(pos) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        return np.concatenate([np.arange(self.cell_starts[p], self.cell_ends[p]) for p in pos])
+
+    def _distances(self, geocode, idx):
+        return haversine_distance(geocode[0], geocode[1], self.lats[idx], self.lngs[idx])
+
+    def query_radius(self, geocode, radius, sort=True):
+        """
+        Args:
+            geocode (tuple): latitude and longitude
+            radius (float): search radius in meters (inclusive)
+            sort (bool): whether to sort the results by distance
+
+        Returns:
+            idx (numpy.array): indices of the points within radius
+            distances (numpy.array): the corresponding distances in meters
+        """
+        idx = self._candidates(geocode, radius)
+        distances = self._distances(geocode, idx)
+        mask = distances <= radius
+        idx, distances = idx[mask], distances[mask]
+        if sort:
+            order = np.lexsort((self.input_idx[idx], distances))
+            idx, distances = idx[order], distances[order]
+        return idx, distances
+
+    def query_knn(self, geocode, k=1, max_radius=None):
+        """
+        Exact k-nearest neighbours, found by doubling the search radius until k points are
+        covered (or max_radius / the whole dataset is reached).
+
+        Returns:
+            idx (numpy.array): indices of at most k nearest points, sorted by distance
+            distances (numpy.array): the corresponding distances in meters
+        """
+        if len(self) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        radius = self.cell_deg * METERS_PER_DEGREE
+        while True:
+            if max_radius is not None:
+                radius = min(radius, max_radius)
+            if max_radius is None and len(self._candidates(geocode, radius)) == len(self):
+                # the search box already covers the whole dataset
+                idx = np.arange(len(self))
+                distances = self._distances(geocode, idx)
+                order = np.lexsort((self.input_idx, distances))[:k]
+                return idx[order], distances[order]
+
+            idx, distances = self.query_radius(geocode, radius)
+            if len(idx) >= k or (max_radius is not None and radius >= max_radius):
+                return idx[:k], distances[:k]
+            radius *= 2
+
+    def query_nearest(self, geocode, max_radius=None):
+        """
+        Returns:
+            idx (int): index of the nearest point, None if nothing is found within max_radius
+            distance (float): distance in meters
+        """
+        idx, distances = self.query_knn(geocode, k=1, max_radius=max_radius)
+        if len(idx) == 0:
+            return None, None
+        return int(idx[0]), float(distances[0])
+
+    def save(self, path, **meta):
+        tmp_path = path + '.tmp.npz'
+        np.savez(
+            tmp_path, input_idx=self.input_idx, lats=self.lats, lngs=self.lngs, cell_deg=self.cell_deg,
+            values=self.values if self.values is not None else np.zeros(0),
+            has_values=self.values is not None, cell_keys=self.cell_keys,
+            cell_starts=self.cell_starts, cell_ends=self.cell_ends,
+            **{f'meta_{k}': v for k, v in meta.items()}
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=False)
+        index = cls.__new__(cls)
+        index.input_idx = data['input_idx']
+        index.lats = data['lats']
+        index.lngs = data['lngs']
+        index.cell_deg = float(data['cell_deg'])
+        index.values = data['values'] if bool(data['has_values']) else None
+        index.cell_keys = data['cell_keys']
+        index.cell_starts = data['cell_starts']
+        index.cell_ends = data['cell_ends']
+        index.meta = {k[len('meta_'):]: data[k].item() for k in data.files if k.startswith('meta_')}
+        return index
+
+
+class GeocodeSpatialHash(object):
+    """
+    An incremental spatial hash over (lat, lng). Unlike GeocodeGridIndex, points can be added
+    one by one: each point is appended to its cell of about cell_m x cell_m meters (the
+    longitude width of a cell row is widened by its latitude), and a query only computes the
+    distances of the points in the cells overlapping its search box.
+
+    The hash only holds python dicts / lists / tuples, so it can be pickled with its owner.
+    """
+    def __init__(self, cell_m=10.0, metric='haversine'):
+        """
+        Args:
+            cell_m (float): cell size in meters, about the typical query radius
+            metric (str): haversine or vincenty, see geodesy.distance
+        """
+        self.cell_m = float(cell_m)
+        self.cell_deg = self.cell_m / METERS_PER_DEGREE
+        self.metric = metric
+        # (row, col) -> [(lat, lng, seq, item)], seq is the insertion order used to break distance ties
+        self.cells = {}
+        self.n_points = 0
+
+    def __len__(self):
+        return self.n_points
+
+    def _row(self, lat):
+        return int(np.floor(lat / self.cell_deg))
+
+    def _col(self, lng, row):
+        lng_cell_deg = self.cell_deg / max(np.cos(np.radians((row + 0.5) * self.cell_deg)), 1e-6)
+        return int(np.floor(lng / lng_cell_deg))
+
+    def add(self, geocode, item):
+        lat, lng = float(geocode[0]), float(geocode[1])
+        row = self._row(lat)
+        self.cells.setdefault((row, self._col(lng, row)), []).append((lat, lng, self.n_points, item))
+        self.n_points += 1
+
+    def _candidates(self, geocode, radius):
+        """All points whose cell overlaps the bounding box of the search circle."""
+        lat, lng = geocode
+        # margin for the ellipsoidal distances and floating point at the cell borders
+        dlat = radius / METERS_PER_DEGREE * 1.01 + 1e-12
+        dlng = dlat / np.cos(np.radians(min(abs(lat) + dlat, 89.9)))
+        row_min, row_max = self._row(lat - dlat), self._row(lat + dlat)
+        if dlat >= 90 or dlng >= 180 or (row_max - row_min + 1) ** 2 > 4 * len(self.cells):
+            # the search box covers more cells than there are occupied ones
+            return [entry for entries in self.cells.values() for entry in entries]
+
+        candidates = []
+        for row in range(row_min, row_max + 1):
+            for col in range(self._col(lng - dlng, row), self._col(lng + dlng, row) + 1):
+                candidates.extend(self.cells.get((row, col), ()))
+        return candidates
+
+    def _query(self, geocode, candidates, radius=None):
+        if len(candidates) == 0:
+            return []
+        distances = geodesy.distance(geocode, [(lat, lng) for lat, lng, _, _ in candidates], method=self.metric)
+        results = sorted(zip(distances.tolist(), [seq for _, _, seq, _ in candidates], candidates))
+        return [(entry[3], distance) for distance, _, entry in results if radius is None or distance <= radius]
+
+    def query_radius(self, geocode, radius):
+        """
+        Args:
+            geocode (tuple): latitude and longitude
+            radius (float): search radius in meters (inclusive)
+
+        Returns:
+            list: [(item, distance)] sorted by distance, then by insertion order
+        """
+        return self._query(geocode, self._candidates(geocode, radius), radius)
+
+    def query_knn(self, geocode, k=1, max_radius=None):
+        """
+        Exact k-nearest neighbours, found by doubling the search radius until k points are covered.
+
+        Returns:
+            list: at most k [(item, distance)] sorted by distance
+        """
+        radius = self.cell_m
+        while True:
+            if max_radius is not None:
+                radius = min(radius, max_radius)
+            candidates = self._candidates(geocode, radius)
+            if len(candidates) == self.n_points and max_radius is None:
+                return self._query(geocode, candidates)[:k]
+            results = self._query(geocode, candidates, radius)
+            if len(results) >= k or (max_radius is not None and radius >= max_radius):
+                return results[:k]
+            radius *= 2
+
+
+def build_or_load_mapping_index(mapping_path, gps_to_pano_mapping, cell_deg=0.0005):
+    """
+    Load the spatial index persisted next to the gps_to_pano_mapping pickle,
+    or build (and persist) it if it is missing or stale.
+
+    Args:
+        mapping_path (str): path to the gps_to_pano_mapping pickle
+        gps_to_pano_mapping (dict): {(lat, lng): pano_id}
+        cell_deg (float): cell size of the grid in degrees
+
+    Returns:
+        GeocodeGridIndex: index whose values are the pano ids
+    """
+    index_path = os.path.splitext(mapping_path)[0] + '.grid_index.npz'
+    signature = f'{os.path.getmtime(mapping_path)}_{os.path.getsize(mapping_path)}_{len(gps_to_pano_mapping)}'
+
+    if os.path.exists(index_path):
+        try:
+            index = GeocodeGridIndex.load(index_path)
+            if index.meta.get('signature') == signature and index.cell_deg == cell_deg:
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+
+    geocodes = list(gps_to_pano_mapping.keys())
+    pano_ids = [str(gps_to_pano_mapping[geocode]) for geocode in geocodes]
+    index = GeocodeGridIndex(geocodes, values=pano_ids, cell_deg=cell_deg)
+    try:
+        index.save(index_path, signature=signature)
+    except OSError:
+        print(f'Cannot persist the spatial index to {index_path}, keep it in memory only.')
+
+    return index
@@ -0,0 +1,51 @@
+import sqlite3
+import threading
+
+
+class ThreadLocalSQLite(object):
+    """
+    A sqlite database in WAL mode with one connection per thread, so several threads
+    and processes (e.g. parallel collectors) can share it. Used by the persistent caches.
+    """
+    def __init__(self, db_path, timeout=60):
+        """
+        Args:
+            db_path (str): path of the database file
+            timeout (float): seconds to wait for the lock of another writer
+        """
+        self.db_path = db_path
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def connect(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+
+def total_bytes(conn, table, size_column='nbytes'):
+    return conn.execute(f'SELECT COALESCE(SUM({size_column}), 0) FROM {table}').fetchone()[0]
+
+
+def evict_least_recently_used(conn, table, target_bytes, size_column='nbytes', order_column='accessed_at'):
+    """
+    Delete the least recently used rows of a table keyed by `key` until their sizes sum to target_bytes.
+
+    Returns:
+        n_evicted (int): number of deleted rows
+        cur_bytes (int): total size of the remaining rows
+    """
+    cur_bytes = total_bytes(conn, table, size_column)
+    evicted_keys = []
+    for key, nbytes in conn.execute(
+            f'SELECT key, {size_column} FROM {table} ORDER BY {order_column}').fetchall():
+        if cur_bytes <= target_bytes:
+            break
+        evicted_keys.append((key,))
+        cur_bytes -= nbytes
+    conn.executemany(f'DELETE FROM {table} WHERE key = ?', evicted_keys)
+    return len(evicted_keys), cur_bytes
@@ -0,0 +1,279 @@
+import math
+import time
+from collections import deque
+
+import numpy as np
+
+from virl.utils import geodesy
+
+
+def distance_matrix(points, metric='euclidean'):
+    """
+    Args:
+        points (list or numpy.array): (N, 2) latitude and longitude
+        metric (str): euclidean (on the coordinates) or haversine (meters)
+
+    Returns:
+        distances (numpy.array): (N, N) distance matrix
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if metric == 'euclidean':
+        diff = points[:, np.newaxis] - points[np.newaxis]
+        return np.sqrt(diff[..., 0] ** 2 + diff[..., 1] ** 2)
+    elif metric == 'haversine':
+        return geodesy.cdist(points, points, method='haversine')
+    else:
+        raise ValueError(f'Unknown metric: {metric}')
+
+
+def nearest_neighbour_candidates(points, k=8, metric='euclidean', chunk_size=1024):
+    """
+    The k nearest points of each point, computed in chunks of rows so the full distance
+    matrix is never kept in memory.
+
+    Returns:
+        candidates (numpy.array): (N, k) indices sorted by distance, without the point itself
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n = len(points)
+    k = min(k, n - 1)
+    candidates = np.zeros((n, k), dtype=np.int64)
+    for start in range(0, n, chunk_size):
+        rows = np.arange(start, min(start + chunk_size, n))
+        if metric == 'euclidean':
+            diff = points[rows, np.newaxis] - points[np.newaxis]
+            distances = np.sqrt(diff[..., 0] ** 2 + diff[..., 1] ** 2)
+        else:
+            distances = geodesy.cdist(points[rows], points, method=metric)
+        distances[np.arange(len(rows)), rows] = np.inf
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(distances, nearest, axis=1), axis=1)
+        candidates[rows] = np.take_along_axis(nearest, order, axis=1)
+    return candidates
+
+
+class TourOptimizer(object):
+    """
+    Local search for the travelling salesman tour over a set of geocodes.
+
+    The tour starts from a nearest neighbour construction and is improved with 2-opt and
+    Or-opt (moving segments of 1-3 points, in both orientations) moves. Moves are only tried
+    towards the k nearest neighbours of a point, and don't-look bits keep the search on the
+    points whose neighbourhood changed, so a pass costs O(N k) instead of O(N^2).
+    """
+    def __init__(self, points, k=8, metric='euclidean', time_budget=None, max_iterations=None, or_opt_max_len=3):
+        """
+        Args:
+            points (list): a list of (lat, lng)
+            k (int): number of candidate neighbours of each point
+            metric (str): euclidean (on the coordinates) or haversine (meters)
+            time_budget (float): stop improving after this many seconds, None for no limit
+            max_iterations (int): stop improving after this many improving moves, None for no limit
+            or_opt_max_len (int): maximum length of the segments moved by Or-opt
+        """
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self.n = len(self.points)
+        self.k = k
+        self.metric = metric
+        self.time_budget = time_budget
+        self.max_iterations = max_iterations
+        self.or_opt_max_len = or_opt_max_len
+
+        # python floats for the scalar distance in the inner loop
+        if metric == 'euclidean':
+            self.xs, self.ys = self.points[:, 0].tolist(), self.points[:, 1].tolist()
+        elif metric == 'haversine':
+            self.xs, self.ys = np.radians(self.points[:, 0]).tolist(), np.radians(self.points[:, 1]).tolist()
+            self.cos_xs = np.cos(np.radians(self.points[:, 0])).tolist()
+        else:
+            raise ValueError(f'Unknown metric: {metric}')
+
+        self.tour = []
+        self.pos = []
+        self.n_moves = 0
+
+    def dist(self, i, j):
+        if self.metric == 'euclidean':
+            return math.hypot(self.xs[i] - self.xs[j], self.ys[i] - self.ys[j])
+        a = math.sin((self.xs[j] - self.xs[i]) / 2) ** 2 + \
+            self.cos_xs[i] * self.cos_xs[j] * math.sin((self.ys[j] - self.ys[i]) / 2) ** 2
+        return 2 * geodesy.EARTH_RADIUS * math.asin(math.sqrt(min(a, 1.0)))
+
+    def succ(self, city):
+        return self.tour[(self.pos[city] + 1) % self.n]
+
+    def pred(self, city):
+        return self.tour[(self.pos[city] - 1) % self.n]
+
+    def tour_length(self, tour=None):
+        tour = self.tour if tour is None else tour
+        return sum(self.dist(tour[i - 1], tour[i]) for i in range(len(tour)))
+
+    def path_length(self, path):
+        return sum(self.dist(path[i - 1], path[i]) for i in range(1, len(path)))
+
+    def nearest_neighbour_tour(self, candidates):
+        visited = np.zeros(self.n, dtype=bool)
+        tour = [0]
+        visited[0] = True
+        for _ in range(self.n - 1):
+            current = tour[-1]
+            next_city = next((int(c) for c in candidates[current] if not visited[c]), None)
+            if next_city is None:
+                # all candidates are visited, search all the unvisited points
+                if self.metric == 'euclidean':
+                    distances = np.hypot(self.points[:, 0] - self.points[current, 0],
+                                         self.points[:, 1] - self.points[current, 1])
+                else:
+                    distances = geodesy.haversine(self.points[current, 0], self.points[current, 1],
+                                                  self.points[:, 0], self.points[:, 1])
+                distances[visited] = np.inf
+                next_city = int(np.argmin(distances))
+            tour.append(next_city)
+            visited[next_city] = True
+        return tour
+
+    def _reverse(self, i, j):
+        """Reverse the cyclic tour from position i to position j, or the shorter complement"""
+        n = self.n
+        length = (j - i) % n + 1
+        if 2 * length > n:
+            i, j = (j + 1) % n, (i - 1) % n
+            length = n - length
+        tour, pos = self.tour, self.pos
+        for _ in range(length // 2):
+            ci, cj = tour[i], tour[j]
+            tour[i], pos[cj] = cj, i
+            tour[j], pos[ci] = ci, j
+            i = (i + 1) % n
+            j = (j - 1) % n
+
+    def _two_opt_move(self, a, b, c, d):
+        """Replace the tour edges (a, b) and (c, d) by (a, c) and (b, d)"""
+        if self.succ(a) == b:
+            self._reverse(self.pos[b], self.pos[c])
+        else:
+            self._reverse(self.pos[c], self.pos[b])
+
+    def _try_two_opt(self, a, candidates):
+        for forward in (True, False):
+            b = self.succ(a) if forward else self.pred(a)
+            d_ab = self.dist(a, b)
+            for c in candidates[a]:
+                d_ac = self.dist(a, c)
+                # the new edge (a, c) has to be shorter than the removed edge (a, b)
+                if d_ac >= d_ab:
+                    break
+                d = self.succ(c) if forward else self.pred(c)
+                if c == b or d == a:
+                    continue
+                delta = d_ab + self.dist(c, d) - d_ac - self.dist(b, d)
+                if delta > 1e-12:
+                    self._two_opt_move(a, b, c, d)
+                    return (a, b, c, d)
+        return None
+
+    def _try_or_opt(self, s1, candidates):
+        for length in range(1, self.or_opt_max_len + 1):
+            if length > self.n - 4:
+                break
+            segment = [s1]
+            for _ in range(length - 1):
+                segment.append(self.succ(segment[-1]))
+            s2 = segment[-1]
+            p, n = self.pred(s1), self.succ(s2)
+            removed = self.dist(p, s1) + self.dist(s2, n) - self.dist(p, n)
+            if removed <= 1e-12:
+                continue
+            segment_set = set(segment)
+            for c in set(candidates[s1]) | set(candidates[s2]):
+                d = self.succ(c)
+                if c in segment_set or d in segment_set or c == p or d == p:
+                    continue
+                d_cd = self.dist(c, d)
+                reversed_gain = removed - (self.dist(c, s2) + self.dist(s1, d) - d_cd)
+                forward_gain = removed - (self.dist(c, s1) + self.dist(s2, d) - d_cd)
+                if max(reversed_gain, forward_gain) <= 1e-12:
+                    continue
+                # p s1..s2 n ... c d -> p n ... c s2..s1 d (-> c s1..s2 d) as a sequence of 2-opt moves
+                self._two_opt_move(p, s1, c, d)
+                if c != n:
+                    self._two_opt_move(p, c, n, s2)
+                if forward_gain > reversed_gain:
+                    self._two_opt_move(c, s2, s1, d)
+                return (p, s1, s2, n, c, d)
+        return None
+
+    def optimize(self):
+        """
+        Returns:
+            tour (list): indices of the points in the closed tour order, starting from point 0
+        """
+        if self.n <= 3:
+            self.tour = list(range(self.n))
+            return self.tour
+
+        start_time = time.time()
+        candidates = nearest_neighbour_candidates(self.points, self.k, self.metric).tolist()
+        self.tour = self.nearest_neighbour_tour(candidates)
+        self.pos = [0] * self.n
+        for idx, city in enumerate(self.tour):
+            self.pos[city] = idx
+
+        # don't-look bits: only the points in the queue are searched for improving moves
+        queue = deque(self.tour)
+        in_queue = [True] * self.n
+        n_steps = 0
+        while queue:
+            n_steps += 1
+            if self.time_budget is not None and n_steps % 100 == 0 and time.time() - start_time > self.time_budget:
+                break
+            if self.max_iterations is not None and self.n_moves >= self.max_iterations:
+                break
+
+            city = queue.popleft()
+            in_queue[city] = False
+            changed = self._try_two_opt(city, candidates) or self._try_or_opt(city, candidates)
+            if changed is None:
+                continue
+            self.n_moves += 1
+            for endpoint in changed:
+                if not in_queue[endpoint]:
+                    in_queue[endpoint] = True
+                    queue.append(endpoint)
+            if not in_queue[city]:
+                in_queue[city] = True
+                queue.append(city)
+
+        start = self.pos[0]
+        self.tour = self.tour[start:] + self.tour[:start]
+        return self.tour
+
+    def optimize_path(self):
+        """
+        Returns:
+            path (list): indices of all points in visiting order, the optimized tour cut at its longest edge
+        """
+        tour = self.optimize()
+        if self.n <= 2:
+            return tour
+        longest = max(range(self.n), key=lambda i: self.dist(tour[i - 1], tour[i]))
+        return tour[longest:] + tour[:longest]
+
+
+def optimize_route(points, k=8, metric='euclidean', time_budget=None, max_iterations=None):
+    """
+    Visiting order of the points with a short total length (an open path, not a closed tour).
+
+    Args:
+        points (list): a list of (lat, lng)
+        k (int): number of candidate neighbours of each point
+        metric (str): euclidean (on the coordinates) or haversine (meters)
+        time_budget (float): seconds spent on improving the route, None for no limit
+        max_iterations (int): maximum number of improving moves, None for no limit
+
+    Returns:
+        route (list): indices of the points
+    """
+    optimizer = TourOptimizer(points, k=k, metric=metric, time_budget=time_budget, max_iterations=max_iterations)
+    return optimizer.optimize_path()
@@ -1,19 +1,17 @@
 import os
 import json
-import time
 import argparse
 import re
 import base64
-import requests
-from PIL import Image
 from tqdm import tqdm
 import glob
 from typing import List, Dict, Tuple, Optional
-import io
 import matplotlib.pyplot as plt
 import datetime
 import uuid
 
+from batch_api import OpenAIBatchClient, BatchPipeline, ShardedJSONLWriter, iter_jsonl_shards, DEFAULT_MAX_SHARD_BYTES
+from image_payload_cache import ImagePayloadCache, encode_image_bytes
 # Import direction utils
 from direction_utils import (
     apply_augmentation, 
@@ -50,7 +48,14 @@ class VLMEvaluator:
                  image_quality: int = 85,
                  resume_eval: bool = True,
                  visualize: bool = False,
-                 batch_size: int = 10):
+                 batch_size: int = 10,
+                 max_batch_bytes: int = DEFAULT_MAX_SHARD_BYTES,
+                 max_in_flight: int = 4,
+                 poll_interval: float = 30.0,
+                 max_poll_interval: float = 300.0,
+                 batch_client=None,
+                 payload_cache_dir: Optional[str] = os.path.join("eval", "payload_cache"),
+                 encode_workers: Optional[int] = None):
         """
         Initialize the VLM evaluator
         
@@ -67,6 +72,13 @@ class VLMEvaluator:
             resume_eval: Whether to resume evaluation from previously saved results
             visualize: Whether to generate visualization images
             batch_size: Maximum number of requests to batch together
+            max_batch_bytes: Maximum size in bytes of one batch JSONL file
+            max_in_flight: Maximum number of batches submitted to the Batch API at once
+            poll_interval: Initial interval (seconds) for polling batch status
+            max_poll_interval: Maximum polling interval, reached by exponential backoff
+            batch_client: Optional Batch API client (e.g. batch_api.FakeBatchClient for offline runs)
+            payload_cache_dir: Folder for the encoded image payload cache shared across runs, None to disable
+            encode_workers: Number of processes to warm the payload cache (default: CPU count)
         """
         self.textdata_folder = textdata_folder
         self.googledata_folder = googledata_folder
@@ -80,9 +92,18 @@ class VLMEvaluator:
         self.resume_eval = resume_eval
         self.visualize = visualize
         self.batch_size = batch_size
-        
-        if not self.api_key:
+        self.max_batch_bytes = max_batch_bytes
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.encode_workers = encode_workers
+        self.payload_cache = ImagePayloadCache(
+            payload_cache_dir, image_resize, image_quality
+        ) if payload_cache_dir else None
+        
+        if not self.api_key and batch_client is None:
             raise ValueError("API key not provided. Please pass it as a parameter or set the OPENAI_API_KEY environment variable")
+        self.batch_client = batch_client if batch_client is not None else OpenAIBatchClient(self.api_key)
         
         # Ensure output directory exists
         os.makedirs(self.output_dir, exist_ok=True)
@@ -113,6 +134,7 @@ class VLMEvaluator:
             f.write(f"Include thought: {self.include_thought}\n")
             f.write(f"Use augmentation: {self.use_augmentation}\n")
             f.write(f"Batch size: {self.batch_size}\n")
+            f.write(f"Max batches in flight: {self.max_in_flight}\n")
             f.write(f"{'='*50}\n\n")
 
     def _set_prompt_template(self):
@@ -160,20 +182,12 @@ Do not include any explanations or reasoning in your response, just the JSON wit
     
     def _process_image(self, image_path: str) -> bytes:
         """Process image to reduce size by resizing and compression"""
-        try:
-            with Image.open(image_path) as img:
-                if self.image_resize:
-                    img = img.resize(self.image_resize, Image.LANCZOS)
-                buffer = io.BytesIO()
-                img.save(buffer, format="JPEG", quality=self.image_quality, optimize=True)
-                return buffer.getvalue()
-        except Exception as e:
-            print(f"Error processing image {image_path}: {e}")
-            with open(image_path, "rb") as f:
-                return f.read()
+        return encode_image_bytes(image_path, self.image_resize, self.image_quality)
 
     def _encode_image(self, image_path: str) -> str:
         """Encode image as base64 string with optional processing"""
+        if self.payload_cache is not None:
+            return self.payload_cache.get_base64(image_path)
         image_data = self._process_image(image_path)
         return base64.b64encode(image_data).decode('utf-8')
     
@@ -420,168 +434,98 @@ Do not include any explanations or reasoning in your response, just the JSON wit
         
         return output_path
 
-    def _create_batch_jsonl(self, batch_items):
+    def _build_batch_request(self, item):
         """
-        Create a JSONL file for OpenAI's Batch API containing all batch requests
+        Build a single Batch API request
         
         Args:
-            batch_items: List of dictionaries with traj, pair_id, and image_paths keys
+            item: Dictionary with traj, pair_id, and image_paths keys
         
         Returns:
-            Tuple of (file_path, custom_id_mapping)
+            Tuple of (batch_request, id_mapping_entry)
         """
-        # Create a unique ID for this batch
-        batch_id = str(uuid.uuid4())
-        batch_dir = os.path.join(self.batch_files_dir, batch_id)
-        os.makedirs(batch_dir, exist_ok=True)
-        
-        # Create a JSONL file for the batch
-        batch_file_path = os.path.join(batch_dir, "batch_requests.jsonl")
-        
-        # Create a mapping from custom_id to traj and pair_id
-        custom_id_mapping = {}
-        
-        with open(batch_file_path, 'w', encoding='utf-8') as f:
-            for item in batch_items:
-                traj = item['traj']
-                pair_id = item['pair_id']
-                image_paths = item['image_paths']
-                
-                # Generate a unique ID for this request
-                custom_id = f"{traj}_{pair_id}_{uuid.uuid4()}"
-                custom_id_mapping[custom_id] = {"traj": traj, "pair_id": pair_id}
-                
-                # Prepare prompt template
-                prompt_template = self.prompt_template
-                
-                # If augmentation is used, adjust direction descriptions in the prompt
-                if self.use_augmentation and ('alice_rotation' in item or 'bob_rotation' in item):
-                    alice_rotation = item.get('alice_rotation', 0)
-                    bob_rotation = item.get('bob_rotation', 0)
-                    prompt_template = update_prompt_for_rotated_images(
-                        prompt_template, 
-                        alice_rotation,
-                        bob_rotation
-                    )
-                
-                # Prepare content with images
-                content = [{"type": "text", "text": prompt_template}]
-                
-                # Add images to content
-                for img_path in image_paths:
-                    b64_image = self._encode_image(img_path)
-                    content.append({
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{b64_image}"
-                        }
-                    })
-                
-                # Create batch request
-                batch_request = {
-                    "custom_id": custom_id,
-                    "method": "POST",
-                    "url": "/v1/chat/completions",
-                    "body": {
-                        "model": self.model,
-                        "messages": [
-                            {
-                                "role": "user", 
-                                "content": content
-                            }
-                        ],
-                        "max_tokens": 2000
-                    }
-                }
-                
-                # Write to JSONL file
-                f.write(json.dumps(batch_request) + '\n')
+        traj = item['traj']
+        pair_id = item['pair_id']
+        image_paths = item['image_paths']
+        
+        # Generate a unique ID for this request
+        custom_id = f"{traj}_{pair_id}_{uuid.uuid4()}"
+        
+        # Prepare prompt template
+        prompt_template = self.prompt_template
+        
+        # If augmentation is used, adjust direction descriptions in the prompt
+        if self.use_augmentation and ('alice_rotation' in item or 'bob_rotation' in item):
+            alice_rotation = item.get('alice_rotation', 0)
+            bob_rotation = item.get('bob_rotation', 0)
+            prompt_template = update_prompt_for_rotated_images(
+                prompt_template, 
+                alice_rotation,
+                bob_rotation
+            )
         
-        return batch_file_path, custom_id_mapping # Add id_mapping_path to return
-
-    def _upload_batch_file(self, file_path):
-        """Upload a JSONL file to OpenAI's Batch API and return the file ID"""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}"
-        }
+        # Prepare content with images
+        content = [{"type": "text", "text": prompt_template}]
         
-        with open(file_path, 'rb') as f:
-            files = {
-                'file': f
+        # Add images to content
+        for img_path in image_paths:
+            b64_image = self._encode_image(img_path)
+            content.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:image/jpeg;base64,{b64_image}"
+                }
+            })
+        
+        # Create batch request
+        batch_request = {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": self.model,
+                "messages": [
+                    {
+                        "role": "user", 
+                        "content": content
+                    }
+                ],
+                "max_tokens": 2000
             }
-            
-            response = requests.post(
-                "https://api.openai.com/v1/files",
-                headers=headers,
-                files=files,
-                data={"purpose": "batch"}
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"Failed to upload batch file: {response.text}")
-                
-            file_id = response.json()['id']
-            return file_id
-    
-    def _create_batch(self, file_id):
-        """Create a batch job with the uploaded file and return the batch ID"""
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
         }
         
-        payload = {
-            "input_file_id": file_id,
-            "completion_window": "24h",
-            "endpoint": "/v1/chat/completions"
-        }
-        
-        response = requests.post(
-            "https://api.openai.com/v1/batches",
-            headers=headers,
-            json=payload
-        )
+        return batch_request, {"traj": traj, "pair_id": pair_id}
+
+    def _iter_batch_shards(self, batch_items):
+        """
+        Lazily write JSONL shards for OpenAI's Batch API. Requests are built and written one
+        at a time, and a new shard is started before the shard would exceed max_batch_bytes
+        or batch_size requests, so memory does not grow with the number of items.
+        An item whose request cannot be built (e.g. a missing image) is logged and skipped.
         
-        if response.status_code != 200:
-            raise Exception(f"Failed to create batch: {response.text}")
-            
-        batch_id = response.json()['id']
-        return batch_id
-    
-    def _check_batch_status(self, batch_id):
-        """Check the status of a batch job and return the status information"""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}"
-        }
+        Args:
+            batch_items: Iterable of dictionaries with traj, pair_id, and image_paths keys
         
-        response = requests.get(
-            f"https://api.openai.com/v1/batches/{batch_id}",
-            headers=headers
+        Yields:
+            Tuple of (file_path, custom_id_mapping) for every finished shard
+        """
+        writer = ShardedJSONLWriter(
+            self.batch_files_dir, max_bytes=self.max_batch_bytes, max_requests=self.batch_size
         )
-        
-        if response.status_code != 200:
-            raise Exception(f"Failed to check batch status: {response.text}")
-            
-        return response.json()
-    
+        shards = iter_jsonl_shards(batch_items, writer, build_fn=self._build_batch_request)
+        for batch_file_path, custom_id_mapping in shards:
+            size_mb = os.path.getsize(batch_file_path) / 1024 / 1024
+            print(f"Created batch JSONL shard with {len(custom_id_mapping)} items ({size_mb:.1f} MB)")
+            yield batch_file_path, custom_id_mapping
+
     def _download_batch_results(self, file_id):
         """Download batch results and return the path to the downloaded file"""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        
-        response = requests.get(
-            f"https://api.openai.com/v1/files/{file_id}/content",
-            headers=headers
-        )
-        
-        if response.status_code != 200:
-            raise Exception(f"Failed to download batch results: {response.text}")
+        content = self.batch_client.download_file(file_id)
             
         # Save to a file
         results_file = os.path.join(self.batch_files_dir, f"results_{file_id}.jsonl")
         with open(results_file, 'wb') as f:
-            f.write(response.content)
+            f.write(content)
             
         return results_file
     
@@ -590,26 +534,35 @@ Do not include any explanations or reasoning in your response, just the JSON wit
         if not file_id:
             return None
             
-        headers = {
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        
-        response = requests.get(
-            f"https://api.openai.com/v1/files/{file_id}/content",
-            headers=headers
-        )
-        
-        if response.status_code != 200:
-            print(f"Warning: Failed to download batch errors: {response.text}")
+        try:
+            content = self.batch_client.download_file(file_id)
+        except Exception as e:
+            print(f"Warning: Failed to download batch errors: {e}")
             return None
             
         # Save to a file
         errors_file = os.path.join(self.batch_files_dir, f"errors_{file_id}.jsonl")
         with open(errors_file, 'wb') as f:
-            f.write(response.content)
+            f.write(content)
             
         return errors_file
     
+    def _collect_batch_results(self, batch_status, custom_id_mapping):
+        """Download and parse the results of a finished batch"""
+        # Even if the batch failed, try to get any available results
+        output_file_id = batch_status.get('output_file_id')
+        if not output_file_id:
+            raise Exception(f"No output file available for batch with status: {batch_status.get('status')}")
+
+        # Download batch results
+        output_file_path = self._download_batch_results(output_file_id)
+        
+        # Download errors if available
+        error_file_id = batch_status.get('error_file_id')
+        error_file_path = self._download_batch_errors(error_file_id) if error_file_id else None
+        
+        # Process batch results
+        return self._process_batch_results(output_file_path, error_file_path, custom_id_mapping)
     
     def _process_batch_results(self, results_path, errors_path, id_mapping):
         """Process batch results and return processed results"""
@@ -663,58 +616,41 @@ Do not include any explanations or reasoning in your response, just the JSON wit
         if not batch_items:
             return {}
         
-        try:
-            # Step 1: Create JSONL file for batch processing
-            batch_file_path, custom_id_mapping = self._create_batch_jsonl(batch_items)
-            print(f"Created batch JSONL file with {len(batch_items)} items")
-            
-            # Step 2: Upload batch file
-            file_id = self._upload_batch_file(batch_file_path)
-            print(f"Uploaded batch file with ID: {file_id}")
-            
-            # Step 3: Create batch
-            batch_id = self._create_batch(file_id)
-            print(f"Created batch job with ID: {batch_id}")
-            
-            # Step 4: Wait for batch to complete
-            print("Waiting for batch to complete...")
-            while True:
-                batch_status = self._check_batch_status(batch_id)
-                status = batch_status.get('status', '')
-                
-                total_requests = batch_status.get('request_counts', {}).get('total', 0)
-                completed_requests = batch_status.get('request_counts', {}).get('completed', 0)
-                failed_requests = batch_status.get('request_counts', {}).get('failed', 0)
-                
-                print(f"Batch status: {status} - Completed: {completed_requests}/{total_requests}, Failed: {failed_requests}")
-                
-                if status in ['completed', 'failed', 'expired', 'cancelled']:
-                    break
-                
-                # Wait before checking again
-                time.sleep(30)
-            
-            # Even if the batch failed, try to get any available results
-            output_file_id = batch_status.get('output_file_id')
-            if output_file_id:
-                # Step 5: Download batch results
-                output_file_path = self._download_batch_results(output_file_id)
-                
-                # Download errors if available
-                error_file_id = batch_status.get('error_file_id')
-                error_file_path = self._download_batch_errors(error_file_id) if error_file_id else None
-                
-                # Step 6: Process batch results
-                results = self._process_batch_results(output_file_path, error_file_path, custom_id_mapping)
+        return self._run_batch_pipeline(batch_items)
+
+    def _run_batch_pipeline(self, batch_items):
+        """
+        Run items through the Batch API pipeline: JSONL shards are streamed ahead,
+        several batches are in flight at once, and the results of each batch are
+        merged as soon as it finishes
+        
+        Args:
+            batch_items: Iterable of dictionaries with traj, pair_id, and image_paths keys
+        
+        Returns:
+            Dictionary with trajectory and pair results
+        """
+        all_results = {}
+
+        def merge_results(custom_id_mapping, batch_status):
+            batch_results = self._collect_batch_results(batch_status, custom_id_mapping)
+            for traj, pairs in batch_results.items():
+                if traj not in all_results:
+                    all_results[traj] = {}
                 
-                return results
-            else:
-                raise Exception(f"No output file available for batch with status: {batch_status.get('status')}")
-            
-        except Exception as e:
-            print(f"Error processing batch: {e}")
-            print("Returning empty results due to batch processing error.")
-            return {}
+                all_results[traj].update(pairs)
+
+        pipeline = BatchPipeline(
+            self.batch_client,
+            build_fn=lambda shard: shard,
+            on_complete=merge_results,
+            max_in_flight=self.max_in_flight,
+            poll_initial=self.poll_interval,
+            poll_max=self.max_poll_interval
+        )
+        stats = pipeline.run(self._iter_batch_shards(batch_items))
+        print(f"Batch pipeline finished: {stats}")
+        return all_results
 
     def collect_all_evaluation_pairs(self, traj_ids=None):
         """
@@ -1066,21 +1002,20 @@ Do not include any explanations or reasoning in your response, just the JSON wit
             print("No items to evaluate")
             return None
         
-        # Step 2: Process items in batches
-        all_results = {}
-        for i in range(0, len(batch_items), self.batch_size):
-            batch = batch_items[i:i + self.batch_size]
-            print(f"Processing batch {i//self.batch_size + 1}/{(len(batch_items) + self.batch_size - 1)//self.batch_size}")
-            
-            # Process batch
-            batch_results = self.process_batch(batch)
-            
-            # Merge results
-            for traj, pairs in batch_results.items():
-                if traj not in all_results:
-                    all_results[traj] = {}
-                
-                all_results[traj].update(pairs)
+        # Pre-encode all images in parallel, so building the JSONL files only reads the cache
+        if self.payload_cache is not None:
+            self.payload_cache.warm(
+                [path for item in batch_items for path in item['image_paths']], self.encode_workers
+            )
+
+        # Step 2: Process items in batches through the pipeline
+        print(f"Processing {len(batch_items)} items in shards of at most {self.batch_size} requests / "
+              f"{self.max_batch_bytes / 1024 / 1024:.0f} MB with up to {self.max_in_flight} in flight")
+        all_results = self._run_batch_pipeline(batch_items)
+        if self.payload_cache is not None:
+            print(self.payload_cache.summary())
+            with open(self.log_file, 'a', encoding='utf-8') as f:
+                f.write(self.payload_cache.summary() + "\n")
         
         # Step 3: Evaluate and save results
         evaluation_results = self.evaluate_and_save_results(all_results, self.visualize)
@@ -1129,6 +1064,12 @@ def main():
     parser.add_argument('--no_resume', action='store_true', help='Disable resuming from previous evaluation results')
     parser.add_argument('--visualize', action='store_true', help='Generate visualization images for evaluation results')
     parser.add_argument('--batch_size', type=int, default=500, help='Number of requests to batch together')
+    parser.add_argument('--max_batch_mb', type=float, default=DEFAULT_MAX_SHARD_BYTES / 1024 / 1024, help='Maximum size (MB) of one batch JSONL file')
+    parser.add_argument('--max_in_flight', type=int, default=4, help='Maximum number of batches submitted at once')
+    parser.add_argument('--poll_interval', type=float, default=30.0, help='Initial interval (seconds) for polling batch status')
+    parser.add_argument('--payload_cache_dir', type=str, default=os.path.join("eval", "payload_cache"), help='Folder for the encoded image payload cache')
+    parser.add_argument('--no_payload_cache', action='store_true', help='Disable the encoded image payload cache')
+    parser.add_argument('--encode_workers', type=int, default=None, help='Number of processes to pre-encode images')
     parser.add_argument('--process_batch_file', type=str, default=None, help='Process an existing batch results file without making new API calls')
     parser.add_argument('--id_mapping_file', type=str, default=None, help='Path to the ID mapping file for the batch results')
     
@@ -1152,7 +1093,12 @@ def main():
         image_quality=args.image_quality,
         resume_eval=not args.no_resume,
         visualize=args.visualize,
-        batch_size=args.batch_size
+        batch_size=args.batch_size,
+        max_batch_bytes=int(args.max_batch_mb * 1024 * 1024),
+        max_in_flight=args.max_in_flight,
+        poll_interval=args.poll_interval,
+        payload_cache_dir=None if args.no_payload_cache else args.payload_cache_dir,
+        encode_workers=args.encode_workers
     )
     
     # Determine which trajectories to evaluate